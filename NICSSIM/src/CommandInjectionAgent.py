@@ -12,7 +12,7 @@ import Configs
 
 class CommandInjectionAgent(HMI):
     def __init__(self, name , period , destination):
-        super().__init__(name, TAG.TAG_LIST, Controllers.PLCs, period)
+        super().__init__(name, TAG.TAG_LIST, Controllers.client_plcs(), period)
         self.destination= destination
 
     def _before_start(self):
@@ -1,11 +1,14 @@
+import os
+
+
 class SimulationConfig:
     # Constants
     EXECUTION_MODE_LOCAL = 'local'
     EXECUTION_MODE_DOCKER = 'docker'
     EXECUTION_MODE_GNS3 = 'gns3'
 
-    # configurable
-    EXECUTION_MODE = EXECUTION_MODE_DOCKER
+    # configurable (ICS_SIM_EXECUTION_MODE overrides it, e.g. for the processes started by start.py)
+    EXECUTION_MODE = os.getenv('ICS_SIM_EXECUTION_MODE', EXECUTION_MODE_DOCKER)
 
 
 class PHYSICS:
@@ -186,31 +189,76 @@ class TAG:
 class Controllers:
     PLC_CONFIG = {
         SimulationConfig.EXECUTION_MODE_DOCKER: {
-            1: {'name': 'PLC1', 'ip': '192.168.0.11', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP'},
-            2: {'name': 'PLC2', 'ip': '192.168.0.12', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP'},
+            1: {'name': 'PLC1', 'ip': '192.168.0.11', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP', 'subscription_port': 1502},
+            2: {'name': 'PLC2', 'ip': '192.168.0.12', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP', 'subscription_port': 1502},
         },
         SimulationConfig.EXECUTION_MODE_GNS3: {
-            1: {'name': 'PLC1', 'ip': '192.168.0.11', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP'},
-            2: {'name': 'PLC2', 'ip': '192.168.0.12', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP'},
+            1: {'name': 'PLC1', 'ip': '192.168.0.11', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP', 'subscription_port': 1502},
+            2: {'name': 'PLC2', 'ip': '192.168.0.12', 'port': 502,  'protocol': 'ModbusWriteRequest-TCP', 'subscription_port': 1502},
         },
         SimulationConfig.EXECUTION_MODE_LOCAL: {
-            1: {'name': 'PLC1', 'ip': '127.0.0.1',   'port': 5502, 'protocol': 'ModbusWriteRequest-TCP'},
-            2: {'name': 'PLC2', 'ip': '127.0.0.1',   'port': 5503, 'protocol': 'ModbusWriteRequest-TCP'},
+            1: {'name': 'PLC1', 'ip': '127.0.0.1',   'port': 5502, 'protocol': 'ModbusWriteRequest-TCP', 'subscription_port': 5512},
+            2: {'name': 'PLC2', 'ip': '127.0.0.1',   'port': 5503, 'protocol': 'ModbusWriteRequest-TCP', 'subscription_port': 5513},
         }
     }
 
     PLCs = PLC_CONFIG[SimulationConfig.EXECUTION_MODE]
 
+    # polling gateway in front of the PLCs (Gateway1.py), see ics_sim.gateway
+    GATEWAY_CONFIG = {
+        SimulationConfig.EXECUTION_MODE_DOCKER: {'name': 'Gateway1', 'ip': '192.168.0.15', 'port': 502},
+        SimulationConfig.EXECUTION_MODE_GNS3:   {'name': 'Gateway1', 'ip': '192.168.0.15', 'port': 502},
+        SimulationConfig.EXECUTION_MODE_LOCAL:  {'name': 'Gateway1', 'ip': '127.0.0.1',    'port': 5510},
+    }
+
+    GATEWAY = GATEWAY_CONFIG[SimulationConfig.EXECUTION_MODE]
+
+    # poll the PLCs through the gateway from the HMIs and agents instead of directly
+    USE_GATEWAY = False
+
+    @staticmethod
+    def client_plcs():
+        """PLC configs for the HMIs and agents: the PLCs themselves, or their units on the gateway."""
+        if not Controllers.USE_GATEWAY:
+            return Controllers.PLCs
+        return {plc_id: dict(plc, ip=Controllers.GATEWAY['ip'], port=Controllers.GATEWAY['port'], unit_id=plc_id,
+                             subscription_port=None)
+                for plc_id, plc in Controllers.PLCs.items()}
+
+
+class Launch:
+    # components started by start.py in processes of their own, see ics_sim.launcher: each one starts
+    # once those 'after' it are ready (scanning, and accepting connections on 'ready'), pinned to 'cpus'
+    # and with a metrics endpoint of its own
+    COMPONENTS = [
+        {'name': 'FactorySimulation', 'module': 'FactorySimulation', 'class': 'FactorySimulation', 'cpus': [0],
+         'env': {'ICS_SIM_METRICS_PORT': '9108'}},
+        {'name': 'PLC1', 'module': 'PLC1', 'class': 'PLC1', 'cpus': [1], 'after': ['FactorySimulation'],
+         'ready': (Controllers.PLCs[1]['ip'], Controllers.PLCs[1]['port']), 'env': {'ICS_SIM_METRICS_PORT': '9109'}},
+        {'name': 'PLC2', 'module': 'PLC2', 'class': 'PLC2', 'cpus': [2], 'after': ['FactorySimulation'],
+         'ready': (Controllers.PLCs[2]['ip'], Controllers.PLCs[2]['port']), 'env': {'ICS_SIM_METRICS_PORT': '9110'}},
+        {'name': 'HMI1', 'module': 'HMI1', 'class': 'HMI1', 'cpus': [3], 'after': ['PLC1', 'PLC2'],
+         'env': {'ICS_SIM_METRICS_PORT': '9111'}},
+    ]
+
 
 class Connection:
     SQLITE_CONNECTION = {'type': 'sqlite',  'path': 'storage/PhysicalSimulation1.sqlite', 'name': 'fp_table'}
+    SQLITE_WAL_CONNECTION = {'type': 'sqlite-wal', 'path': 'storage/PhysicalSimulation1.sqlite', 'name': 'fp_table'}
     MEMCACHE_DOCKER_CONNECTION = {'type': 'memcache', 'path': '192.168.1.31:11211',       'name': 'fp_table'}
     MEMCACHE_LOCAL_CONNECTION  = {'type': 'memcache', 'path': '127.0.0.1:11211',          'name': 'fp_table'}
+    MEMCACHE_PIPELINED_DOCKER_CONNECTION = {'type': 'memcache-pipelined', 'path': '192.168.1.31:11211', 'name': 'fp_table'}
     File_CONNECTION            = {'type': 'file',     'path': 'storage/sensors_actuators.json', 'name': 'fake_name'}
+    SHM_CONNECTION             = {'type': 'shm',      'path': 'icssim_fp_table', 'name': 'fp_table', 'tags': TAG.TAG_LIST}
+    MMAP_CONNECTION            = {'type': 'mmap',     'path': 'storage/fp_table.tags', 'name': 'fp_table', 'tags': TAG.TAG_LIST}
+    # Unix domain socket of the change notification bus, see ics_sim.tagbus
+    TAG_BUS_PATH               = 'storage/tag_bus.sock'
+    # time-series history of the tag store, see HistoryConnector
+    HISTORY_PATH               = 'storage/history.sqlite'
 
     CONNECTION_CONFIG = {
-        SimulationConfig.EXECUTION_MODE_GNS3:   MEMCACHE_DOCKER_CONNECTION,
-        SimulationConfig.EXECUTION_MODE_DOCKER: SQLITE_CONNECTION,
-        SimulationConfig.EXECUTION_MODE_LOCAL:  SQLITE_CONNECTION
+        SimulationConfig.EXECUTION_MODE_GNS3:   MEMCACHE_PIPELINED_DOCKER_CONNECTION,
+        SimulationConfig.EXECUTION_MODE_DOCKER: SQLITE_WAL_CONNECTION,
+        SimulationConfig.EXECUTION_MODE_LOCAL:  SQLITE_WAL_CONNECTION
     }
     CONNECTION = CONNECTION_CONFIG[SimulationConfig.EXECUTION_MODE]
@@ -4,7 +4,7 @@ import os
 import random
 
 from time import sleep
-from ics_sim.Device import HMI, Runnable
+from ics_sim.Device import HMI, Runnable, RunnableRuntime
 from Configs import TAG, Controllers
 
 
@@ -28,8 +28,8 @@ class DDosAgent(HMI):
         self.chunk = 10
 
     def _before_start(self):
+        # the runtime starts the agents 5 seconds late, see __main__
         self._set_clear_scr(False)
-        sleep(5)
         self.report(f'selected target = {self.__target}', level=logging.INFO)
 
     def _logic(self):
@@ -75,6 +75,11 @@ class DDosAgent(HMI):
         parser.add_argument('--timeout', metavar='timeout for attack', type=float, default=60,
                             help='interval to apply attack', required=False)
 
+        parser.add_argument('--threads', metavar='runtime threads', type=int, default=None,
+                            help='threads the agents are scheduled on, one per agent by default; every agent '
+                                 'blocks on its requests, so fewer threads means fewer requests in flight',
+                            required=False)
+
         return parser.parse_args()
 
 
@@ -94,15 +99,15 @@ if __name__ == '__main__':
 
     attackers_count = 70
 
-    attacker_list = []
+    # a scheduler thread per agent keeps attackers_count requests in flight against the PLC,
+    # fewer --threads lower the attack's concurrency
+    runtime = RunnableRuntime(args.threads or attackers_count)
     for i in range(attackers_count):
-        attacker_list.append(
-            DDosAgent(name=f'DDoS_Agent_{args.name_prefix}_{i}', target_ip=args.target, shared_logger=logger))
+        runtime.add(DDosAgent(name=f'DDoS_Agent_{args.name_prefix}_{i}', target_ip=args.target, shared_logger=logger),
+                    delay=5)
 
-    for attacker in attacker_list:
-        attacker.start()
+    runtime.start()
 
     sleep(args.timeout)
 
-    for attacker in attacker_list:
-        attacker.stop()
+    runtime.stop()
@@ -6,10 +6,22 @@ import json
 from datetime import datetime, timedelta
 
 from ics_sim.Device import HIL
+from ics_sim import logpipeline
 from Configs import TAG, PHYSICS, Connection
 
 
 class FactorySimulation(HIL):
+    # Plant state and commands read at the start of every scan
+    READ_TAGS = [
+        TAG.TAG_CORE_NEUTRON_FLUX_VALUE, TAG.TAG_CORE_TEMP_IN_VALUE, TAG.TAG_CORE_TEMP_OUT_VALUE,
+        TAG.TAG_CORE_PRESSURE_VALUE, TAG.TAG_CORE_FLOW_VALUE,
+        TAG.TAG_CORE_RCP_SPEED_CMD, TAG.TAG_CORE_COOLANT_VALVE_CMD, TAG.TAG_PRIMARY_LOOP_VALVE_CMD,
+        TAG.TAG_CORE_CONTROL_ROD_POS_VALUE, TAG.TAG_CORE_NEUTRON_FLUX_SP,
+        TAG.TAG_CORE_PRESSURIZER_HEATER_CMD, TAG.TAG_CORE_PRESSURIZER_SPRAY_CMD, TAG.TAG_CORE_RELIEF_VALVE_STATUS,
+        TAG.TAG_SG_SEC_TEMP_IN_VALUE, TAG.TAG_SG_SEC_TEMP_OUT_VALUE, TAG.TAG_SG_STEAM_PRESSURE_VALUE,
+        TAG.TAG_SG_LEVEL_VALUE, TAG.TAG_SG_RELIEF_VALVE_STATUS, TAG.TAG_SG_FEEDWATER_VALVE_CMD,
+    ]
+
     def __init__(self):
         super().__init__('Factory', Connection.CONNECTION, 100)  # 100 ms loop
 
@@ -17,10 +29,10 @@ class FactorySimulation(HIL):
         os.makedirs("src/logs", exist_ok=True)
         self._sensor_logger = logging.getLogger("FACTORY_SENSORS")
         self._sensor_logger.setLevel(logging.INFO)
-        if not any(isinstance(h, logging.FileHandler) and getattr(h, "_factory_handler", False)
+        if not any(getattr(h, "_factory_handler", False)
                    for h in self._sensor_logger.handlers):
             log_path = os.getenv("SENSOR_LOG_PATH", "src/logs/logs-Factory.log")
-            fh = logging.FileHandler(log_path, mode="a", encoding="utf-8")
+            fh = logpipeline.file_handler(log_path, mode="a", encoding="utf-8")
             fh._factory_handler = True
             fh.setLevel(logging.INFO)
             fh.setFormatter(logging.Formatter(
@@ -52,38 +64,41 @@ class FactorySimulation(HIL):
             dt = 1
         dt_s = dt / 1000.0
 
+        # All plant state for this scan is fetched in one connector round trip
+        tags = self._get_many(self.READ_TAGS)
+
         # =========================
         # Read current primary state
         # =========================
-        flux     = self._get(TAG.TAG_CORE_NEUTRON_FLUX_VALUE)
-        temp_in  = self._get(TAG.TAG_CORE_TEMP_IN_VALUE)
-        temp_out = self._get(TAG.TAG_CORE_TEMP_OUT_VALUE)
-        pressure = self._get(TAG.TAG_CORE_PRESSURE_VALUE)
-        flow     = self._get(TAG.TAG_CORE_FLOW_VALUE)
+        flux     = tags[TAG.TAG_CORE_NEUTRON_FLUX_VALUE]
+        temp_in  = tags[TAG.TAG_CORE_TEMP_IN_VALUE]
+        temp_out = tags[TAG.TAG_CORE_TEMP_OUT_VALUE]
+        pressure = tags[TAG.TAG_CORE_PRESSURE_VALUE]
+        flow     = tags[TAG.TAG_CORE_FLOW_VALUE]
 
         # Primary commands / setpoints
-        rcp_cmd      = self._get(TAG.TAG_CORE_RCP_SPEED_CMD)             # 0..1
-        cool_valve   = self._get(TAG.TAG_CORE_COOLANT_VALVE_CMD)         # 0..1
-        loop_valve   = self._get(TAG.TAG_PRIMARY_LOOP_VALVE_CMD)         # 0..1
-        rod_pos      = self._get(TAG.TAG_CORE_CONTROL_ROD_POS_VALUE)     # %
-        flux_sp      = self._get(TAG.TAG_CORE_NEUTRON_FLUX_SP)           # a.u.
+        rcp_cmd      = tags[TAG.TAG_CORE_RCP_SPEED_CMD]             # 0..1
+        cool_valve   = tags[TAG.TAG_CORE_COOLANT_VALVE_CMD]         # 0..1
+        loop_valve   = tags[TAG.TAG_PRIMARY_LOOP_VALVE_CMD]         # 0..1
+        rod_pos      = tags[TAG.TAG_CORE_CONTROL_ROD_POS_VALUE]     # %
+        flux_sp      = tags[TAG.TAG_CORE_NEUTRON_FLUX_SP]           # a.u.
 
         # Pressurizer actions
-        heater_cmd   = self._get(TAG.TAG_CORE_PRESSURIZER_HEATER_CMD)    # 0..1
-        spray_cmd    = self._get(TAG.TAG_CORE_PRESSURIZER_SPRAY_CMD)     # 0..1
-        relief_open  = 1.0 if self._get(TAG.TAG_CORE_RELIEF_VALVE_STATUS) else 0.0
+        heater_cmd   = tags[TAG.TAG_CORE_PRESSURIZER_HEATER_CMD]    # 0..1
+        spray_cmd    = tags[TAG.TAG_CORE_PRESSURIZER_SPRAY_CMD]     # 0..1
+        relief_open  = 1.0 if tags[TAG.TAG_CORE_RELIEF_VALVE_STATUS] else 0.0
 
         # =========================
         # Read current secondary state
         # =========================
-        sg_sec_t_in   = self._get(TAG.TAG_SG_SEC_TEMP_IN_VALUE)          # °C
-        sg_sec_t_out  = self._get(TAG.TAG_SG_SEC_TEMP_OUT_VALUE)         # °C
-        sg_p          = self._get(TAG.TAG_SG_STEAM_PRESSURE_VALUE)       # MPa
-        sg_level      = self._get(TAG.TAG_SG_LEVEL_VALUE)                # %
-        sg_relief     = 1.0 if self._get(TAG.TAG_SG_RELIEF_VALVE_STATUS) else 0.0
+        sg_sec_t_in   = tags[TAG.TAG_SG_SEC_TEMP_IN_VALUE]          # °C
+        sg_sec_t_out  = tags[TAG.TAG_SG_SEC_TEMP_OUT_VALUE]         # °C
+        sg_p          = tags[TAG.TAG_SG_STEAM_PRESSURE_VALUE]       # MPa
+        sg_level      = tags[TAG.TAG_SG_LEVEL_VALUE]                # %
+        sg_relief     = 1.0 if tags[TAG.TAG_SG_RELIEF_VALVE_STATUS] else 0.0
 
         # Secondary commands
-        sg_fw_cmd     = self._get(TAG.TAG_SG_FEEDWATER_VALVE_CMD)        # 0..1
+        sg_fw_cmd     = tags[TAG.TAG_SG_FEEDWATER_VALVE_CMD]        # 0..1
 
         # =========================
         # PRIMARY: actuator dynamics
@@ -97,9 +112,6 @@ class FactorySimulation(HIL):
             self._loop_valve_eff + (loop_valve - self._loop_valve_eff) * (PHYSICS.VALVE_INERTIA * dt)
         )
 
-        # Provide a measured position for the loop valve
-        self._set(TAG.TAG_PRIMARY_LOOP_VALVE_POS_VALUE, self._loop_valve_eff)
-
         # Reactivity / flux
         reactivity = max(0.05, 1.0 - (rod_pos / 120.0))
         flux_target = max(0.0, flux_sp * reactivity)
@@ -182,22 +194,27 @@ class FactorySimulation(HIL):
         sg_leak = max(0.0, sg_leak + random.gauss(0, 0.003))
 
         # =========================
-        # Write back sensors
+        # Write back sensors (one connector round trip)
         # =========================
-        self._set(TAG.TAG_CORE_NEUTRON_FLUX_VALUE, flux)
-        self._set(TAG.TAG_CORE_TEMP_IN_VALUE,      temp_in)
-        self._set(TAG.TAG_CORE_TEMP_OUT_VALUE,     temp_out)
-        self._set(TAG.TAG_CORE_PRESSURE_VALUE,     pressure)
-        self._set(TAG.TAG_CORE_FLOW_VALUE,         flow)
-        self._set(TAG.TAG_SG_IN_PRESSURE_VALUE,    sg_in_p)
-        self._set(TAG.TAG_PRIMARY_RAD_MON_VALUE,   rad)
-
-        self._set(TAG.TAG_SG_SEC_TEMP_IN_VALUE,    sg_sec_t_in)
-        self._set(TAG.TAG_SG_SEC_TEMP_OUT_VALUE,   sg_sec_t_out)
-        self._set(TAG.TAG_SG_STEAM_PRESSURE_VALUE, sg_p)
-        self._set(TAG.TAG_SG_LEVEL_VALUE,          sg_level)
-        self._set(TAG.TAG_SG_FEEDWATER_FLOW_VALUE, self._sg_fw_meas)
-        self._set(TAG.TAG_SG_LEAK_MON_VALUE,       sg_leak)
+        self._set_many({
+            # Provide a measured position for the loop valve
+            TAG.TAG_PRIMARY_LOOP_VALVE_POS_VALUE: self._loop_valve_eff,
+
+            TAG.TAG_CORE_NEUTRON_FLUX_VALUE: flux,
+            TAG.TAG_CORE_TEMP_IN_VALUE:      temp_in,
+            TAG.TAG_CORE_TEMP_OUT_VALUE:     temp_out,
+            TAG.TAG_CORE_PRESSURE_VALUE:     pressure,
+            TAG.TAG_CORE_FLOW_VALUE:         flow,
+            TAG.TAG_SG_IN_PRESSURE_VALUE:    sg_in_p,
+            TAG.TAG_PRIMARY_RAD_MON_VALUE:   rad,
+
+            TAG.TAG_SG_SEC_TEMP_IN_VALUE:    sg_sec_t_in,
+            TAG.TAG_SG_SEC_TEMP_OUT_VALUE:   sg_sec_t_out,
+            TAG.TAG_SG_STEAM_PRESSURE_VALUE: sg_p,
+            TAG.TAG_SG_LEVEL_VALUE:          sg_level,
+            TAG.TAG_SG_FEEDWATER_FLOW_VALUE: self._sg_fw_meas,
+            TAG.TAG_SG_LEAK_MON_VALUE:       sg_leak,
+        })
 
         # =========================
         # Sensor logging → src/logs/logs-Factory.log
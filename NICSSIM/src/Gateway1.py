@@ -0,0 +1,13 @@
+from ics_sim.gateway import Gateway
+from Configs import TAG, Controllers
+
+
+class Gateway1(Gateway):
+    def __init__(self):
+        super().__init__(Controllers.GATEWAY['name'], TAG.TAG_LIST, Controllers.PLCs,
+                         Controllers.GATEWAY['ip'], Controllers.GATEWAY['port'])
+
+
+if __name__ == '__main__':
+    gateway = Gateway1()
+    gateway.start()
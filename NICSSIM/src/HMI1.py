@@ -3,12 +3,25 @@ import os
 from datetime import datetime
 
 from ics_sim.Device import HMI
+from ics_sim import logpipeline
 from Configs import TAG, Controllers
 
 
 class HMI1(HMI):
+    # tags of the one-line snapshot written to the log file
+    LOG_TAGS = [
+        TAG.TAG_CORE_NEUTRON_FLUX_VALUE, TAG.TAG_CORE_NEUTRON_FLUX_SP, TAG.TAG_CORE_TEMP_IN_VALUE,
+        TAG.TAG_CORE_TEMP_OUT_VALUE, TAG.TAG_CORE_PRESSURE_VALUE, TAG.TAG_CORE_FLOW_VALUE,
+        TAG.TAG_SG_IN_PRESSURE_VALUE, TAG.TAG_PRIMARY_RAD_MON_VALUE, TAG.TAG_PRIMARY_LOOP_VALVE_POS_VALUE,
+        TAG.TAG_SG_SEC_TEMP_IN_VALUE, TAG.TAG_SG_SEC_TEMP_OUT_VALUE, TAG.TAG_SG_STEAM_PRESSURE_VALUE,
+        TAG.TAG_SG_LEVEL_VALUE, TAG.TAG_SG_FEEDWATER_FLOW_VALUE, TAG.TAG_SG_FEEDWATER_VALVE_CMD,
+        TAG.TAG_SG_FEEDWATER_VALVE_MODE, TAG.TAG_SG_RELIEF_VALVE_STATUS, TAG.TAG_CORE_ALARM_STATUS,
+    ]
+
     def __init__(self):
-        super().__init__('HMI1', TAG.TAG_LIST, Controllers.PLCs, 500)
+        super().__init__('HMI1', TAG.TAG_LIST, Controllers.client_plcs(), 500)
+        # the display refreshes from report-by-exception subscriptions rather than a full poll per cycle
+        self.set_subscription(self.tags)
 
         self.title_length = 36
         self.msg1_length = 22
@@ -161,9 +174,9 @@ class HMI1(HMI):
         os.makedirs("src/logs", exist_ok=True)
         self._logger = logging.getLogger("HMI1_SNAPSHOTS")
         self._logger.setLevel(logging.INFO)
-        if not any(isinstance(h, logging.FileHandler) and getattr(h, "_hmi1_handler", False)
+        if not any(getattr(h, "_hmi1_handler", False)
                    for h in self._logger.handlers):
-            fh = logging.FileHandler("src/logs/logs-HMI1.log", mode="a", encoding="utf-8")
+            fh = logpipeline.file_handler("src/logs/logs-HMI1.log", mode="a", encoding="utf-8")
             fh._hmi1_handler = True
             fh.setLevel(logging.INFO)
             fh.setFormatter(logging.Formatter(
@@ -184,6 +197,15 @@ class HMI1(HMI):
     def __update_messages(self):
         self._latency = 0
 
+        # one block read per PLC instead of one request per tag
+        timestamp = datetime.now()
+        try:
+            values = self._receive_many(self.tags)
+        except Exception as e:
+            self.report(e.__str__(), logging.WARNING)
+            values = {}
+        self._latency = (datetime.now() - timestamp).microseconds
+
         # Clear cells
         for row in self._rows:
             if row["type"] == "data":
@@ -197,9 +219,9 @@ class HMI1(HMI):
                 if row["type"] != "data" or row.get("key") != key:
                     continue
                 if suffix in ("value", "status"):
-                    row["msg2"] += self.__get_formatted_value(tag_name)
+                    row["msg2"] += self.__get_formatted_value(tag_name, values)
                 else:
-                    row["msg1"] += self.__get_formatted_value(tag_name)
+                    row["msg1"] += self.__get_formatted_value(tag_name, values)
 
         # Pad empties
         for row in self._rows:
@@ -210,36 +232,38 @@ class HMI1(HMI):
             if not row["msg2"]:
                 row["msg2"] = "".center(self.msg2_length, " ")
 
-    def __get_val(self, tag, default="NULL"):
+    def __log_one_line_snapshot(self):
         try:
-            return self._receive(tag)
+            values = self._receive_many(self.LOG_TAGS)
         except Exception:
-            return default
+            values = {}
+
+        def get_val(tag, default="NULL"):
+            return values.get(tag, default)
 
-    def __log_one_line_snapshot(self):
         # Grab key points across Parts 1–3
-        flux   = self.__get_val(TAG.TAG_CORE_NEUTRON_FLUX_VALUE)
-        fluxsp = self.__get_val(TAG.TAG_CORE_NEUTRON_FLUX_SP)
-        t_in   = self.__get_val(TAG.TAG_CORE_TEMP_IN_VALUE)
-        t_out  = self.__get_val(TAG.TAG_CORE_TEMP_OUT_VALUE)
-        p_core = self.__get_val(TAG.TAG_CORE_PRESSURE_VALUE)
-        flow   = self.__get_val(TAG.TAG_CORE_FLOW_VALUE)
+        flux   = get_val(TAG.TAG_CORE_NEUTRON_FLUX_VALUE)
+        fluxsp = get_val(TAG.TAG_CORE_NEUTRON_FLUX_SP)
+        t_in   = get_val(TAG.TAG_CORE_TEMP_IN_VALUE)
+        t_out  = get_val(TAG.TAG_CORE_TEMP_OUT_VALUE)
+        p_core = get_val(TAG.TAG_CORE_PRESSURE_VALUE)
+        flow   = get_val(TAG.TAG_CORE_FLOW_VALUE)
 
-        p_sgin = self.__get_val(TAG.TAG_SG_IN_PRESSURE_VALUE)
-        rad    = self.__get_val(TAG.TAG_PRIMARY_RAD_MON_VALUE)
-        lv_pos = self.__get_val(TAG.TAG_PRIMARY_LOOP_VALVE_POS_VALUE)
+        p_sgin = get_val(TAG.TAG_SG_IN_PRESSURE_VALUE)
+        rad    = get_val(TAG.TAG_PRIMARY_RAD_MON_VALUE)
+        lv_pos = get_val(TAG.TAG_PRIMARY_LOOP_VALVE_POS_VALUE)
 
-        sg_tin  = self.__get_val(TAG.TAG_SG_SEC_TEMP_IN_VALUE)
-        sg_tout = self.__get_val(TAG.TAG_SG_SEC_TEMP_OUT_VALUE)
-        sg_p    = self.__get_val(TAG.TAG_SG_STEAM_PRESSURE_VALUE)
-        sg_lvl  = self.__get_val(TAG.TAG_SG_LEVEL_VALUE)
-        sg_fw   = self.__get_val(TAG.TAG_SG_FEEDWATER_FLOW_VALUE)
+        sg_tin  = get_val(TAG.TAG_SG_SEC_TEMP_IN_VALUE)
+        sg_tout = get_val(TAG.TAG_SG_SEC_TEMP_OUT_VALUE)
+        sg_p    = get_val(TAG.TAG_SG_STEAM_PRESSURE_VALUE)
+        sg_lvl  = get_val(TAG.TAG_SG_LEVEL_VALUE)
+        sg_fw   = get_val(TAG.TAG_SG_FEEDWATER_FLOW_VALUE)
 
-        fw_cmd  = self.__get_val(TAG.TAG_SG_FEEDWATER_VALVE_CMD)
-        fw_mode = self.__get_val(TAG.TAG_SG_FEEDWATER_VALVE_MODE)
-        sg_rel  = self.__get_val(TAG.TAG_SG_RELIEF_VALVE_STATUS)
+        fw_cmd  = get_val(TAG.TAG_SG_FEEDWATER_VALVE_CMD)
+        fw_mode = get_val(TAG.TAG_SG_FEEDWATER_VALVE_MODE)
+        sg_rel  = get_val(TAG.TAG_SG_RELIEF_VALVE_STATUS)
 
-        alarm   = self.__get_val(TAG.TAG_CORE_ALARM_STATUS)
+        alarm   = get_val(TAG.TAG_CORE_ALARM_STATUS)
 
         # Build a compact, single-line message
         line = (
@@ -269,17 +293,9 @@ class HMI1(HMI):
             return str(v)
         return {1: "Off", 2: "On", 3: "Auto"}.get(v, str(v))
 
-    def __get_formatted_value(self, tag):
-        timestamp = datetime.now()
+    def __get_formatted_value(self, tag, values):
         suffix = tag.rsplit('_', 1)[1]
-
-        try:
-            value = self._receive(tag)
-            err = None
-        except Exception as e:
-            self.report(e.__str__(), logging.WARNING)
-            value = "NULL"
-            err = e
+        value = values.get(tag, "NULL")
 
         if suffix == "mode":
             if value == 1:
@@ -307,9 +323,6 @@ class HMI1(HMI):
                 shown = value
             value = self._make_text(str(shown).center(self.msg2_length, " "), self.COLOR_CYAN)
 
-        elapsed = datetime.now() - timestamp
-        if elapsed.microseconds > self._latency:
-            self._latency = elapsed.microseconds
         return value
 
     def __show_table(self):
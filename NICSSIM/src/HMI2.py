@@ -8,7 +8,7 @@ from Configs import TAG, Controllers
 
 class HMI2(HMI):
     def __init__(self):
-        super().__init__('HMI2', TAG.TAG_LIST, Controllers.PLCs)
+        super().__init__('HMI2', TAG.TAG_LIST, Controllers.client_plcs())
 
     def _display(self):
         menu_line = '{}) To change the {} press {} \n'
@@ -10,7 +10,7 @@ from Configs import TAG, Controllers
 
 class HMI3(HMI):
     def __init__(self):
-        super().__init__('HMI3', TAG.TAG_LIST, Controllers.PLCs)
+        super().__init__('HMI3', TAG.TAG_LIST, Controllers.client_plcs())
 
 
     def _before_start(self):
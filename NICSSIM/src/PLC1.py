@@ -2,6 +2,7 @@ import logging
 import os
 
 from ics_sim.Device import PLC, SensorConnector, ActuatorConnector
+from ics_sim import logpipeline
 from Configs import TAG, Controllers, Connection
 
 
@@ -27,9 +28,9 @@ class PLC1(PLC):
         os.makedirs("src/logs", exist_ok=True)
         self._logger = logging.getLogger("PLC1_DECISIONS")
         self._logger.setLevel(logging.INFO)
-        if not any(isinstance(h, logging.FileHandler) and getattr(h, "_plc1_handler", False)
+        if not any(getattr(h, "_plc1_handler", False)
                    for h in self._logger.handlers):
-            fh = logging.FileHandler("src/logs/logs-plc1.log", mode="a", encoding="utf-8")
+            fh = logpipeline.file_handler("src/logs/logs-plc1.log", mode="a", encoding="utf-8")
             fh._plc1_handler = True
             fh.setLevel(logging.INFO)
             fh.setFormatter(logging.Formatter(
@@ -49,6 +50,12 @@ class PLC1(PLC):
     # ---------- small helpers ----------
     def _read_many(self, tags):
         """Read a dict of tag->value."""
+        try:
+            return self._get_many(tags)
+        except Exception:
+            # fall back to single reads so a failing tag is reported on its own
+            pass
+
         out = {}
         for t in tags:
             try:
@@ -131,11 +138,11 @@ class PLC1(PLC):
             "READS core: flux=%.3f Tin=%.3f Tout=%.3f P=%.3f PsgIn=%.3f Flow=%.3f Rad=%.3f | "
             "sg: Tin=%.3f Tout=%.3f P=%.3f Lvl=%.3f Fw=%.3f | "
             "LIMS: TMax=%.3f PMax=%.3f PHiHi=%.3f Fmin=%.3f RadMax=%.3f | "
-            "SG: Lmin=%.3f Lmax=%.3f Pmax=%.3f PHiHi=%.3f" %
-            (flux, t_in, t_out, p_core, p_sg_in, flow, rad,
-             sg_t_in, sg_t_out, sg_p, sg_level, sg_fwflow,
-             tmax, pmax, phihi, fmin, radmax,
-             sg_lvl_min, sg_lvl_max, sg_p_max, sg_p_hihi)
+            "SG: Lmin=%.3f Lmax=%.3f Pmax=%.3f PHiHi=%.3f",
+            flux, t_in, t_out, p_core, p_sg_in, flow, rad,
+            sg_t_in, sg_t_out, sg_p, sg_level, sg_fwflow,
+            tmax, pmax, phihi, fmin, radmax,
+            sg_lvl_min, sg_lvl_max, sg_p_max, sg_p_hihi
         )
 
         # ===========================
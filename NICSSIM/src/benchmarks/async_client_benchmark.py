@@ -0,0 +1,129 @@
+"""Request rate of the synchronous and the asyncio Modbus clients.
+
+Run from the src directory against a local ServerModbus (started on a free
+port) or against a running PLC:
+
+    python -m benchmarks.async_client_benchmark --requests 5000 --in-flight 64 --rtt-ms 1
+    python -m benchmarks.async_client_benchmark --server 192.168.0.11:502
+
+Both clients read single tags on one connection; ClientModbus waits for
+every answer, AsyncClientModbus keeps up to --in-flight requests pipelined.
+The local server runs in its own process so that it does not compete with
+the client for the interpreter lock; --rtt-ms puts a proxy in front of it
+which delays every segment by half the round trip time in each direction,
+emulating the network between the containers.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+from ics_sim.protocol import AsyncClientModbus, ClientModbus, ServerModbus
+
+
+def run_sync(ip, port, requests):
+    client = ClientModbus(ip, port)
+    start = time.perf_counter()
+    for index in range(requests):
+        client.receive(index % 40)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return requests / elapsed
+
+
+async def run_async(ip, port, requests, in_flight):
+    client = AsyncClientModbus(ip, port)
+    await client.open()
+
+    async def worker(worker_id):
+        for index in range(worker_id, requests, in_flight):
+            await client.receive(index % 40)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(in_flight)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return requests / elapsed
+
+
+async def forward(reader, writer, delay):
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            writer.close()
+            return
+        # timers with the same delay fire in order, so the stream stays ordered
+        loop.call_later(delay, writer.write, data)
+
+
+async def delay_proxy(ip, port, server_port, delay, stop_event):
+    async def connect(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(ip, server_port)
+        for stream_writer in (client_writer, server_writer):
+            stream_writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        await asyncio.gather(forward(client_reader, server_writer, delay),
+                             forward(server_reader, client_writer, delay))
+
+    proxy = await asyncio.start_server(connect, ip, port)
+    while not stop_event.is_set():
+        await asyncio.sleep(0.1)
+    proxy.close()
+
+
+def free_port(ip):
+    probe = socket.socket()
+    probe.bind((ip, 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def serve(ip, port, rtt, stop_event):
+    if not rtt:
+        server = ServerModbus(ip, port)
+        server.start()
+        stop_event.wait()
+        server.stop()
+        return
+
+    server_port = free_port(ip)
+    server = ServerModbus(ip, server_port)
+    server.start()
+    asyncio.run(delay_proxy(ip, port, server_port, rtt / 2, stop_event))
+    server.stop()
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Modbus client request rate benchmark')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--in-flight', type=int, default=32, help='pipelined requests of the asyncio client')
+    parser.add_argument('--server', help='ip:port of a Modbus server (default: start a local ServerModbus)')
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='round trip time emulated for the local server')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    server = None
+    if args.server is None:
+        ip = '127.0.0.1'
+        port = free_port(ip)
+        stop_event = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(ip, port, args.rtt_ms / 1000, stop_event))
+        server.start()
+        time.sleep(0.5)
+    else:
+        ip, port = args.server.split(':')
+        port = int(port)
+
+    print('{:<32}{:>16}'.format('client', 'requests/sec'))
+    print('{:<32}{:>16.0f}'.format('ClientModbus', run_sync(ip, port, args.requests)))
+    label = 'AsyncClientModbus ({} in flight)'.format(args.in_flight)
+    print('{:<32}{:>16.0f}'.format(label, asyncio.run(run_async(ip, port, args.requests, args.in_flight))))
+
+    if server is not None:
+        stop_event.set()
+        server.join()
@@ -0,0 +1,103 @@
+"""Micro-benchmark of the Modbus register codec.
+
+Run from the src directory:
+
+    python -m benchmarks.codec_benchmark --rounds 2000
+
+Every round encodes the default values of all TAG.TAG_LIST tags to register
+words and decodes them again, once with the original per-tag pure-Python
+ModbusBase loop (reproduced below), once tag by tag through the current
+ModbusBase.encode/decode and once as a whole array through encode_many and
+decode_many. Times are reported in microseconds per round.
+
+The last two cases sync the values with a ServerModbus register bank the way
+a PLC scan does: one server.set/get per tag, or one RegisterView write and
+read for all of them.
+"""
+import argparse
+import time
+
+from Configs import TAG
+from ics_sim.protocol import ModbusBase, ModbusCodec, ServerModbus
+
+
+def legacy_encode(number, word_num=2, precision=4):
+    number = int(number * pow(10, precision))
+    result = []
+    while number:
+        result.append(number % pow(2, 16))
+        number = int(number / pow(2, 16))
+    while len(result) < word_num:
+        result.append(0)
+    result.reverse()
+    return result
+
+
+def legacy_decode(word_array, precision=4):
+    base_holder = 1
+    result = 0
+    for word in word_array:
+        result *= base_holder
+        result += word
+        base_holder *= pow(2, 16)
+    return result / pow(10, precision)
+
+
+def legacy_round(values):
+    return [legacy_decode(legacy_encode(value)) for value in values]
+
+
+def single_round(modbus_base, values):
+    return [modbus_base.decode(modbus_base.encode(value)) for value in values]
+
+
+def array_round(modbus_base, values, layouts):
+    return modbus_base.decode_many(modbus_base.encode_many(values, layouts), layouts)
+
+
+def server_round(server, tag_ids, values):
+    for tag_id, value in zip(tag_ids, values):
+        server.set(tag_id, value)
+    return [server.get(tag_id) for tag_id in tag_ids]
+
+
+def view_round(view, values):
+    view.write(values)
+    return view.read()
+
+
+def measure(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return (time.perf_counter() - start) / rounds * 1000000
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Modbus register codec benchmark')
+    parser.add_argument('--rounds', type=int, default=2000)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    modbus_base = ModbusBase()
+    values = [TAG.TAG_LIST[tag]['default'] for tag in TAG.TAG_LIST]
+    tag_ids = [TAG.TAG_LIST[tag]['id'] for tag in TAG.TAG_LIST]
+    server = ServerModbus('127.0.0.1', 0)
+    view = server.view(tag_ids)
+
+    cases = [
+        ('legacy per tag', lambda: legacy_round(values)),
+        ('ModbusBase per tag', lambda: single_round(modbus_base, values)),
+        ('encode_many fixed', lambda: array_round(modbus_base, values, None)),
+        ('encode_many float32', lambda: array_round(modbus_base, values, [ModbusCodec.FLOAT32] * len(values))),
+        ('encode_many float64', lambda: array_round(modbus_base, values, [ModbusCodec.FLOAT64] * len(values))),
+        ('server set/get per tag', lambda: server_round(server, tag_ids, values)),
+        ('RegisterView write/read', lambda: view_round(view, values)),
+    ]
+
+    print('{} tags per round'.format(len(values)))
+    print('{:<24}{:>16}'.format('codec', 'us/round'))
+    for label, function in cases:
+        print('{:<24}{:>16.1f}'.format(label, measure(function, args.rounds)))
@@ -0,0 +1,82 @@
+"""Throughput benchmark for the tag store connectors.
+
+Run from the src directory:
+
+    python -m benchmarks.connector_benchmark --ops 5000
+
+Each connector is initialized with the default values of TAG.TAG_LIST in a
+temporary directory, then single tag reads and writes are timed and reported
+as operations per second. The last column times a FactorySimulation-like scan
+(all tags read with get_many, then written back with set_many).
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from Configs import TAG
+from ics_sim.connectors import ConnectorFactory
+
+
+def build_connections(directory):
+    sqlite_path = os.path.join(directory, 'benchmark.sqlite')
+    return {
+        'sqlite': {'type': 'sqlite', 'path': sqlite_path, 'name': 'fp_table'},
+        'sqlite-wal': {'type': 'sqlite-wal', 'path': sqlite_path, 'name': 'fp_table'},
+        'file': {'type': 'file', 'path': os.path.join(directory, 'benchmark.json'), 'name': 'fp_table'},
+        'shm': {'type': 'shm', 'path': 'icssim_benchmark', 'name': 'fp_table', 'tags': TAG.TAG_LIST},
+        'mmap': {'type': 'mmap', 'path': os.path.join(directory, 'benchmark.tags'), 'name': 'fp_table',
+                 'tags': TAG.TAG_LIST},
+    }
+
+
+def measure(function, tags, ops):
+    start = time.perf_counter()
+    for index in range(ops):
+        function(tags[index % len(tags)])
+    return ops / (time.perf_counter() - start)
+
+
+def measure_scans(connector, tags, scans):
+    values = {tag: 1.5 for tag in tags}
+    start = time.perf_counter()
+    for _ in range(scans):
+        connector.get_many(tags)
+        connector.set_many(values)
+    return scans / (time.perf_counter() - start)
+
+
+def run(connection, ops):
+    connector = ConnectorFactory.build(connection)
+    connector.initialize([(tag, TAG.TAG_LIST[tag]['default']) for tag in TAG.TAG_LIST])
+    tags = list(TAG.TAG_LIST)
+
+    get_rate = measure(connector.get, tags, ops)
+    set_rate = measure(lambda tag: connector.set(tag, 1.5), tags, ops)
+    scan_rate = measure_scans(connector, tags, max(1, ops // len(tags)))
+
+    if hasattr(connector, 'close'):
+        connector.close()
+    if hasattr(connector, 'unlink'):
+        connector.unlink()
+    return get_rate, set_rate, scan_rate
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Tag store connector benchmark')
+    parser.add_argument('--ops', type=int, default=2000, help='number of get and set operations per connector')
+    parser.add_argument('--types', nargs='*', help='connector types to run (default: all)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connections = build_connections(directory)
+        print('{:<24}{:>16}{:>16}{:>16}'.format('connector', 'get ops/sec', 'set ops/sec', 'scans/sec'))
+        for label, connection in connections.items():
+            if args.types and label not in args.types:
+                continue
+            rates = run(connection, args.ops)
+            print('{:<24}{:>16.0f}{:>16.0f}{:>16.0f}'.format(label, *rates))
@@ -0,0 +1,114 @@
+"""Memory and CPU cost of virtual PLCs in one PLCFarm.
+
+Run from the src directory:
+
+    python -m benchmarks.farm_benchmark --counts 1,10,50,100,250,500 --loop-ms 100
+
+For every count a fresh farm with that many virtual PLCs (247 unit ids per
+port) is built and run for --seconds. Each PLC runs a small tank level
+controller over its own register bank. Reported are the Python memory
+allocated per PLC (tracemalloc, while building the farm), the CPU used by
+the process as a share of one core, scans per second against the expected
+rate, the mean and maximum scan lateness, and the time to poll one tag of
+every PLC over Modbus/TCP (one pipelined connection per port).
+"""
+import argparse
+import asyncio
+import socket
+import struct
+import time
+import tracemalloc
+
+from ics_sim.farm import PLCFarm
+from ics_sim.protocol import MBAP_HEADER, READ_HOLDING_REGISTERS, ModbusFarmServer
+
+LEVEL, INFLOW, VALVE, SETPOINT = 0, 1, 2, 3
+
+
+def tank_logic(plc):
+    level, inflow, valve, setpoint = plc.view.read()
+    level = max(0.0, level + inflow - valve * 0.5)
+    valve = min(1.0, max(0.0, valve + 0.1 * (level - setpoint)))
+    plc.view.write([level, inflow, valve, setpoint])
+
+
+def free_ports(ip, count):
+    probes = []
+    for _ in range(count):
+        probe = socket.socket()
+        probe.bind((ip, 0))
+        probes.append(probe)
+    ports = [probe.getsockname()[1] for probe in probes]
+    for probe in probes:
+        probe.close()
+    return ports
+
+
+def build(ip, count, loop):
+    ports = free_ports(ip, (count - 1) // ModbusFarmServer.MAX_UNIT_ID + 1)
+    farm = PLCFarm(ip, ports[0])
+    for index in range(count):
+        plc = farm.add_plc('plc-{}'.format(index), tank_logic, loop, port=ports[index // ModbusFarmServer.MAX_UNIT_ID])
+        plc.view = plc.unit.view([LEVEL, INFLOW, VALVE, SETPOINT])
+        plc.view.write([50.0, 0.2, 0.5, 50.0])
+    return farm
+
+
+async def poll(ip, farm):
+    """Read the level of every PLC; one connection per port, all requests pipelined."""
+    by_port = {}
+    for port, unit_id in farm.server.units:
+        by_port.setdefault(port, []).append(unit_id)
+
+    async def poll_port(port, unit_ids):
+        reader, writer = await asyncio.open_connection(ip, port)
+        pdu = struct.pack('>BHH', READ_HOLDING_REGISTERS, LEVEL * 2, 2)
+        for transaction_id, unit_id in enumerate(unit_ids):
+            writer.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, unit_id) + pdu)
+        failed = 0
+        for _ in unit_ids:
+            _, _, length, _ = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+            failed += (await reader.readexactly(length - 1))[0] & 0x80 != 0
+        writer.close()
+        return failed
+
+    start = time.perf_counter()
+    failed = sum(await asyncio.gather(*(poll_port(port, unit_ids) for port, unit_ids in by_port.items())))
+    return (time.perf_counter() - start) * 1000, failed
+
+
+def run(ip, count, loop, seconds):
+    tracemalloc.start()
+    farm = build(ip, count, loop)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    farm.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    time.sleep(seconds)
+    poll_ms, failed = asyncio.run(poll(ip, farm))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    farm.stop()
+
+    stats = farm.get_stats()['scheduler']
+    scans = max(1, stats['scans'])
+    return (memory / count / 1024, cpu / wall * 100, stats['scans'] / wall, count * 1000 / loop,
+            stats['lateness_total'] / scans * 1000, stats['max_lateness'] * 1000, poll_ms, failed)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Virtual PLC farm benchmark')
+    parser.add_argument('--counts', default='1,10,50,100,250,500', help='comma separated numbers of PLCs')
+    parser.add_argument('--loop-ms', type=int, default=100, help='scan period of every PLC')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    print('{:>6}{:>12}{:>8}{:>14}{:>12}{:>14}{:>14}{:>10}{:>8}'.format(
+        'plcs', 'KiB/plc', 'cpu %', 'scans/sec', 'expected', 'mean late ms', 'max late ms', 'poll ms', 'failed'))
+    for count in [int(count) for count in args.counts.split(',')]:
+        print('{:>6}{:>12.1f}{:>8.1f}{:>14.0f}{:>12.0f}{:>14.3f}{:>14.3f}{:>10.2f}{:>8}'.format(
+            count, *run('127.0.0.1', count, args.loop_ms, args.seconds)))
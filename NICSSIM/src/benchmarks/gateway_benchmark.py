@@ -0,0 +1,88 @@
+"""PLC load with many HMIs, polling directly or through the Gateway.
+
+Run from the src directory:
+
+    python -m benchmarks.gateway_benchmark --hmis 1,5,20 --period-ms 200 --seconds 3
+
+A PLC (AsyncServerModbus holding the PLC1 tags of TAG.TAG_LIST) is polled by
+--hmis emulated HMIs, each reading all the tags with receive_many every
+--period-ms, first directly and then through a Gateway polling the PLC with
+the same period. Reported are the requests per second the PLC served and
+the p50 read latency seen by the HMIs.
+"""
+import argparse
+import threading
+import time
+
+from Configs import TAG
+from ics_sim.gateway import Gateway
+from ics_sim.protocol import AsyncServerModbus, ClientModbus
+
+IP = '127.0.0.1'
+PLC_PORT = 5602
+GATEWAY_PORT = 5603
+
+
+def hmi(port, unit_id, tag_ids, period, stop_event, latencies):
+    client = ClientModbus(IP, port, unit_id)
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        client.receive_many(tag_ids)
+        latencies.append((time.perf_counter() - start) * 1000)
+        stop_event.wait(period)
+    client.close()
+
+
+def run(hmis, period_ms, seconds, via_gateway):
+    tags = {tag: data for tag, data in TAG.TAG_LIST.items() if data['plc'] == 1}
+    tag_ids = [data['id'] for data in tags.values()]
+    plc = AsyncServerModbus(IP, PLC_PORT)
+    plc.start()
+
+    gateway = None
+    if via_gateway:
+        plcs = {1: {'name': 'PLC1', 'ip': IP, 'port': PLC_PORT, 'protocol': 'ModbusWriteRequest-TCP'}}
+        gateway = Gateway('GatewayBenchmark', tags, plcs, IP, GATEWAY_PORT, period_ms)
+        gateway.start()
+        time.sleep(period_ms / 1000)
+
+    stop_event = threading.Event()
+    latencies = []
+    port = GATEWAY_PORT if via_gateway else PLC_PORT
+    threads = [threading.Thread(target=hmi, args=(port, 1, tag_ids, period_ms / 1000, stop_event, latencies))
+               for _ in range(hmis)]
+    requests = plc.stats['requests']
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    requests = plc.stats['requests'] - requests
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    if gateway is not None:
+        gateway.stop()
+        time.sleep(period_ms / 1000)
+    plc.stop()
+
+    latencies.sort()
+    return requests / seconds, latencies[len(latencies) // 2] if latencies else 0.0
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Gateway PLC load benchmark')
+    parser.add_argument('--hmis', default='1,5,20', help='comma separated numbers of HMIs')
+    parser.add_argument('--period-ms', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    print('{:>6}{:>22}{:>16}{:>22}{:>16}'.format('hmis', 'direct PLC req/sec', 'direct p50 ms',
+                                                 'gateway PLC req/sec', 'gateway p50 ms'))
+    for count in [int(count) for count in args.hmis.split(',')]:
+        direct = run(count, args.period_ms, args.seconds, False)
+        cached = run(count, args.period_ms, args.seconds, True)
+        print('{:>6}{:>22.1f}{:>16.3f}{:>22.1f}{:>16.3f}'.format(count, *direct, *cached))
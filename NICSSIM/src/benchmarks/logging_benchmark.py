@@ -0,0 +1,88 @@
+"""Cost of Runnable.report on the calling thread, synchronous or through the log pipeline.
+
+Run from the src directory:
+
+    python -m benchmarks.logging_benchmark --threads 1,10,70 --records 2000
+
+Like the DDosAgents, --threads Runnables share one file logger and each
+reports --records INFO lines to a file in a temporary directory, and to
+the console with --console (redirect stdout to see a slow terminal or pipe).
+Reported are the p50 and p99 time of one report() call in microseconds and
+the pipeline's sampled out and dropped records (on stderr).
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import threading
+import time
+
+from ics_sim import logpipeline
+from ics_sim.Device import Runnable
+from ics_sim.configs import LoggingConfig
+
+
+class Reporter(Runnable):
+    def __init__(self, name, logger):
+        self.__shared_logger = logger
+        Runnable.__init__(self, name, 1000)
+
+    def _initialize_logger(self):
+        self._logger = self.__shared_logger
+
+    def _logic(self):
+        pass
+
+
+def run(threads, records, use_pipeline, console):
+    LoggingConfig.ASYNC = use_pipeline
+    LoggingConfig.CONSOLE = console
+    if use_pipeline:
+        logpipeline._pipeline = None
+    logger = Runnable.setup_logger('logging-benchmark-{}-{}'.format(threads, use_pipeline),
+                                   logging.Formatter('%(asctime)s %(levelname)s %(message)s'),
+                                   file_dir=tempfile.mkdtemp())
+    reporters = [Reporter('Reporter{}'.format(index), logger) for index in range(threads)]
+    times = []
+
+    def report(reporter):
+        elapsed = []
+        for index in range(records):
+            start = time.perf_counter_ns()
+            reporter.report('sent {} read requests for {}'.format(index, 'TAG_CORE_FLUX'), logging.INFO)
+            elapsed.append(time.perf_counter_ns() - start)
+        times.extend(elapsed)
+
+    workers = [threading.Thread(target=report, args=(reporter,)) for reporter in reporters]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    stats = logpipeline.get_stats() if use_pipeline else {}
+    if use_pipeline:
+        logpipeline.get_pipeline().stop()
+    logger.handlers = []
+    times.sort()
+    return (times[len(times) // 2] / 1000, times[len(times) * 99 // 100] / 1000,
+            stats.get('sampled_out', 0), stats.get('dropped', 0))
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Runnable.report benchmark')
+    parser.add_argument('--threads', default='1,10,70', help='comma separated numbers of reporting threads')
+    parser.add_argument('--records', type=int, default=2000, help='records reported by every thread')
+    parser.add_argument('--console', action='store_true', help='print the reports to stdout as well')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    results = ['{:>8}{:>12}{:>12}{:>14}{:>14}{:>10}{:>10}'.format(
+        'threads', 'sync p50', 'sync p99', 'pipeline p50', 'pipeline p99', 'sampled', 'dropped')]
+    for count in [int(count) for count in args.threads.split(',')]:
+        sync = run(count, args.records, False, args.console)
+        piped = run(count, args.records, True, args.console)
+        results.append('{:>8}{:>12.1f}{:>12.1f}{:>14.1f}{:>14.1f}{:>10}{:>10}'.format(count, *sync[:2], *piped))
+    sys.stderr.write('\n'.join(results) + '\n')
@@ -0,0 +1,87 @@
+"""Per-scan latency of the memcache connectors.
+
+Run from the src directory against the pure-Python stand-in (started on a
+free local port) or a real daemon:
+
+    python -m benchmarks.memcache_benchmark --scans 500 --rtt-ms 0.5
+    python -m benchmarks.memcache_benchmark --server 127.0.0.1:11211
+
+A scan reads the FactorySimulation input tags and writes its sensor tags back,
+once tag by tag through MemcacheConnector (what every scan did before the
+batched API), once batched through MemcacheConnector and once through
+PipelinedMemcacheConnector. p50/p99 scan times are reported in milliseconds.
+"""
+import argparse
+import time
+
+from Configs import TAG
+from FactorySimulation import FactorySimulation
+from benchmarks.memcached_standin import MemcachedStandin
+from ics_sim.connectors import ConnectorFactory
+
+WRITE_TAGS = [tag for tag in TAG.TAG_LIST if TAG.TAG_LIST[tag]['type'] == 'input']
+
+
+def single_scan(connector, values):
+    for tag in FactorySimulation.READ_TAGS:
+        connector.get(tag)
+    for tag, value in values.items():
+        connector.set(tag, value)
+
+
+def batched_scan(connector, values):
+    connector.get_many(FactorySimulation.READ_TAGS)
+    connector.set_many(values)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def run(connection, scan, scans):
+    connector = ConnectorFactory.build(connection)
+    connector.initialize([(tag, TAG.TAG_LIST[tag]['default']) for tag in TAG.TAG_LIST])
+    values = {tag: 1.5 for tag in WRITE_TAGS}
+
+    samples = []
+    for index in range(scans):
+        start = time.perf_counter()
+        scan(connector, values)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    if hasattr(connector, 'close'):
+        connector.close()
+    return percentile(samples, 0.5), percentile(samples, 0.99)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Memcache connector scan latency benchmark')
+    parser.add_argument('--scans', type=int, default=300)
+    parser.add_argument('--server', help='host:port of a memcached daemon (default: start the stand-in)')
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='response delay of the stand-in')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    standin = None
+    server = args.server
+    if server is None:
+        standin = MemcachedStandin(('127.0.0.1', 0), args.rtt_ms / 1000).start()
+        server = '{}:{}'.format(*standin.server_address)
+
+    cases = [
+        ('memcache (per tag)', 'memcache', single_scan),
+        ('memcache (batched)', 'memcache', batched_scan),
+        ('memcache-pipelined', 'memcache-pipelined', batched_scan),
+    ]
+
+    print('{:<24}{:>14}{:>14}'.format('connector', 'p50 ms/scan', 'p99 ms/scan'))
+    for label, connection_type, scan in cases:
+        connection = {'type': connection_type, 'path': server, 'name': 'fp_table'}
+        print('{:<24}{:>14.3f}{:>14.3f}'.format(label, *run(connection, scan, args.scans)))
+
+    if standin is not None:
+        standin.stop()
@@ -0,0 +1,106 @@
+"""Minimal pure-Python stand-in for memcached, for benchmarks and tests.
+
+It implements the part of the text protocol used by the memcache connectors
+(get, set, add, incr, delete, flush_all, version and noreply). The optional
+rtt delays every response to emulate a daemon on the network, as in GNS3 mode.
+
+    python -m benchmarks.memcached_standin --port 11311 --rtt-ms 0.5
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class MemcachedStandin(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, rtt=0.0):
+        socketserver.ThreadingTCPServer.__init__(self, address, _Handler)
+        self.rtt = rtt
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # memcached answers without Nagle's algorithm, too
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        server = self.server
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            parts = line.split()
+            if not parts:
+                continue
+            command = parts[0]
+            noreply = parts[-1] == b'noreply'
+
+            if command in (b'set', b'add', b'replace'):
+                data = self.rfile.read(int(parts[4]) + 2)[:-2]
+                with server.lock:
+                    exists = parts[1] in server.items
+                    stored = command == b'set' or (command == b'add') != exists
+                    if stored:
+                        server.items[parts[1]] = (int(parts[2]), data)
+                response = b'STORED\r\n' if stored else b'NOT_STORED\r\n'
+
+            elif command in (b'get', b'gets'):
+                with server.lock:
+                    found = [(key, server.items[key]) for key in parts[1:] if key in server.items]
+                response = b''.join(b'VALUE %s %d %d\r\n%s\r\n' % (key, flags, len(data), data)
+                                    for key, (flags, data) in found) + b'END\r\n'
+
+            elif command in (b'incr', b'decr'):
+                with server.lock:
+                    if parts[1] in server.items:
+                        flags, data = server.items[parts[1]]
+                        step = int(parts[2]) if command == b'incr' else -int(parts[2])
+                        data = b'%d' % max(0, int(data) + step)
+                        server.items[parts[1]] = (flags, data)
+                        response = data + b'\r\n'
+                    else:
+                        response = b'NOT_FOUND\r\n'
+
+            elif command == b'delete':
+                with server.lock:
+                    response = b'DELETED\r\n' if server.items.pop(parts[1], None) else b'NOT_FOUND\r\n'
+
+            elif command == b'flush_all':
+                with server.lock:
+                    server.items.clear()
+                response = b'OK\r\n'
+
+            elif command == b'version':
+                response = b'VERSION standin\r\n'
+
+            else:
+                response = b'ERROR\r\n'
+
+            if not noreply:
+                if server.rtt:
+                    time.sleep(server.rtt)
+                self.wfile.write(response)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pure-Python memcached stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11311)
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='delay added to every response')
+    args = parser.parse_args()
+
+    MemcachedStandin((args.host, args.port), args.rtt_ms / 1000).serve_forever()
@@ -0,0 +1,91 @@
+"""Many Runnables on a thread each or on one RunnableRuntime.
+
+Run from the src directory:
+
+    python -m benchmarks.runtime_benchmark --counts 10,100,500 --loop-ms 100
+
+For every count, that many light Runnables (a few arithmetic operations
+per scan) run for --seconds, first each on its own thread and then all on
+one RunnableRuntime thread, every run in a fresh process. Reported are the resident memory the Runnables
+added (Linux only, from /proc), the CPU used as a share of one core, and
+the mean and p99 scan start jitter of all of them.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ics_sim.Device import Runnable, RunnableRuntime
+from ics_sim.configs import LoggingConfig, MetricsConfig
+
+
+class LightRunnable(Runnable):
+    def __init__(self, name, loop):
+        Runnable.__init__(self, name, loop)
+        self.level = 50.0
+
+    def _logic(self):
+        self.level = max(0.0, min(100.0, self.level + 0.2 - 0.004 * self.level))
+
+
+def resident_kib():
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+def run(count, loop, seconds, use_runtime):
+    LoggingConfig.CONSOLE = False
+    MetricsConfig.HTTP_PORT = None
+    MetricsConfig.DUMP_INTERVAL = 0
+    memory = resident_kib()
+    runnables = [LightRunnable('Light{}'.format(index), loop) for index in range(count)]
+    runtime = RunnableRuntime() if use_runtime else None
+    for runnable in runnables:
+        if use_runtime:
+            runtime.add(runnable)
+        else:
+            runnable.start()
+    if use_runtime:
+        runtime.start()
+
+    time.sleep(loop / 1000)
+    memory = resident_kib() - memory
+    wall, cpu = time.perf_counter(), time.process_time()
+    time.sleep(seconds)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    if use_runtime:
+        runtime.stop()
+    else:
+        for runnable in runnables:
+            runnable.stop()
+    time.sleep(2 * loop / 1000)
+
+    jitters = sorted(runnable._metrics.jitter.percentile(0.99) for runnable in runnables)
+    scans = sum(runnable.get_scan_stats()['scans'] for runnable in runnables)
+    mean_jitter = sum(runnable._metrics.jitter.total for runnable in runnables) / max(1, scans) / 1e6
+    return memory / count, cpu / wall * 100, mean_jitter, jitters[len(jitters) * 99 // 100] / 1e6
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Runnable runtime benchmark')
+    parser.add_argument('--counts', default='10,100,500', help='comma separated numbers of Runnables')
+    parser.add_argument('--loop-ms', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    print('{:>8}{:>10}{:>14}{:>8}{:>16}{:>16}'.format(
+        'count', 'mode', 'KiB/runnable', 'cpu %', 'mean jitter ms', 'p99 jitter ms'))
+    for count in [int(count) for count in args.counts.split(',')]:
+        for mode, use_runtime in (('threads', False), ('runtime', True)):
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(run, count, args.loop_ms, args.seconds, use_runtime).result()
+            print('{:>8}{:>10}{:>14.1f}{:>8.1f}{:>16.3f}{:>16.3f}'.format(count, mode, *result))
@@ -0,0 +1,128 @@
+"""Throughput and latency of the Modbus server backends under many clients.
+
+Run from the src directory:
+
+    python -m benchmarks.server_benchmark --clients 50 --requests 200
+
+Each backend of ProtocolFactory.create_server is started in its own process;
+--clients connections then read two registers in a closed loop (one request
+outstanding per connection, like ClientModbus) from an asyncio load
+generator. While the load runs, a probe thread in the server process
+measures how late a 10 ms periodic task wakes up, which is what a PLC scan
+loop sees. Reported are requests per second, p50/p99 request latency and
+the p99 scan lateness.
+
+With --policy every backend runs a second time behind a ClientPolicy which
+rate limits the flood clients (connecting from 127.0.0.1) and gives an
+"hmi" client connecting from 127.0.0.2 priority; the last columns show the
+request latency that client sees and how many flood requests were dropped.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import struct
+import time
+
+from ics_sim.protocol import MBAP_HEADER, READ_HOLDING_REGISTERS, ClientPolicy, ProtocolFactory
+
+PROTOCOL = 'ModbusWriteRequest-TCP'
+SCAN_PERIOD = 0.01
+HMI_IP = '127.0.0.2'
+HMI_PERIOD = 0.005
+POLICY = {'classes': {'hmi': {'ips': [HMI_IP], 'priority': 0}},
+          'default': {'priority': 1, 'rate': 100, 'burst': 10},
+          'max_delay': 0.02}
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))] if samples else 0.0
+
+
+def serve(backend, ip, port, policy, ready, stop_event, lateness):
+    server = ProtocolFactory.create_server(PROTOCOL, ip, port, backend, None if policy is None else ClientPolicy(**policy))
+    server.start()
+    ready.set()
+
+    samples = []
+    deadline = time.perf_counter()
+    while not stop_event.is_set():
+        deadline += SCAN_PERIOD
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+        samples.append((time.perf_counter() - deadline) * 1000)
+        deadline = max(deadline, time.perf_counter())
+
+    server.stop()
+    lateness.put(percentile(samples, 0.99))
+
+
+async def client(ip, port, requests, latencies, dropped, local_ip=None, period=0.0):
+    reader, writer = await asyncio.open_connection(ip, port, local_addr=None if local_ip is None else (local_ip, 0))
+    pdu = struct.pack('>BHH', READ_HOLDING_REGISTERS, 0, 2)
+    for transaction_id in range(requests):
+        start = time.perf_counter()
+        writer.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, 1) + pdu)
+        _, _, length, _ = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+        response = await reader.readexactly(length - 1)
+        if response[0] & 0x80:
+            dropped.append(1)
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+        if period:
+            await asyncio.sleep(period)
+    writer.close()
+
+
+async def load(ip, port, clients, requests, with_hmi):
+    latencies = []
+    dropped = []
+    hmi_latencies = []
+    flood = [client(ip, port, requests, latencies, dropped) for _ in range(clients)]
+    if with_hmi:
+        flood.append(client(ip, port, requests // 10, hmi_latencies, [], HMI_IP, HMI_PERIOD))
+    start = time.perf_counter()
+    await asyncio.gather(*flood)
+    return len(latencies) / (time.perf_counter() - start), latencies, hmi_latencies, len(dropped)
+
+
+def run(backend, clients, requests, policy=None):
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    ip, port = probe.getsockname()
+    probe.close()
+
+    ready = multiprocessing.Event()
+    stop_event = multiprocessing.Event()
+    lateness = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(backend, ip, port, policy, ready, stop_event, lateness))
+    process.start()
+    ready.wait()
+
+    rate, latencies, hmi_latencies, dropped = asyncio.run(load(ip, port, clients, requests, policy is not None))
+    stop_event.set()
+    scan_lateness = lateness.get()
+    process.join()
+    return (rate, percentile(latencies, 0.5), percentile(latencies, 0.99), scan_lateness,
+            percentile(hmi_latencies, 0.99), dropped)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Modbus server backend benchmark')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help='requests per client')
+    parser.add_argument('--policy', action='store_true', help='also run every backend behind a ClientPolicy')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    print('{} clients x {} requests'.format(args.clients, args.requests))
+    print('{:<20}{:>14}{:>10}{:>10}{:>18}{:>14}{:>10}'.format(
+        'backend', 'requests/sec', 'p50 ms', 'p99 ms', 'p99 scan late ms', 'hmi p99 ms', 'dropped'))
+    for backend in (ProtocolFactory.SERVER_THREADED, ProtocolFactory.SERVER_ASYNCIO):
+        policies = [('', None)] + ([(' + policy', POLICY)] if args.policy else [])
+        for suffix, policy in policies:
+            print('{:<20}{:>14.0f}{:>10.3f}{:>10.3f}{:>18.3f}{:>14.3f}{:>10}'.format(
+                backend + suffix, *run(backend, args.clients, args.requests, policy)))
@@ -7,10 +7,16 @@ import random
 from abc import ABC, abstractmethod
 from datetime import datetime
 
-from ics_sim.protocol import ProtocolFactory
-from ics_sim.configs import SpeedConfig
+from ics_sim.protocol import ProtocolFactory, ClientPolicy
+from ics_sim.configs import SpeedConfig, LoggingConfig
 from ics_sim.helper import current_milli_time, validate_type, current_milli_cycle_time
-from ics_sim.connectors import ConnectorFactory
+from ics_sim.connectors import ConnectorFactory, ConnectorWrapper, SnapshotConnector, WriteCoalescingConnector, \
+    NotifyingConnector, HistoryConnector
+from ics_sim.tagbus import TagBusClient
+from ics_sim.farm import ScanScheduler
+from ics_sim.subscription import SubscriptionServer, create_subscription
+from ics_sim.metrics import REGISTRY, start_exporters, timed_io
+from ics_sim import logpipeline
 
 from multiprocessing import Process
 import logging
@@ -28,6 +34,111 @@ class Physics(ABC):
     def _get(self, tag):
         return self._connector.get(tag)
 
+    def _set_many(self, values):
+        return self._connector.set_many(values)
+
+    def _get_many(self, tags):
+        return self._connector.get_many(tags)
+
+    def _find_layer(self, layer_type):
+        connector = self._connector
+        while isinstance(connector, ConnectorWrapper):
+            if isinstance(connector, layer_type):
+                return connector
+            connector = connector.unwrap()
+        return None
+
+    def _remove_layer(self, layer_type):
+        outer = None
+        connector = self._connector
+        while isinstance(connector, ConnectorWrapper):
+            if isinstance(connector, layer_type):
+                connector.end_scan()
+                if outer is None:
+                    self._connector = connector.unwrap()
+                else:
+                    outer._connector = connector.unwrap()
+                return
+            outer, connector = connector, connector.unwrap()
+
+    def begin_scan(self):
+        if isinstance(self._connector, ConnectorWrapper):
+            self._connector.begin_scan()
+
+    def end_scan(self):
+        """Push the writes buffered by connector layers to the backend."""
+        if isinstance(self._connector, ConnectorWrapper):
+            self._connector.end_scan()
+
+    def enable_snapshot(self, tags):
+        """Serve each scan from one snapshot of tags, see SnapshotConnector."""
+        if self._find_layer(SnapshotConnector) is None:
+            self._connector = SnapshotConnector(self._connector, tags)
+
+    def disable_snapshot(self):
+        self._remove_layer(SnapshotConnector)
+
+    def invalidate_snapshot(self, tags=None):
+        snapshot = self._find_layer(SnapshotConnector)
+        if snapshot is not None:
+            snapshot.invalidate(tags)
+
+    def get_snapshot_stats(self):
+        snapshot = self._find_layer(SnapshotConnector)
+        return snapshot.get_stats() if snapshot is not None else {}
+
+    def enable_write_coalescing(self, deadbands=None):
+        """Only commit changed values at the end of each scan, see WriteCoalescingConnector."""
+        if self._find_layer(WriteCoalescingConnector) is None:
+            self._connector = WriteCoalescingConnector(self._connector, deadbands)
+
+    def disable_write_coalescing(self):
+        self._remove_layer(WriteCoalescingConnector)
+
+    def invalidate_written_values(self, tags=None):
+        coalescing = self._find_layer(WriteCoalescingConnector)
+        if coalescing is not None:
+            coalescing.invalidate(tags)
+
+    def get_write_stats(self):
+        coalescing = self._find_layer(WriteCoalescingConnector)
+        return coalescing.get_stats() if coalescing is not None else {}
+
+    def _insert_innermost_layer(self, build_layer):
+        """Put a layer right on the backend, below the buffering layers, so it sees committed writes only."""
+        outer = None
+        connector = self._connector
+        while isinstance(connector, ConnectorWrapper):
+            outer, connector = connector, connector.unwrap()
+        if outer is None:
+            self._connector = build_layer(connector)
+        else:
+            outer._connector = build_layer(connector)
+
+    def enable_change_notification(self, bus_path):
+        """Announce every write on the tag bus at bus_path, see NotifyingConnector."""
+        if self._find_layer(NotifyingConnector) is None:
+            self._insert_innermost_layer(lambda connector: NotifyingConnector(connector, bus_path))
+
+    def disable_change_notification(self):
+        self._remove_layer(NotifyingConnector)
+
+    def enable_history(self, history_path, max_age=None, max_rows=1000000):
+        """Record every committed write with its timestamp, see HistoryConnector."""
+        if self._find_layer(HistoryConnector) is None:
+            self._insert_innermost_layer(
+                lambda connector: HistoryConnector(connector, history_path, max_age, max_rows))
+
+    def disable_history(self):
+        history = self._find_layer(HistoryConnector)
+        if history is not None:
+            history.flush()
+            self._remove_layer(HistoryConnector)
+
+    def history(self, tag, t0=None, t1=None):
+        history = self._find_layer(HistoryConnector)
+        return history.history(tag, t0, t1) if history is not None else []
+
 
 class SensorConnector(Physics):
     def __init__(self, connection):
@@ -39,12 +150,21 @@ class SensorConnector(Physics):
 
     def read(self, tag):
         if tag in self._sensors.keys():
-            value = self._get(tag)
-            value += random.uniform(value, -1 * value) * self._sensors[tag]
-            return value
+            return self.__add_fault(tag, self._get(tag))
         else:
             raise LookupError()
 
+    def read_many(self, tags):
+        for tag in tags:
+            if tag not in self._sensors:
+                raise LookupError()
+
+        values = self._get_many(tags)
+        return {tag: self.__add_fault(tag, values[tag]) for tag in tags}
+
+    def __add_fault(self, tag, value):
+        return value + random.uniform(value, -1 * value) * self._sensors[tag]
+
 
 class ActuatorConnector(Physics):
     def __init__(self, connection):
@@ -60,6 +180,13 @@ class ActuatorConnector(Physics):
         else:
             raise LookupError()
 
+    def write_many(self, values):
+        for tag in values:
+            if tag not in self._actuators:
+                raise LookupError()
+
+        self._set_many(values)
+
 
 class Runnable(ABC):
     COLOR_RED = '\033[91m'
@@ -70,14 +197,20 @@ class Runnable(ABC):
     COLOR_BOLD = '\033[1m'
     COLOR_PURPLE = '\033[35m'
 
+    OVERRUN_SKIP = 'skip'
+    OVERRUN_CATCH_UP = 'catch-up'
+    OVERRUN_STRETCH = 'stretch'
+
     def __init__(self, name, loop):
         validate_type(name, 'name', str)
         validate_type(loop, 'loop cycle', int)
 
         self.__name = name
         self.__loop_cycle = loop
-
-
+        self.__overrun_policy = None
+        self.set_overrun_policy(SpeedConfig.SCAN_OVERRUN_POLICY)
+        self._scan_stats = {'scans': 0, 'overruns': 0, 'skipped': 0, 'jitter_total': 0, 'max_jitter': 0}
+        self._metrics = REGISTRY.register(name)
 
         # self.__loop_process = Process(target=self.do_loop, args=())
         self.stop_event = threading.Event()
@@ -89,7 +222,18 @@ class Runnable(ABC):
         self._last_logic_end = 0
         self._initialize_logger()
         self.__clear_scr = False
-        self._std = sys.stdin.fileno()
+        try:
+            self._std = sys.stdin.fileno()
+        except (AttributeError, OSError):
+            # no real stdin, e.g. under a test runner or a launcher
+            self._std = None
+        self._tag_bus = None
+        self._wake_tags = None
+        self.__runtime_scheduler = None
+        self.__runtime_task = None
+        self.__runtime_delay = 0.0
+        self.__runtime_phase = 0.0
+        self.__runtime_started = False
 
         self.report("Created", logging.INFO)
 
@@ -119,7 +263,8 @@ class Runnable(ABC):
             os.makedirs(file_dir)
 
         file_path = os.path.join(file_dir,name) + file_ext
-        handler = logging.FileHandler(file_path, mode=write_mode)
+        # written by the process's log writer thread, see ics_sim.logpipeline
+        handler = logpipeline.file_handler(file_path, mode=write_mode)
         handler.setFormatter(format_str)
 
         # Let us Create an object
@@ -134,54 +279,198 @@ class Runnable(ABC):
         return self.__name
 
     def start(self):
-        self.__loop_process.start()
+        start_exporters(self.name())
+        if self.__runtime_scheduler is None:
+            self.__loop_process.start()
+        else:
+            self.__runtime_task = self.__runtime_scheduler.add(
+                self.__loop_cycle / 1000, self.__runtime_scan, self.__runtime_delay,
+                self.__runtime_phase * self.__loop_cycle / 1000)
 
     def stop(self):
         self._before_stop()
         self.stop_event.set()
         #self.__loop_process.terminate()
+        if self.__runtime_task is not None:
+            ScanScheduler.remove(self.__runtime_task)
         self._after_stop()
         self.report("stopped", logging.INFO)
 
+    def _attach(self, scheduler, delay, phase):
+        """Scan on scheduler, see RunnableRuntime, rather than on an own thread, phase loops late."""
+        self.__runtime_scheduler = scheduler
+        self.__runtime_delay = delay
+        self.__runtime_phase = phase
+
     def _after_stop(self):
         pass
 
     def _before_stop(self):
         pass
 
+    def set_overrun_policy(self, policy):
+        """Choose the scan scheduler, before start().
+
+        With OVERRUN_SKIP, OVERRUN_CATCH_UP or OVERRUN_STRETCH scans are due
+        at absolute deadlines on the monotonic clock, a fixed loop period
+        apart, so the period does not drift with the scan time or clock
+        adjustments. A scan starting at or after the deadline of the next
+        one is an overrun: skip drops the missed periods and stays on the
+        grid, catch-up runs them back to back, stretch restarts the grid at
+        the late scan. None keeps the original millisecond wall clock loop.
+        """
+        if policy not in (None, self.OVERRUN_SKIP, self.OVERRUN_CATCH_UP, self.OVERRUN_STRETCH):
+            raise ValueError('{} is not a valid overrun policy.'.format(policy))
+        self.__overrun_policy = policy
+
+    def get_scan_stats(self):
+        """Scans, overruns and skipped periods, and the mean and max scan start jitter in ms, of the monotonic scheduler."""
+        stats = self._scan_stats
+        return {'scans': stats['scans'], 'overruns': stats['overruns'], 'skipped': stats['skipped'],
+                'mean_jitter': stats['jitter_total'] / max(1, stats['scans']) / 1000000,
+                'max_jitter': stats['max_jitter'] / 1000000}
+
+    def get_scan_count(self):
+        """Scans run so far, on any scheduler."""
+        return self._metrics.logic.count
+
+    def is_running(self):
+        """False before start() and once the scans ended, stopped or failed."""
+        if self.__runtime_scheduler is None:
+            return self.__loop_process.is_alive()
+        return self.__runtime_task is not None and not self.stop_event.is_set()
+
     def do_loop(self, stop_event):
         try:
             self.report("started", logging.INFO)
             self._before_start()
 
-            self._start_time = self._current_loop_time = current_milli_cycle_time(self.__loop_cycle)
-            while not stop_event.is_set():
+            if self.__overrun_policy is None:
+                self.__do_wall_clock_loop(stop_event)
+            else:
+                self.__do_monotonic_loop(stop_event)
+        except Exception as e:
+            self.report(e.__str__(), logging.fatal)
+            raise e
 
-                self._last_loop_time = self._current_loop_time
-                wait = self._last_loop_time + self.__loop_cycle - current_milli_time()
+    def __do_wall_clock_loop(self, stop_event):
+        self._start_time = self._current_loop_time = current_milli_cycle_time(self.__loop_cycle)
+        while not stop_event.is_set():
 
-                if wait > 0:
-                    time.sleep(wait / 1000)
+            self._last_loop_time = self._current_loop_time
+            wait = self._last_loop_time + self.__loop_cycle - current_milli_time()
 
+            if wait > 0:
+                self._wait(wait / 1000)
 
-                self._current_loop_time = current_milli_cycle_time(self.__loop_cycle)
-                self._last_logic_start = current_milli_time()
 
-                self._pre_logic_update()
-                self._logic()
-                self._last_logic_end = current_milli_time()
-                self._post_logic_update()
-        except Exception as e:
-            self.report(e.__str__(), logging.fatal)
-            raise e
+            self._current_loop_time = current_milli_cycle_time(self.__loop_cycle)
+            self._last_logic_start = current_milli_time()
+            self._metrics.jitter.record((self._last_logic_start - self._last_loop_time - self.__loop_cycle) * 1000000)
+
+            self.__run_scan()
+
+    def __do_monotonic_loop(self, stop_event):
+        # deadlines are monotonic ns; the ms loop times keep their wall clock epoch through offset
+        period = self.__loop_cycle * 1000000
+        offset = time.time_ns() - time.monotonic_ns()
+        stats = self._scan_stats
+        deadline = time.monotonic_ns()
+        self._start_time = self._current_loop_time = (deadline + offset) // 1000000
+        while not stop_event.is_set():
 
+            self._last_loop_time = self._current_loop_time
+            deadline += period
+            now = time.monotonic_ns()
 
+            if now < deadline:
+                self._wait((deadline - now) / 1e9)
+                now = time.monotonic_ns()
+                if now < deadline:
+                    # woken early on a tag change, the next period starts from here
+                    deadline = now
+            else:
+                stats['overruns'] += 1
+                if self.__overrun_policy == self.OVERRUN_SKIP:
+                    missed = (now - deadline) // period
+                    stats['skipped'] += missed
+                    deadline += missed * period
+                elif self.__overrun_policy == self.OVERRUN_STRETCH:
+                    deadline = now
+
+            stats['scans'] += 1
+            stats['jitter_total'] += now - deadline
+            stats['max_jitter'] = max(stats['max_jitter'], now - deadline)
+            self._metrics.jitter.record(now - deadline)
+            self._current_loop_time = (deadline + offset) // 1000000
+            self._last_logic_start = (now + offset) // 1000000
+
+            self.__run_scan()
+
+    def __runtime_scan(self):
+        """One scan called by a RunnableRuntime scheduler in place of an iteration of do_loop."""
+        try:
+            if self.stop_event.is_set():
+                ScanScheduler.remove(self.__runtime_task)
+                return
+            if not self.__runtime_started:
+                self.__runtime_started = True
+                self.report("started", logging.INFO)
+                self._before_start()
+                self._start_time = self._current_loop_time = current_milli_time() - self.__loop_cycle
+
+            lateness = int(self.__runtime_scheduler.lateness * 1e9)
+            now = current_milli_time()
+
+            self._last_loop_time = self._current_loop_time
+            self._current_loop_time = now - lateness // 1000000
+            self._last_logic_start = now
+            self._scan_stats['scans'] += 1
+            self._scan_stats['jitter_total'] += lateness
+            self._scan_stats['max_jitter'] = max(self._scan_stats['max_jitter'], lateness)
+            self._metrics.jitter.record(lateness)
+            self.__run_scan()
         except Exception as e:
-            self.report(e.__str__(), logging.fatal)
-            raise e
+            # as in do_loop, a failing Runnable stops
+            ScanScheduler.remove(self.__runtime_task)
+            self.__runtime_task = None
+            self.report(e.__str__(), logging.FATAL)
+
+    def __run_scan(self):
+        """One scan, its phases timed into the metrics histograms."""
+        metrics = self._metrics
+        start = time.monotonic_ns()
+        self._pre_logic_update()
+        logic_start = time.monotonic_ns()
+        self._logic()
+        logic_end = time.monotonic_ns()
+        self._last_logic_end = self._last_logic_start + (logic_end - start) // 1000000
+        self._post_logic_update()
+        metrics.pre_logic.record(logic_start - start)
+        metrics.logic.record(logic_end - logic_start)
+        metrics.post_logic.record(time.monotonic_ns() - logic_end)
+
+    def set_wake_on_change(self, bus_path, tags=None):
+        """Start the next scan as soon as one of tags (any if None) changes on the tag bus.
+
+        The loop period becomes the longest time between two scans.
+        Pass bus_path=None to go back to plain periodic scans.
+        """
+        if self._tag_bus is not None:
+            self._tag_bus.close()
+        self._tag_bus = None if bus_path is None else TagBusClient(bus_path)
+        self._wake_tags = None if tags is None else list(tags)
+
+    def _wait(self, seconds):
+        if self._tag_bus is None:
+            time.sleep(seconds)
+        else:
+            self._tag_bus.wait_for_change(self._wake_tags, seconds)
 
     def _before_start(self):
-        sys.stdin = os.fdopen(self._std)
+        if self._std is not None:
+            # closefd=False: the wrapper replaced by the next Runnable must not close the descriptor
+            sys.stdin = os.fdopen(self._std, closefd=False)
 
     @abstractmethod
     def _logic(self):
@@ -230,20 +519,123 @@ class Runnable(ABC):
             self.__show_console(self._make_text("[FATAL] " + msg, self.COLOR_RED))
 
     def __show_console(self, msg):
+        if not LoggingConfig.CONSOLE:
+            return
         timestamp = self._make_text( datetime.now().strftime("%H:%M:%S"), self.COLOR_PURPLE)
         name = self._make_text(self.name(), self.COLOR_CYAN)
-        print('[{} - {}]\t{}'.format(name, timestamp, msg), flush=True)
+        logpipeline.console('[{} - {}]\t{}'.format(name, timestamp, msg))
 
     @staticmethod
     def _make_text(msg, color):
         return color + msg + '\033[0m'
 
+class RunnableRuntime:
+    """Runs the scans of many Runnables on a few threads instead of a thread each.
+
+    Every added Runnable gets a periodic task on one of the runtime's
+    ScanSchedulers (round robin over threads), which keep the tasks of all
+    their Runnables in one timer heap ordered by deadline. A Runnable's
+    _before_start runs on the scheduler thread just before its first scan,
+    delay seconds after start(). Scans are cooperative: a scan blocking on
+    I/O holds up the other Runnables of its thread, overruns skip the
+    missed periods, and the wake-on-change and overrun policy settings of
+    the threaded loop do not apply.
+
+        runtime = RunnableRuntime()
+        for plc in plcs:
+            runtime.add(plc)
+        runtime.start()
+        runtime.wait()
+    """
+
+    PHASE_SLOTS = 16
+
+    def __init__(self, threads=1):
+        self.schedulers = [ScanScheduler() for _ in range(threads)]
+        self.runnables = []
+        self._stopped = threading.Event()
+
+    def add(self, runnable, delay=0.0):
+        """Run runnable on this runtime; its scans start with runnable.start() or start()."""
+        index, thread = divmod(len(self.runnables), len(self.schedulers))
+        # Runnables of one thread are spread over their period so they do not all wake up at once
+        runnable._attach(self.schedulers[thread], delay, index % self.PHASE_SLOTS / self.PHASE_SLOTS)
+        self.runnables.append(runnable)
+        return runnable
+
+    def start(self):
+        """Start the schedulers and the scans of all the added Runnables."""
+        for runnable in self.runnables:
+            runnable.start()
+        for scheduler in self.schedulers:
+            scheduler.start()
+
+    def stop(self):
+        for runnable in self.runnables:
+            if not runnable.stop_event.is_set():
+                runnable.stop()
+        for scheduler in self.schedulers:
+            scheduler.stop()
+        self._stopped.set()
+
+    def wait(self, timeout=None):
+        """Block until stop() (the scheduler threads do not keep the process alive); False on timeout."""
+        return self._stopped.wait(timeout)
+
+    def get_stats(self):
+        stats = {'runnables': len(self.runnables), 'scans': 0, 'overruns': 0, 'errors': 0, 'max_lateness': 0.0}
+        for scheduler in self.schedulers:
+            for key in ('scans', 'overruns', 'errors'):
+                stats[key] += scheduler.stats[key]
+            stats['max_lateness'] = max(stats['max_lateness'], scheduler.stats['max_lateness'])
+        return stats
+
+
 class HIL(Runnable, Physics, ABC):
     @abstractmethod
     def __init__(self, name, connection, loop=SpeedConfig.PROCESS_PERIOD):
         Runnable.__init__(self, name, loop)
         Physics.__init__(self, connection)
 
+    def set_scan_snapshot(self, value, tags=()):
+        """Read tags once at the start of each scan and flush all writes at its end."""
+        if value:
+            self.enable_snapshot(tags)
+        else:
+            self.disable_snapshot()
+
+    def set_write_coalescing(self, value, deadbands=None):
+        """Write only the tags which changed (beyond their deadband) at the end of each scan."""
+        if value:
+            self.enable_write_coalescing(deadbands)
+        else:
+            self.disable_write_coalescing()
+
+    # the connector calls are timed into the io histogram, see ics_sim.metrics
+    @timed_io
+    def _set(self, tag, value):
+        return Physics._set(self, tag, value)
+
+    @timed_io
+    def _get(self, tag):
+        return Physics._get(self, tag)
+
+    @timed_io
+    def _set_many(self, values):
+        return Physics._set_many(self, values)
+
+    @timed_io
+    def _get_many(self, tags):
+        return Physics._get_many(self, tags)
+
+    def _pre_logic_update(self):
+        Runnable._pre_logic_update(self)
+        self.begin_scan()
+
+    def _post_logic_update(self):
+        Runnable._post_logic_update(self)
+        self.end_scan()
+
 
 class DcsComponent(Runnable):
     def __init__(self, name, tags, plcs, loop):
@@ -251,18 +643,24 @@ class DcsComponent(Runnable):
         self.plcs = plcs
         self.tags = tags
         self.clients = {}
+        self._subscribed = {}
+        self._subscriptions = {}
         self.__init_clients()
 
     def __init_clients(self):
         for plc_id in self.plcs:
             plc = self.plcs[plc_id]
-            self.clients[plc_id] = (ProtocolFactory.create_client(plc['protocol'], plc['ip'], plc['port']))
+            self.clients[plc_id] = ProtocolFactory.create_client(plc['protocol'], plc['ip'], plc['port'],
+                                                                 plc.get('unit_id', 1))
+            self.clients[plc_id].set_layouts(self._get_tag_layouts(plc_id))
 
+    @timed_io
     def _send(self, tag, value):
         tag_id = self.tags[tag]['id']
         plc_id = self.tags[tag]['plc']
         self.clients[plc_id].send(tag_id, value)
 
+    @timed_io
     def _receive(self, tag):
 
         tag_id = self.tags[tag]['id']
@@ -270,6 +668,58 @@ class DcsComponent(Runnable):
 
         return self.clients[plc_id].receive(tag_id)
 
+    @timed_io
+    def _send_many(self, values):
+        """Write {tag: value} with one send_many per PLC, adjacent tags share a request."""
+        tag_values = {}
+        for tag, value in values.items():
+            tag_values.setdefault(self.tags[tag]['plc'], {})[self.tags[tag]['id']] = value
+
+        for plc_id, plc_values in tag_values.items():
+            self.clients[plc_id].send_many(plc_values)
+
+    @timed_io
+    def _receive_many(self, tags):
+        """Read tags with one receive_many per PLC (or from its subscription); returns {tag: value}."""
+        tag_ids = {}
+        for tag in tags:
+            tag_ids.setdefault(self.tags[tag]['plc'], {})[self.tags[tag]['id']] = tag
+
+        values = {}
+        for plc_id, plc_tags in tag_ids.items():
+            for tag_id, value in self.__get_source(plc_id, plc_tags).receive_many(plc_tags).items():
+                values[plc_tags[tag_id]] = value
+        return values
+
+    def set_subscription(self, tags, deadbands=None):
+        """Serve _receive_many of tags from report-by-exception subscriptions, see ics_sim.subscription.
+
+        There is one subscription per PLC: to its SubscriptionServer when the
+        PLC config has a 'subscription_port' which answers, polled over
+        Modbus otherwise (retrying the subscription port every few seconds,
+        for PLCs started after the component). A value is only updated when
+        it moves by more than its deadband, from deadbands ({tag: deadband}),
+        else the tag's 'deadband' field, else 0. tags=None goes back to plain
+        polling.
+        """
+        for subscription in self._subscriptions.values():
+            subscription.close()
+        self._subscriptions = {}
+        self._subscribed = {}
+        deadbands = deadbands or {}
+        for tag in tags or []:
+            deadband = deadbands.get(tag, self.tags[tag].get('deadband', 0))
+            self._subscribed.setdefault(self.tags[tag]['plc'], {})[self.tags[tag]['id']] = deadband
+
+    def __get_source(self, plc_id, tag_ids):
+        subscribed = self._subscribed.get(plc_id)
+        if subscribed is None or not all(tag_id in subscribed for tag_id in tag_ids):
+            return self.clients[plc_id]
+        if plc_id not in self._subscriptions:
+            self._subscriptions[plc_id] = create_subscription(self.plcs[plc_id], subscribed,
+                                                              self._get_tag_layouts(plc_id))
+        return self._subscriptions[plc_id]
+
     def _is_input_tag(self, tag):
         return self.tags[tag]['type'] == 'input'
 
@@ -282,6 +732,11 @@ class DcsComponent(Runnable):
     def _get_tag_fault(self, tag):
         return self.tags[tag]['fault']
 
+    def _get_tag_layouts(self, plc_id):
+        """Register layouts ('layout' field, see ModbusCodec) of the tags served by plc_id."""
+        return {data['id']: data['layout'] for data in self.tags.values()
+                if data['plc'] == plc_id and 'layout' in data}
+
 
 class PLC(DcsComponent):
     @abstractmethod
@@ -306,8 +761,27 @@ class PLC(DcsComponent):
         self.__init_sensors()
         self.__init_actuators()
 
-        self.server = ProtocolFactory.create_server(self.protocol, self.ip, self.port)
+        # optional 'server' entry of the PLC config selects the backend, see ProtocolFactory.create_server,
+        # an optional 'policy' entry holds the ClientPolicy arguments and 'unit_id' the Modbus unit id
+        # (PLCs of one process with the 'farm' backend share one server and tell apart by port and unit id);
+        # with a policy the default backend is asyncio, the threaded one does not serve by priority
+        policy = plcs[plc_id].get('policy')
+        default_backend = ProtocolFactory.SERVER_THREADED if policy is None else ProtocolFactory.SERVER_ASYNCIO
+        self.server = ProtocolFactory.create_server(self.protocol, self.ip, self.port,
+                                                    plcs[plc_id].get('server', default_backend),
+                                                    None if policy is None else ClientPolicy(**policy),
+                                                    plcs[plc_id].get('unit_id', 1))
+        self.server.set_layouts(self._get_tag_layouts(self.id))
+        # the process image is synced with the server's register bank through one typed view per direction
+        self._local_inputs = [tag for tag in self.tags if self._is_local_tag(tag) and self._is_input_tag(tag)]
+        self._local_outputs = [tag for tag in self.tags if self._is_local_tag(tag) and self._is_output_tag(tag)]
+        self._input_view = self.server.view([self._get_tag_id(tag) for tag in self._local_inputs])
+        self._output_view = self.server.view([self._get_tag_id(tag) for tag in self._local_outputs])
         self.report('creating the server on IP = {}:{}'.format(self.ip, self.port), logging.INFO)
+        # an optional 'subscription_port' publishes the registers report-by-exception, see ics_sim.subscription
+        self.subscription_server = None
+        if plcs[plc_id].get('subscription_port') is not None:
+            self.subscription_server = SubscriptionServer(self.server, self.ip, plcs[plc_id]['subscription_port'])
 
         self._snapshot_recorder = self.setup_logger("snapshots_" + self.name(), logging.Formatter('%(message)s'), file_ext=".csv")
         self.__record_variables = False;
@@ -315,22 +789,65 @@ class PLC(DcsComponent):
     def set_record_variables(self, value):
         self.__record_variables = value
 
+    def set_scan_snapshot(self, value):
+        """Read local sensors once at the start of each scan and flush actuator writes at its end."""
+        if value:
+            self._sensor_connector.enable_snapshot(self._local_inputs)
+            self._actuator_connector.enable_snapshot([])
+        else:
+            self._sensor_connector.disable_snapshot()
+            self._actuator_connector.disable_snapshot()
+
+    def get_snapshot_stats(self):
+        return {'sensors': self._sensor_connector.get_snapshot_stats(),
+                'actuators': self._actuator_connector.get_snapshot_stats()}
+
+    def set_write_coalescing(self, value):
+        """Write only actuators which changed beyond their 'deadband' (default: any change) at the end of each scan."""
+        if value:
+            self._actuator_connector.enable_write_coalescing(
+                {tag: data['deadband'] for tag, data in self.tags.items() if 'deadband' in data})
+        else:
+            self._actuator_connector.disable_write_coalescing()
+
+    def get_write_stats(self):
+        return self._actuator_connector.get_write_stats()
+
+    def get_server_stats(self):
+        """Request and connection counters of the Modbus server and its ClientPolicy, if any."""
+        stats = dict(getattr(self.server, 'stats', {}))
+        if getattr(self.server, 'policy', None) is not None:
+            stats['policy'] = self.server.policy.get_stats()
+        return stats
+
+    def set_wake_on_change(self, bus_path, tags=None):
+        """Wake up early when a local input changes (or one of tags), see Runnable.set_wake_on_change."""
+        if tags is None:
+            tags = self._local_inputs
+        DcsComponent.set_wake_on_change(self, bus_path, tags)
+
+    def _pre_logic_update(self):
+        DcsComponent._pre_logic_update(self)
+        self._sensor_connector.begin_scan()
+        self._actuator_connector.begin_scan()
+
 
     def _post_logic_update(self):
         DcsComponent._post_logic_update(self)
         self._store_received_values()
         if self.__record_variables:
             self._record_variables()
+        self._sensor_connector.end_scan()
+        self._actuator_connector.end_scan()
 
+    @timed_io
     def _store_received_values(self):
-        for tag_name, tag_data in self.tags.items():
-            if not self._is_local_tag(tag_name):
-                continue
+        if self._local_outputs:
+            self._actuator_connector.write_many(dict(zip(self._local_outputs, self._output_view.read())))
 
-            if tag_data['type'] == 'output':
-                self._set(tag_name, self.server.get(tag_data['id']))
-            elif tag_data['type'] == 'input':
-                self.server.set(tag_data['id'], self._get(tag_name))
+        if self._local_inputs:
+            values = self._sensor_connector.read_many(self._local_inputs)
+            self._input_view.write([values[tag] for tag in self._local_inputs])
 
     def _record_variables(self, header=False):
         snapshot = ""
@@ -345,13 +862,13 @@ class PLC(DcsComponent):
                 self.get_logic_execution_time()
             )
 
-        for tag_name, tag_data in self.tags.items():
-            if not self._is_local_tag(tag_name):
-                continue
+        local_tags = [tag_name for tag_name in self.tags if self._is_local_tag(tag_name)]
+        values = {} if header else self._get_many(local_tags)
+        for tag_name in local_tags:
             if header:
-                snapshot += "{}({}), ".format(tag_name, tag_data['id'])
+                snapshot += "{}({}), ".format(tag_name, self._get_tag_id(tag_name))
             else:
-                snapshot += "{}, ".format(self._get(tag_name))
+                snapshot += "{}, ".format(values[tag_name])
 
         self._snapshot_recorder.info(snapshot)
 
@@ -379,6 +896,14 @@ class PLC(DcsComponent):
                 self.report('receive null value for tag:{}'.format(tag), logging.WARNING)
                 return -1
 
+    def _get_many(self, tags):
+        sensor_tags = [tag for tag in tags if self._is_local_tag(tag) and self._is_input_tag(tag)]
+        values = self._sensor_connector.read_many(sensor_tags) if sensor_tags else {}
+        for tag in tags:
+            if tag not in values:
+                values[tag] = self._get(tag)
+        return values
+
     def _set(self, tag, value):
         if self._is_local_tag(tag):
             self.server.set(self._get_tag_id(tag), value)
@@ -386,18 +911,33 @@ class PLC(DcsComponent):
         else:
             self._send(tag, value)
 
+    def _set_many(self, values):
+        local = {tag: value for tag, value in values.items() if self._is_local_tag(tag)}
+        for tag, value in local.items():
+            self.server.set(self._get_tag_id(tag), value)
+        if local:
+            self._actuator_connector.write_many(local)
+
+        remote = {tag: value for tag, value in values.items() if not self._is_local_tag(tag)}
+        if remote:
+            self._send_many(remote)
+
 
     def _is_local_tag(self, tag):
         return self.tags[tag]['plc'] == self.id
 
     def _before_start(self):
         self.server.start()
+        if self.subscription_server is not None:
+            self.subscription_server.start()
         for tag, value in self.tags.items():
             if self._is_output_tag(tag) and self._is_local_tag(tag):
                 self._set(tag, value['default'])
         self._record_variables(True)
 
     def stop(self):
+        if self.subscription_server is not None:
+            self.subscription_server.stop()
         self.server.stop()
         DcsComponent.stop(self)
 
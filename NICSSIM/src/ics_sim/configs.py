@@ -1,3 +1,6 @@
+import os
+
+
 class SpeedConfig:
     # Constants
     SPEED_MODE_FAST = 'fast'
@@ -21,4 +24,30 @@ class SpeedConfig:
     DEFAULT_PLC_PERIOD_MS = PLC_PERIOD[SPEED_MODE]
     DEFAULT_FP_PERIOD_MS = PROCESS_PERIOD[SPEED_MODE]
 
+    # what a scan loop does when a scan overruns its period, see Runnable.set_overrun_policy:
+    # 'skip' the missed periods, 'catch-up' on them back to back, 'stretch' the period,
+    # or None for the original wall clock scheduler
+    SCAN_OVERRUN_POLICY = 'skip'
+
+
+class MetricsConfig:
+    # scan phase histograms of the components of a process, see ics_sim.metrics. Runnable.start()
+    # starts both exporters by default: Prometheus text on http://HTTP_IP:HTTP_PORT/metrics (None to
+    # disable), the first process on a host gets the port, and a JSON dump to DUMP_DIR every
+    # DUMP_INTERVAL s (0 to disable). The endpoint is local only, a deployment which scrapes it from
+    # another host opts in to a wider bind with ICS_SIM_METRICS_IP, e.g. 0.0.0.0
+    HTTP_IP = os.getenv('ICS_SIM_METRICS_IP', '127.0.0.1')
+    HTTP_PORT = int(os.getenv('ICS_SIM_METRICS_PORT', '9108')) or None
+    DUMP_DIR = './logs'
+    DUMP_INTERVAL = float(os.getenv('ICS_SIM_METRICS_DUMP_INTERVAL', '10'))
+
 
+class LoggingConfig:
+    # write the logs and report() console lines from one writer thread per process, see ics_sim.logpipeline
+    ASYNC = os.getenv('ICS_SIM_LOG_ASYNC', '1') not in ('0', 'false', 'False')
+    CONSOLE = os.getenv('ICS_SIM_LOG_CONSOLE', '1') not in ('0', 'false', 'False')
+    QUEUE_SIZE = 10000
+    FLUSH_INTERVAL = 0.1
+    # above HIGH_WATER of QUEUE_SIZE only one in SAMPLE_RATE records below WARNING is kept
+    HIGH_WATER = 0.75
+    SAMPLE_RATE = 10
@@ -1,7 +1,16 @@
+import fcntl
+import hashlib
+import mmap
 import os
+import socket
 import sqlite3
+import struct
+import tempfile
+import threading
+import time
 import memcache
 from abc import abstractmethod, ABC
+from multiprocessing import resource_tracker, shared_memory
 from os.path import splitext
 
 from pyModbusTCP.client import ModbusClient
@@ -9,7 +18,8 @@ from pyModbusTCP.client import ModbusClient
 from ics_sim.helper import debug, error, validate_type
 import json
 
-from ics_sim.protocol import ClientModbus
+from ics_sim.protocol import ModbusBase
+from ics_sim.tagbus import TagBusClient
 
 
 class Connector(ABC):
@@ -33,12 +43,32 @@ class Connector(ABC):
     def get(self, key):
         pass
 
+    def get_many(self, keys):
+        """Return a dict of key->value for all keys; subclasses fetch them in one round trip."""
+        return {key: self.get(key) for key in keys}
+
+    def set_many(self, values):
+        """Write a dict of key->value; subclasses store them in one round trip."""
+        for key, value in values.items():
+            self.set(key, value)
+
 
 class SQLiteConnector(Connector):
     def __init__(self, connection):
         Connector.__init__(self, connection)
         self._key = 'name'
         self._value = 'value'
+        self._get_query = 'SELECT {} FROM {} WHERE {} = ?'.format(self._value, self._name, self._key)
+        self._set_query = 'UPDATE {} SET {} = ? WHERE {} = ?'.format(self._name, self._value, self._key)
+        self._get_many_queries = {}
+
+    def _get_many_query(self, count):
+        query = self._get_many_queries.get(count)
+        if query is None:
+            query = 'SELECT {}, {} FROM {} WHERE {} IN ({})'.format(
+                self._key, self._value, self._name, self._key, ', '.join('?' * count))
+            self._get_many_queries[count] = query
+        return query
 
     def initialize(self, values, clear_old=True):
         if clear_old and os.path.isfile(self._path):
@@ -65,14 +95,10 @@ class SQLiteConnector(Connector):
             conn.executescript(schema_init)
 
     def set(self, key, value):
-        set_query = 'UPDATE {} SET {} = ? WHERE {} = ?'.format(
-            self._name,
-            self._value,
-            self._key)
         with sqlite3.connect(self._path) as conn:
             try:
                 cursor = conn.cursor()
-                cursor.execute(set_query, [value, key])
+                cursor.execute(self._set_query, [value, key])
                 conn.commit()
                 return value
 
@@ -80,22 +106,134 @@ class SQLiteConnector(Connector):
                 error(f'_set in ICSSIM connection {e.args[0]} for setting tag {key}')
 
     def get(self, key):
-        get_query = """SELECT {} FROM {} WHERE {} = ?""".format(
-            self._value,
-            self._name,
-            self._key)
-
         with sqlite3.connect(self._path) as conn:
             try:
 
                 cursor = conn.cursor()
-                cursor.execute(get_query, [key])
+                cursor.execute(self._get_query, [key])
                 record = cursor.fetchone()
                 return record[0]
 
             except sqlite3.Error as e:
                 error(f'_get in ICSSIM connection {e.args[0]} for getting tag {key}')
 
+    def get_many(self, keys):
+        keys = list(keys)
+        with sqlite3.connect(self._path) as conn:
+            try:
+                return dict(conn.execute(self._get_many_query(len(keys)), keys).fetchall())
+
+            except sqlite3.Error as e:
+                error(f'_get_many in ICSSIM connection {e.args[0]} for getting tags {keys}')
+
+    def set_many(self, values):
+        with sqlite3.connect(self._path) as conn:
+            try:
+                conn.executemany(self._set_query, [(value, key) for key, value in values.items()])
+                conn.commit()
+
+            except sqlite3.Error as e:
+                error(f'_set_many in ICSSIM connection {e.args[0]} for setting tags {list(values)}')
+
+
+class PersistentSQLiteConnector(SQLiteConnector):
+    """SQLite connector which keeps one open connection per thread.
+
+    Every thread lazily opens its own connection the first time it touches a
+    tag and keeps it for the lifetime of the connector. Connections run in
+    autocommit mode on a WAL journal with synchronous=NORMAL, so an UPDATE
+    does not wait for an fsync, and readers in other processes are never
+    blocked by the writer. Query strings are fixed per connector, which lets
+    the sqlite3 statement cache hand back the precompiled statements.
+    """
+
+    JOURNAL_MODE = 'WAL'
+    SYNCHRONOUS = 'NORMAL'
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, connection):
+        SQLiteConnector.__init__(self, connection)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA busy_timeout = {}'.format(self.BUSY_TIMEOUT_MS))
+            conn.execute('PRAGMA journal_mode = {}'.format(self.JOURNAL_MODE))
+            conn.execute('PRAGMA synchronous = {}'.format(self.SYNCHRONOUS))
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def initialize(self, values, clear_old=True):
+        """Create the table if needed and write values in one transaction.
+
+        The database file is kept: connections other processes already hold
+        on it would keep reading a deleted file, so clear_old empties the
+        table instead of removing the file.
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('CREATE TABLE IF NOT EXISTS {} ({} TEXT NOT NULL, {} REAL, PRIMARY KEY ({}))'.format(
+                self._name, self._key, self._value, self._key))
+            if clear_old:
+                conn.execute('DELETE FROM {}'.format(self._name))
+            conn.executemany('INSERT OR REPLACE INTO {} ({}, {}) VALUES (?, ?)'.format(
+                self._name, self._key, self._value), [tuple(item) for item in values])
+            conn.execute('COMMIT')
+
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+
+    def set(self, key, value):
+        try:
+            self._connect().execute(self._set_query, (value, key))
+            return value
+
+        except sqlite3.Error as e:
+            error(f'_set in ICSSIM connection {e.args[0]} for setting tag {key}')
+
+    def get(self, key):
+        try:
+            return self._connect().execute(self._get_query, (key,)).fetchone()[0]
+
+        except sqlite3.Error as e:
+            error(f'_get in ICSSIM connection {e.args[0]} for getting tag {key}')
+
+    def get_many(self, keys):
+        keys = list(keys)
+        try:
+            return dict(self._connect().execute(self._get_many_query(len(keys)), keys).fetchall())
+
+        except sqlite3.Error as e:
+            error(f'_get_many in ICSSIM connection {e.args[0]} for getting tags {keys}')
+
+    def set_many(self, values):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            conn.executemany(self._set_query, [(value, key) for key, value in values.items()])
+            conn.execute('COMMIT')
+
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            error(f'_set_many in ICSSIM connection {e.args[0]} for setting tags {list(values)}')
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
 
 class MemcacheConnector(Connector):
     def __init__(self, connection):
@@ -118,23 +256,305 @@ class MemcacheConnector(Connector):
     def get(self, key):
         return self.memcached_client.get(key)
 
+    def set_many(self, values):
+        self.memcached_client.set_multi(values)
+
+    def get_many(self, keys):
+        return self.memcached_client.get_multi(list(keys))
+
     def __del__(self):
         self.memcached_client.disconnect_all()
 
 
-class HardwareConnector(Connector, ABC):
+class PipelinedMemcacheConnector(Connector):
+    """Memcache connector speaking the text protocol over one persistent socket.
+
+    get_many() sends a single multi-get, set_many() writes all values as
+    ``noreply`` sets in one send, so a scan costs one round trip for reads and
+    none for writes. Keys live under ``<name>:<namespace>:`` where the
+    namespace is a counter stored in memcache; initialize(clear_old=True)
+    bumps the counter instead of restarting the daemon, which orphans the old
+    keys for memcache to evict. Every multi-get also fetches the counter, so
+    readers follow a namespace bump on their next read.
+    """
+
+    FLAG_FLOAT = 0
+    FLAG_INT = 1
+    TIMEOUT = 5
+
+    def __init__(self, connection):
+        Connector.__init__(self, connection)
+        host, port = self._path.split(':')
+        self.__address = (host, int(port))
+        self.__socket = None
+        self.__reader = None
+        self.__lock = threading.Lock()
+        self._namespace_key = '{}:ns'.format(self._name)
+        self._namespace = None
+
+    def initialize(self, values, clear_old=False):
+        with self.__lock:
+            if clear_old:
+                self._namespace = self.__request(self.__bump_namespace)
+            else:
+                self._namespace = self.__request(self.__read_namespace)
+        self.set_many(dict(values))
+
+    def set(self, key, value):
+        self.set_many({key: value})
+        return value
+
+    def get(self, key):
+        return self.get_many((key,)).get(key)
+
+    def set_many(self, values):
+        with self.__lock:
+            if self._namespace is None:
+                self._namespace = self.__request(self.__read_namespace)
+            command = b''.join(self.__set_command(self.__key(key), value) for key, value in values.items())
+            self.__request(lambda: self.__socket.sendall(command))
+
+    def get_many(self, keys):
+        keys = list(keys)
+        with self.__lock:
+            values = self.__request(self.__get_values, keys)
+            namespace = values.pop(self._namespace_key, None)
+            if namespace is None or namespace != self._namespace:
+                # the namespace was bumped by another component (or not created yet); read again under the new one
+                self._namespace = namespace if namespace is not None else self.__request(self.__read_namespace)
+                values = self.__request(self.__get_values, keys)
+                values.pop(self._namespace_key, None)
+        return values
+
+    def close(self):
+        with self.__lock:
+            self.__disconnect()
+
+    def __key(self, key):
+        return '{}:{}:{}'.format(self._name, self._namespace, key)
+
+    def __request(self, function, *args):
+        # one retry on a fresh socket covers a restarted daemon or a dropped connection
+        for attempt in range(2):
+            try:
+                if self.__socket is None:
+                    self.__connect()
+                return function(*args)
+            except (OSError, EOFError) as e:
+                self.__disconnect()
+                if attempt:
+                    error(f'memcache request to {self._path} failed: {e}')
+                    raise
+
+    def __connect(self):
+        self.__socket = socket.create_connection(self.__address, timeout=self.TIMEOUT)
+        self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__reader = self.__socket.makefile('rb')
+
+    def __disconnect(self):
+        if self.__socket is not None:
+            self.__reader.close()
+            self.__socket.close()
+        self.__socket = self.__reader = None
+
+    def __readline(self):
+        line = self.__reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise EOFError('connection closed by memcache')
+        return line[:-2]
+
+    def __get_values(self, keys):
+        names = {self.__key(key): key for key in keys}
+        names[self._namespace_key] = self._namespace_key
+        self.__socket.sendall('get {}\r\n'.format(' '.join(names)).encode())
+
+        values = {}
+        line = self.__readline()
+        while line != b'END':
+            if not line.startswith(b'VALUE '):
+                raise OSError('unexpected memcache response {!r}'.format(line))
+            _, name, flags, length = line.split()[:4]
+            data = self.__reader.read(int(length) + 2)[:-2]
+            values[names[name.decode()]] = int(data) if int(flags) == self.FLAG_INT else float(data)
+            line = self.__readline()
+        return values
+
+    def __read_namespace(self):
+        self.__socket.sendall('get {}\r\n'.format(self._namespace_key).encode())
+        line = self.__readline()
+        if line == b'END':
+            return self.__bump_namespace()
+        data = self.__reader.read(int(line.split()[3]) + 2)[:-2]
+        self.__readline()
+        return int(data)
+
+    def __bump_namespace(self):
+        self.__socket.sendall('incr {} 1\r\n'.format(self._namespace_key).encode())
+        line = self.__readline()
+        if line != b'NOT_FOUND':
+            return int(line)
+
+        self.__socket.sendall(self.__set_command(self._namespace_key, 1, 'add', noreply=False))
+        if self.__readline() != b'STORED':
+            # lost the race against another component creating the counter
+            return self.__read_namespace()
+        return 1
+
+    def __set_command(self, name, value, command='set', noreply=True):
+        if isinstance(value, (bool, int)):
+            flags, data = self.FLAG_INT, b'%d' % value
+        else:
+            flags, data = self.FLAG_FLOAT, repr(float(value)).encode()
+        return '{} {} {} 0 {}{}\r\n'.format(
+            command, name, flags, len(data), ' noreply' if noreply else '').encode() + data + b'\r\n'
+
+
+class _ModbusSession:
+    """One Modbus TCP connection shared by all HardwareConnectors of a device.
+
+    Requests are serialized, a broken connection is reopened on the next
+    request, with exponential backoff between failed attempts so an
+    unreachable device does not stall every scan for a full timeout.
+    """
+
+    TIMEOUT = 1.0
+    BACKOFF_MIN = 0.1
+    BACKOFF_MAX = 5.0
+
+    def __init__(self, ip, port):
+        self.ip = ip
+        self.port = port
+        self.users = 0
+        self.lock = threading.Lock()
+        self._client = ModbusClient(host=ip, port=port, timeout=self.TIMEOUT, auto_open=False)
+        self._backoff = self.BACKOFF_MIN
+        self._retry_at = 0
+        self._timed = 0
+        self._stats = {'requests': 0, 'failures': 0, 'reconnects': 0,
+                       'latency_total_ms': 0.0, 'latency_max_ms': 0.0, 'latency_last_ms': 0.0}
+
+    def _open(self):
+        if self._client.is_open:
+            return True
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        self._stats['reconnects'] += 1
+        if self._client.open():
+            self._backoff = self.BACKOFF_MIN
+            return True
+        self._retry_at = now + self._backoff
+        self._backoff = min(self._backoff * 2, self.BACKOFF_MAX)
+        return False
+
+    def request(self, function, *args):
+        """Run a pyModbusTCP client method; None when the device cannot be reached."""
+        with self.lock:
+            self._stats['requests'] += 1
+            result = None
+            if self._open():
+                start = time.perf_counter()
+                result = function(self._client, *args)
+                latency = (time.perf_counter() - start) * 1000
+                self._timed += 1
+                self._stats['latency_last_ms'] = latency
+                self._stats['latency_total_ms'] += latency
+                self._stats['latency_max_ms'] = max(self._stats['latency_max_ms'], latency)
+            if result is None or result is False:
+                self._stats['failures'] += 1
+                # drop the connection, the next request reconnects
+                self._client.close()
+                return None
+            return result
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats['latency_avg_ms'] = stats['latency_total_ms'] / self._timed if self._timed else 0.0
+        return stats
+
+    def close(self):
+        with self.lock:
+            self._client.close()
+
+
+class HardwareConnector(Connector, ModbusBase):
+    """Tag store on a Modbus TCP device (hardware in the loop).
+
+    The connection path is the device's ip:port and 'tags' maps tag names to
+    their 'id', which places the tag at holding register id * word_num like
+    ServerModbus does. Batched reads and writes are planned into contiguous
+    register blocks, so a full sensor read or actuator write is one request
+    per block instead of one per tag. All connectors of one device in a
+    process share one pooled, auto-reconnecting session.
+    """
+
+    MAX_READ_REGISTERS = 125
+    MAX_WRITE_REGISTERS = 123
+    # registers between two tags which are still read in one request
+    MAX_READ_GAP = 8
+
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
     def __init__(self, connection):
         Connector.__init__(self, connection)
-        path = self._path
-        self.__IP = path.split(':')[0]
-        self.__port = path.split(':')[1]
-        self.__clientModbus = ClientModbus(self.__IP, self.__port)
+        ModbusBase.__init__(self)
+        ip, port = self._path.split(':')
+        self._tags = {tag: data['id'] for tag, data in connection.get('tags', {}).items()}
+        self.set_layouts({data['id']: data['layout'] for data in connection.get('tags', {}).values() if 'layout' in data})
+
+        with HardwareConnector._sessions_lock:
+            self._session = HardwareConnector._sessions.get((ip, int(port)))
+            if self._session is None:
+                self._session = _ModbusSession(ip, int(port))
+                HardwareConnector._sessions[(ip, int(port))] = self._session
+            self._session.users += 1
+
+    def _tag_id(self, key):
+        return self._tags[key] if key in self._tags else key
+
+    def initialize(self, values, clear_old=True):
+        self.set_many(dict(values))
 
     def get(self, key):
-        self.__clientModbus.receive(key)
+        return self.get_many([key]).get(key)
 
     def set(self, key, value):
-        self.__clientModbus.send(key, value)
+        self.set_many({key: value})
+        return value
+
+    def get_many(self, keys):
+        keys = list(keys)
+        ids = [self._tag_id(key) for key in keys]
+        decoded = {}
+        for start, count, range_ids in self.plan_ranges(ids, self.MAX_READ_REGISTERS, self.MAX_READ_GAP):
+            words = self._session.request(ModbusClient.read_holding_registers, start, count)
+            if words is None:
+                error(f'_get_many in ICSSIM connection cannot read registers {start}-{start + count - 1} '
+                      f'from {self._path}')
+                continue
+            decoded.update(zip(range_ids, self.decode_range(words, start, range_ids)))
+        return {key: decoded[tag_id] for key, tag_id in zip(keys, ids) if tag_id in decoded}
+
+    def set_many(self, values):
+        encoded = {self._tag_id(key): value for key, value in values.items()}
+        for start, count, range_ids in self.plan_ranges(encoded, self.MAX_WRITE_REGISTERS):
+            # a write range has no gaps, so its words are the encoded values back to back
+            words = self.encode_many([encoded[tag_id] for tag_id in range_ids],
+                                     [self.get_layout(tag_id) for tag_id in range_ids])
+            if self._session.request(ModbusClient.write_multiple_registers, start, words) is None:
+                error(f'_set_many in ICSSIM connection cannot write registers {start}-{start + count - 1} '
+                      f'on {self._path}')
+
+    def get_stats(self):
+        return self._session.get_stats()
+
+    def close(self):
+        with HardwareConnector._sessions_lock:
+            self._session.users -= 1
+            if self._session.users == 0:
+                self._session.close()
+                HardwareConnector._sessions.pop((self._session.ip, self._session.port), None)
 
 
 class FileConnector(Connector):
@@ -142,25 +562,734 @@ class FileConnector(Connector):
         Connector.__init__(self, connection)
 
     def initialize(self, values, clear_old=True):
-        if not os.path.isfile(self._path):
-            f = open(self._path, "x")
-            obj = json.dumps(values)
-            f.write(obj)
-            f.close()
+        if clear_old or not os.path.isfile(self._path):
+            self.__write(dict(values))
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def get(self, key):
+        return self.__read()[key]
+
+    def set_many(self, values):
+        data = self.__read()
+        data.update(values)
+        self.__write(data)
+
+    def get_many(self, keys):
+        data = self.__read()
+        return {key: data[key] for key in keys}
+
+    def __read(self):
+        with open(self._path) as f:
+            return json.load(f)
+
+    def __write(self, data):
+        with open(self._path, 'w') as f:
+            json.dump(data, f)
+
+
+class ArrayConnector(Connector, ABC):
+    """Base class for connectors keeping tags in a flat float64 array indexed by tag id.
+
+    The connection must carry the tag list (``'tags'``, e.g. TAG.TAG_LIST) whose
+    ``id`` fields give the position of each tag in the array. The buffer starts
+    with a header (magic, layout hash, tag count, generation, sequence word)
+    followed by one float64 per tag id. A component whose tag list hashes
+    differently from the one the store was initialized with is rejected when it
+    attaches.
+
+    Writers make the sequence odd while they update values and even again when
+    done, readers retry until they see the same even sequence before and after
+    copying (a seqlock), so get_many always returns a consistent snapshot
+    without readers taking any lock.
+
+    initialize() rewrites the store in place, under the components which have
+    it mapped, and bumps the generation; a component seeing another generation
+    than the one it mapped maps the store again (and checks its layout), so a
+    restarted initializer, e.g. the physical process, is seen by every reader.
+    """
+
+    MAGIC = b'ICSSIMTG'
+    HEADER = struct.Struct('=8sQQ')
+    GENERATION_OFFSET = HEADER.size
+    SEQUENCE_OFFSET = GENERATION_OFFSET + 8
+    VALUES_OFFSET = SEQUENCE_OFFSET + 8
+    SPIN_LIMIT = 1000
+
+    def __init__(self, connection):
+        Connector.__init__(self, connection)
+        tags = connection.get('tags')
+        if not tags:
+            raise KeyError('Connection of type {} must contain tags.'.format(connection.get('type')))
+
+        self._index = {tag: data['id'] for tag, data in tags.items()}
+        self._size = max(self._index.values()) + 1
+        self._layout_hash = self.layout_hash(self._index)
+        self._generation = None
+        self._generation_word = None
+        self._sequence = None
+        self._values = None
+        self._thread_lock = threading.Lock()
+        self._lock_file = None
+
+    @abstractmethod
+    def _attach(self, create):
+        """Return a writable memoryview of the store, of at least _buffer_size() bytes when create is set.
+
+        Called with the write lock held. With create, an existing store of the
+        right size is kept for _map to rewrite in place.
+        """
+        pass
+
+    @abstractmethod
+    def _detach(self):
+        pass
+
+    @abstractmethod
+    def _lock_path(self):
+        pass
+
+    @staticmethod
+    def layout_hash(index):
+        """Return a 64 bit hash of a tag->id mapping."""
+        layout = ','.join('{}:{}'.format(tag, tag_id) for tag, tag_id in sorted(index.items()))
+        return int.from_bytes(hashlib.sha256(layout.encode()).digest()[:8], 'little')
+
+    def _buffer_size(self):
+        return self.VALUES_OFFSET + 8 * self._size
+
+    def _map(self, create=False):
+        # under the write lock, so the header is never seen half written by another process
+        with self._write_lock():
+            buffer = self._attach(create)
+            if create:
+                self.__reset(buffer)
+            elif len(buffer) < self._buffer_size() or self.HEADER.unpack_from(buffer, 0) != (
+                    self.MAGIC, self._layout_hash, self._size):
+                buffer.release()
+                self._detach()
+                raise ValueError('tag store {} was initialized with a different tag list.'.format(self._path))
+
+            self._generation_word = buffer[self.GENERATION_OFFSET:self.SEQUENCE_OFFSET].cast('Q')
+            self._generation = self._generation_word[0]
+            self._sequence = buffer[self.SEQUENCE_OFFSET:self.VALUES_OFFSET].cast('Q')
+            self._values = buffer[self.VALUES_OFFSET:self._buffer_size()].cast('d')
+
+    def __reset(self, buffer):
+        """Write the header and zero the values in place, readers of the old generation map the store again."""
+        generation, sequence = struct.unpack_from('=QQ', buffer, self.GENERATION_OFFSET)
+        sequence |= 1
+        struct.pack_into('=Q', buffer, self.SEQUENCE_OFFSET, sequence)
+        self.HEADER.pack_into(buffer, 0, self.MAGIC, self._layout_hash, self._size)
+        buffer[self.VALUES_OFFSET:self._buffer_size()] = bytes(8 * self._size)
+        struct.pack_into('=QQ', buffer, self.GENERATION_OFFSET, generation + 1, sequence + 1)
+
+    def _ensure_mapped(self):
+        if self._values is None:
+            self._map()
+        elif self._generation_word[0] != self._generation:
+            # initialized again by another component since this one mapped it
+            self._unmap()
+            self._map()
+
+    def _write_lock(self):
+        if self._lock_file is None:
+            self._lock_file = open(self._lock_path(), 'a')
+        return _ArrayWriteLock(self._thread_lock, self._lock_file)
+
+    def initialize(self, values, clear_old=True):
+        self.close()
+        try:
+            self._map(create=clear_old)
+        except FileNotFoundError:
+            self._map(create=True)
+        self.set_many(dict(values))
+
+    def _write(self, items):
+        self._ensure_mapped()
+        with self._write_lock():
+            # a writer which died half way leaves an odd sequence behind; resume from it
+            sequence = self._sequence[0] | 1
+            self._sequence[0] = sequence
+            for index, value in items:
+                self._values[index] = value
+            self._sequence[0] = sequence + 1
+
+    def _read(self, indexes):
+        self._ensure_mapped()
+        for spin in range(self.SPIN_LIMIT):
+            before = self._sequence[0]
+            if before & 1:
+                time.sleep(0)
+                continue
+            values = [self._values[index] for index in indexes]
+            if self._sequence[0] == before:
+                return values
+
+        # writers keep colliding with this reader; take the writer lock to get a stable copy
+        with self._write_lock():
+            return [self._values[index] for index in indexes]
+
+    def set(self, key, value):
+        self._write(((self._index[key], value),))
+        return value
+
+    def get(self, key):
+        index = self._index[key]
+        if self._values is not None and self._generation_word[0] == self._generation:
+            # fast path of _read for a single tag
+            before = self._sequence[0]
+            value = self._values[index]
+            if not before & 1 and self._sequence[0] == before:
+                return value
+        return self._read((index,))[0]
+
+    def set_many(self, values):
+        self._write([(self._index[key], value) for key, value in values.items()])
+
+    def get_many(self, keys):
+        keys = list(keys)
+        return dict(zip(keys, self._read([self._index[key] for key in keys])))
+
+    def _unmap(self):
+        if self._values is not None:
+            self._values.release()
+            self._sequence.release()
+            self._generation_word.release()
+            self._values = self._sequence = self._generation_word = None
+            self._detach()
+
+    def close(self):
+        self._unmap()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class _ArrayWriteLock:
+    """Excludes writers of other threads (threading lock) and other processes (flock)."""
+
+    def __init__(self, thread_lock, lock_file):
+        self.__thread_lock = thread_lock
+        self.__lock_file = lock_file
+
+    def __enter__(self):
+        self.__thread_lock.acquire()
+        fcntl.flock(self.__lock_file, fcntl.LOCK_EX)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self.__lock_file, fcntl.LOCK_UN)
+        self.__thread_lock.release()
+
+
+class SharedMemoryConnector(ArrayConnector):
+    """Tag store in a named POSIX shared memory block (``path`` is the block name).
+
+    The process calling initialize() creates the block, every other component
+    attaches to it by name on first access. The block outlives the processes
+    using it until unlink() is called. initialize() reuses a block big enough
+    for the tag list; a smaller one is retired (its generation bumped, so its
+    readers attach to the new block by name) and replaced.
+    """
+
+    def __init__(self, connection):
+        ArrayConnector.__init__(self, connection)
+        self._shared_memory = None
+
+    def _attach(self, create):
+        try:
+            self._shared_memory = shared_memory.SharedMemory(self._path)
+        except FileNotFoundError:
+            if not create:
+                raise
+        else:
+            if create and self._shared_memory.size < self._buffer_size():
+                self.__retire()
+
+        if self._shared_memory is None:
+            self._shared_memory = shared_memory.SharedMemory(self._path, create=True, size=self._buffer_size())
+
+        # the resource tracker would unlink the block when this process exits while others still use it
+        resource_tracker.unregister(self._shared_memory._name, 'shared_memory')
+        return self._shared_memory.buf
+
+    def __retire(self):
+        """Bump the generation of the attached (too small) block and unlink it."""
+        block, self._shared_memory = self._shared_memory, None
+        resource_tracker.unregister(block._name, 'shared_memory')
+        if block.size >= self.VALUES_OFFSET:
+            generation = struct.unpack_from('=Q', block.buf, self.GENERATION_OFFSET)[0]
+            struct.pack_into('=Q', block.buf, self.GENERATION_OFFSET, generation + 1)
+        block.close()
+        block.unlink()
+
+    def _detach(self):
+        self._shared_memory.close()
+        self._shared_memory = None
+
+    def _lock_path(self):
+        return os.path.join(tempfile.gettempdir(), '{}.lock'.format(self._path))
+
+    def unlink(self):
+        try:
+            block = shared_memory.SharedMemory(self._path)
+        except FileNotFoundError:
+            return
+        block.close()
+        block.unlink()
+
+
+class MmapConnector(ArrayConnector):
+    """Tag store in a memory-mapped binary file (``path``) with a fixed layout.
+
+    Every process maps the same file, so reads are plain memory accesses on
+    shared pages, while the file keeps the last written values after a crash
+    and can be inspected offline with get_many(). The file is never replaced,
+    initialize() rewrites it in place (growing it if needed), and writers of
+    all processes lock ``<path>.lock``.
+    """
+
+    def __init__(self, connection):
+        ArrayConnector.__init__(self, connection)
+        self._file = None
+        self._mmap = None
+        self._buffer = None
+
+    def _attach(self, create):
+        if create:
+            self._file = os.fdopen(os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+            if os.fstat(self._file.fileno()).st_size < self._buffer_size():
+                # growing keeps the pages mapped by other processes valid
+                self._file.truncate(self._buffer_size())
+        else:
+            self._file = open(self._path, 'r+b')
+            if os.fstat(self._file.fileno()).st_size < self.HEADER.size:
+                self._file.close()
+                self._file = None
+                raise ValueError('tag store {} is not initialized.'.format(self._path))
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._buffer = memoryview(self._mmap)
+        return self._buffer
+
+    def _detach(self):
+        self._buffer.release()
+        self._mmap.close()
+        self._file.close()
+        self._buffer = self._mmap = self._file = None
+
+    def _lock_path(self):
+        return '{}.lock'.format(self._path)
+
+
+class ConnectorWrapper(Connector):
+    """Base class for layers on top of another connector; everything is delegated by default."""
+
+    def __init__(self, connector):
+        Connector.__init__(self, connector._connection)
+        self._connector = connector
+
+    def initialize(self, values, *args, **kwargs):
+        return self._connector.initialize(values, *args, **kwargs)
+
+    def set(self, key, value):
+        return self._connector.set(key, value)
+
+    def get(self, key):
+        return self._connector.get(key)
+
+    def set_many(self, values):
+        return self._connector.set_many(values)
+
+    def get_many(self, keys):
+        return self._connector.get_many(keys)
+
+    def unwrap(self):
+        return self._connector
+
+    def begin_scan(self):
+        if isinstance(self._connector, ConnectorWrapper):
+            self._connector.begin_scan()
+
+    def end_scan(self):
+        """Push buffered writes down to the next layer, then let that layer do the same."""
+        if isinstance(self._connector, ConnectorWrapper):
+            self._connector.end_scan()
+
+    def __getattr__(self, name):
+        # close(), unlink() and other connector specific methods
+        if name == '_connector':
+            raise AttributeError(name)
+        return getattr(self._connector, name)
+
+
+class SnapshotConnector(ConnectorWrapper):
+    """Serves a scan from one consistent snapshot of the tag store.
+
+    begin_scan() pulls all ``tags`` with a single get_many(); until end_scan()
+    reads are served from that in-process copy (tags outside the set are read
+    through once and kept) and writes are buffered, then flushed with a single
+    set_many(). Outside a scan every call goes straight to the backend.
+
+    invalidate() drops cached tags so the next read goes to the backend, for
+    example after a value was changed behind the snapshot. Callbacks registered
+    with add_invalidation_hook() are called with the invalidated tags (None
+    for all of them).
+    """
+
+    def __init__(self, connector, tags):
+        ConnectorWrapper.__init__(self, connector)
+        self._tags = list(tags)
+        self._snapshot = None
+        self._pending = {}
+        self._invalidation_hooks = []
+        self._stats = {'snapshots': 0, 'hits': 0, 'misses': 0, 'flushes': 0, 'flushed_tags': 0, 'invalidations': 0}
+
+    def begin_scan(self):
+        ConnectorWrapper.begin_scan(self)
+        self._snapshot = self._connector.get_many(self._tags) if self._tags else {}
+        self._stats['snapshots'] += 1
+
+    def end_scan(self):
+        self.flush()
+        self._snapshot = None
+        ConnectorWrapper.end_scan(self)
+
+    def in_scan(self):
+        return self._snapshot is not None
+
+    def flush(self):
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            self._connector.set_many(pending)
+            self._stats['flushes'] += 1
+            self._stats['flushed_tags'] += len(pending)
+
+    def invalidate(self, tags=None):
+        if self._snapshot is not None:
+            if tags is None:
+                self._snapshot = dict(self._pending)
+            else:
+                for tag in tags:
+                    if tag not in self._pending:
+                        self._snapshot.pop(tag, None)
+        self._stats['invalidations'] += 1
+        for hook in self._invalidation_hooks:
+            hook(tags)
+
+    def add_invalidation_hook(self, hook):
+        self._invalidation_hooks.append(hook)
+
+    def get_stats(self):
+        return dict(self._stats)
+
+    def initialize(self, values, *args, **kwargs):
+        self._pending = {}
+        result = ConnectorWrapper.initialize(self, values, *args, **kwargs)
+        self.invalidate()
+        return result
+
+    def get(self, key):
+        if self._snapshot is None:
+            return self._connector.get(key)
+
+        if key in self._snapshot:
+            self._stats['hits'] += 1
+            return self._snapshot[key]
+
+        self._stats['misses'] += 1
+        value = self._snapshot[key] = self._connector.get(key)
+        return value
+
+    def get_many(self, keys):
+        if self._snapshot is None:
+            return self._connector.get_many(keys)
+
+        keys = list(keys)
+        missing = [key for key in keys if key not in self._snapshot]
+        self._stats['hits'] += len(keys) - len(missing)
+        if missing:
+            self._stats['misses'] += len(missing)
+            self._snapshot.update(self._connector.get_many(missing))
+        return {key: self._snapshot[key] for key in keys}
 
     def set(self, key, value):
-        f = open(self._path, 'w')
-        data = json.load(f)
-        data[key] = value
-        obj = json.dumps(data)
-        f.write(obj)
-        f.close()
+        if self._snapshot is None:
+            return self._connector.set(key, value)
+
+        self._snapshot[key] = self._pending[key] = value
+        return value
+
+    def set_many(self, values):
+        if self._snapshot is None:
+            return self._connector.set_many(values)
+
+        self._snapshot.update(values)
+        self._pending.update(values)
+
+
+class WriteCoalescingConnector(ConnectorWrapper):
+    """Write-behind buffer which only commits tags that actually changed.
+
+    Writes are kept in memory until flush(), which commits them with a single
+    set_many(). A write is dropped when it lies within the tag's deadband of
+    the value last committed through this connector (``deadbands`` maps tag to
+    deadband, missing tags use exact equality). Reads see buffered writes.
+
+    The connector assumes it is the only writer of its tags; call invalidate()
+    when another component may have changed them, so the next write goes
+    through regardless.
+    """
+
+    def __init__(self, connector, deadbands=None):
+        ConnectorWrapper.__init__(self, connector)
+        self._deadbands = dict(deadbands or {})
+        self._committed = {}
+        self._pending = {}
+        self._stats = {'writes': 0, 'suppressed': 0, 'flushes': 0, 'flushed_tags': 0}
+
+    def set_deadband(self, key, deadband):
+        self._deadbands[key] = deadband
+
+    def _changed(self, key, value):
+        if key not in self._committed:
+            return True
+        last = self._committed[key]
+        deadband = self._deadbands.get(key, 0)
+        if not deadband:
+            return value != last
+        return abs(value - last) > deadband
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        self._connector.set_many(pending)
+        self._committed.update(pending)
+        self._stats['flushes'] += 1
+        self._stats['flushed_tags'] += len(pending)
+
+    def invalidate(self, tags=None):
+        if tags is None:
+            self._committed.clear()
+        else:
+            for tag in tags:
+                self._committed.pop(tag, None)
+
+    def get_stats(self):
+        return dict(self._stats)
+
+    def end_scan(self):
+        self.flush()
+        ConnectorWrapper.end_scan(self)
+
+    def initialize(self, values, *args, **kwargs):
+        self._pending = {}
+        result = ConnectorWrapper.initialize(self, values, *args, **kwargs)
+        self._committed = dict(values)
+        return result
+
+    def set(self, key, value):
+        self.set_many({key: value})
+        return value
+
+    def set_many(self, values):
+        self._stats['writes'] += len(values)
+        for key, value in values.items():
+            if self._changed(key, value):
+                self._pending[key] = value
+            else:
+                # back within the deadband of the committed value: nothing left to write
+                self._pending.pop(key, None)
+                self._stats['suppressed'] += 1
 
     def get(self, key):
-        f = open(self._path)
-        data = json.load(f)
-        f.close()
-        return data[key]
+        if key in self._pending:
+            return self._pending[key]
+        return self._connector.get(key)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        missing = [key for key in keys if key not in self._pending]
+        values = self._connector.get_many(missing) if missing else {}
+        for key in keys:
+            if key in self._pending:
+                values[key] = self._pending[key]
+        return values
+
+
+class NotifyingConnector(ConnectorWrapper):
+    """Publishes the names of written tags on a tag bus, see ics_sim.tagbus.
+
+    The layer sits directly on the backend so that a change is only announced
+    once it reached the store, whatever buffering layers are stacked above.
+    """
+
+    def __init__(self, connector, bus_path):
+        ConnectorWrapper.__init__(self, connector)
+        self._bus = TagBusClient(bus_path)
+
+    def initialize(self, values, *args, **kwargs):
+        result = ConnectorWrapper.initialize(self, values, *args, **kwargs)
+        self._bus.publish([key for key, _ in values])
+        return result
+
+    def set(self, key, value):
+        result = self._connector.set(key, value)
+        self._bus.publish([key])
+        return result
+
+    def set_many(self, values):
+        if not values:
+            return
+        result = self._connector.set_many(values)
+        self._bus.publish(list(values))
+        return result
+
+    def close(self):
+        self._bus.close()
+        if hasattr(self._connector, 'close'):
+            self._connector.close()
+
+
+class HistoryConnector(ConnectorWrapper):
+    """Records every committed write in a time-indexed SQLite history table.
+
+    Samples (timestamp, tag id, value) are appended to ``{name}_history`` in
+    the database at history_path, which has an index on (tag id, timestamp)
+    for history() range queries and one on timestamp for retention. Rows are
+    buffered and inserted in one transaction at end_scan(), once FLUSH_ROWS
+    are pending or FLUSH_INTERVAL seconds after the last insert. Retention
+    works like a ring buffer: samples older than max_age seconds and all but
+    the newest max_rows rows are pruned every PRUNE_INTERVAL inserted rows.
+
+    Several processes may record into the same file; like
+    PersistentSQLiteConnector it runs on a WAL journal.
+    """
+
+    FLUSH_ROWS = 1000
+    FLUSH_INTERVAL = 1.0
+    PRUNE_INTERVAL = 10000
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, connector, history_path, max_age=None, max_rows=1000000):
+        ConnectorWrapper.__init__(self, connector)
+        self._history_path = history_path
+        self._max_age = max_age
+        self._max_rows = max_rows
+        self._rows = []
+        self._tag_ids = {}
+        self._inserted = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+        table = '{}_history'.format(self._name)
+        self._tags_table = '{}_history_tags'.format(self._name)
+        self._insert_query = 'INSERT INTO {} (ts, tag_id, value) VALUES (?, ?, ?)'.format(table)
+        self._history_query = 'SELECT ts, value FROM {} WHERE tag_id = ? AND ts >= ? AND ts <= ? ORDER BY ts'.format(table)
+        self._prune_age_query = 'DELETE FROM {} WHERE ts < ?'.format(table)
+        self._prune_rows_query = 'DELETE FROM {0} WHERE rowid <= (SELECT MAX(rowid) FROM {0}) - ?'.format(table)
+
+        self._conn = sqlite3.connect(history_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA busy_timeout = {}'.format(self.BUSY_TIMEOUT_MS))
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS {0} (
+            ts              REAL NOT NULL,
+            tag_id          INTEGER NOT NULL,
+            value           REAL
+        );
+        CREATE INDEX IF NOT EXISTS {0}_tag_ts ON {0} (tag_id, ts);
+        CREATE INDEX IF NOT EXISTS {0}_ts ON {0} (ts);
+        CREATE TABLE IF NOT EXISTS {1} (
+            id              INTEGER PRIMARY KEY,
+            tag             TEXT NOT NULL UNIQUE
+        );
+        """.format(table, self._tags_table))
+
+    def _tag_id(self, key):
+        tag_id = self._tag_ids.get(key)
+        if tag_id is None:
+            self._conn.execute('INSERT OR IGNORE INTO {} (tag) VALUES (?)'.format(self._tags_table), [key])
+            tag_id = self._conn.execute('SELECT id FROM {} WHERE tag = ?'.format(self._tags_table), [key]).fetchone()[0]
+            self._tag_ids[key] = tag_id
+        return tag_id
+
+    def _record(self, values):
+        now = time.time()
+        with self._lock:
+            self._rows.extend((now, self._tag_id(key), value) for key, value in values)
+            due = len(self._rows) >= self.FLUSH_ROWS or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._rows:
+                return
+            rows, self._rows = self._rows, []
+            try:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(self._insert_query, rows)
+                self._inserted += len(rows)
+                if self._inserted >= self.PRUNE_INTERVAL:
+                    self._inserted = 0
+                    self._prune()
+                self._conn.execute('COMMIT')
+
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                error(f'cannot record {len(rows)} history samples in {self._history_path}: {e.args[0]}')
+
+    def _prune(self):
+        if self._max_age is not None:
+            self._conn.execute(self._prune_age_query, [time.time() - self._max_age])
+        if self._max_rows is not None:
+            self._conn.execute(self._prune_rows_query, [self._max_rows])
+
+    def prune(self):
+        """Apply the retention limits now instead of waiting for PRUNE_INTERVAL rows."""
+        self.flush()
+        with self._lock:
+            self._prune()
+
+    def history(self, key, t0=None, t1=None):
+        """Return the [(timestamp, value)] samples of key recorded between t0 and t1, oldest first."""
+        self.flush()
+        with self._lock:
+            return self._conn.execute(self._history_query, [
+                self._tag_id(key),
+                float('-inf') if t0 is None else t0,
+                float('inf') if t1 is None else t1]).fetchall()
+
+    def end_scan(self):
+        ConnectorWrapper.end_scan(self)
+        self.flush()
+
+    def initialize(self, values, *args, **kwargs):
+        result = ConnectorWrapper.initialize(self, values, *args, **kwargs)
+        self._record(values)
+        return result
+
+    def set(self, key, value):
+        result = self._connector.set(key, value)
+        self._record([(key, value)])
+        return result
+
+    def set_many(self, values):
+        result = self._connector.set_many(values)
+        self._record(values.items())
+        return result
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+        if hasattr(self._connector, 'close'):
+            self._connector.close()
 
 
 class ConnectorFactory:
@@ -169,19 +1298,22 @@ class ConnectorFactory:
         validate_type(connection, 'connection', dict)
 
         connection_keys = connection.keys()
-        if (not connection_keys) or (len(connection_keys) != 3):
-            raise KeyError('Connection must contain 3 keys.')
-        else:
-            for key in connection_keys:
-                if (key != 'path') and (key != 'name') and (key != 'type'):
-                    raise KeyError('%s is an invalid key.' % key)
+        for key in ('path', 'name', 'type'):
+            if key not in connection_keys:
+                raise KeyError('Connection must contain path, name and type keys.')
 
-        if connection['type'] == 'sqlite':
+        for key in connection_keys:
+            if (key != 'path') and (key != 'name') and (key != 'type') and (key != 'tags'):
+                raise KeyError('%s is an invalid key.' % key)
+
+        if connection['type'] == 'sqlite' or connection['type'] == 'sqlite-wal':
             sub_path, extension = splitext(connection['path'])
-            if extension == '.sqlite':
-                return SQLiteConnector(connection)
+            if extension != '.sqlite':
+                raise ValueError('%s is not acceptable extension for type %s.' % (extension, connection['type']))
+            elif connection['type'] == 'sqlite-wal':
+                return PersistentSQLiteConnector(connection)
             else:
-                raise ValueError('%s is not acceptable extension for type sqlite.' % extension)
+                return SQLiteConnector(connection)
 
         elif connection['type'] == 'file':
             return FileConnector(connection)
@@ -192,6 +1324,15 @@ class ConnectorFactory:
         elif connection['type'] == 'memcache':
             return MemcacheConnector(connection)
 
+        elif connection['type'] == 'memcache-pipelined':
+            return PipelinedMemcacheConnector(connection)
+
+        elif connection['type'] == 'shm':
+            return SharedMemoryConnector(connection)
+
+        elif connection['type'] == 'mmap':
+            return MmapConnector(connection)
+
         else:
             raise ValueError('Connection type is not supported')
 
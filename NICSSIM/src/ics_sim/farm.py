@@ -0,0 +1,200 @@
+"""Many virtual PLCs in one process.
+
+A PLCFarm hosts lightweight VirtualPLCs: each one is a ModbusUnit with its
+own small register bank, served by one ModbusFarmServer event loop, and a
+scan function called periodically by one ScanScheduler thread. An extra PLC
+therefore costs a register bank and a heap entry, not a server thread per
+client plus a scan thread.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from ics_sim.configs import SpeedConfig
+from ics_sim.helper import error
+from ics_sim.protocol import ModbusFarmServer
+
+
+class ScanScheduler:
+    """Runs many periodic tasks on one thread.
+
+    The tasks wait in a heap ordered by their next deadline, so the thread
+    sleeps until the earliest one. A task still busy at its next deadline
+    skips the periods it missed (counted as overruns) instead of running
+    them back to back. While a callback runs, lateness holds how late (in
+    seconds) it was called.
+    """
+
+    def __init__(self):
+        self.stats = {'scans': 0, 'overruns': 0, 'errors': 0, 'lateness_total': 0.0, 'max_lateness': 0.0}
+        self.lateness = 0.0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add(self, period, callback, phase=0.0, offset=None):
+        """Call callback() every period seconds, the first time after phase seconds; returns a handle for remove().
+
+        With an offset the deadlines are moved onto the monotonic clock's
+        grid of period (plus offset seconds), so tasks with the same period
+        and offset wake up together however far apart they were added.
+        """
+        task = [period, callback, True]
+        deadline = time.monotonic() + phase
+        if offset is not None:
+            deadline += (offset - deadline) % period
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), task))
+        self._wake.set()
+        return task
+
+    @staticmethod
+    def remove(task):
+        task[2] = False
+
+    def start(self):
+        with self._lock:
+            # tasks added before start keep their phases but do not start out late
+            delay = time.monotonic() - min(self._heap)[0] if self._heap else 0
+            if delay > 0:
+                self._heap = [(deadline + delay, sequence, task) for deadline, sequence, task in self._heap]
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                deadline, _, task = self._heap[0] if self._heap else (None, None, None)
+            lateness = 0.0 if deadline is None else time.monotonic() - deadline
+            if deadline is None or lateness < 0:
+                # cleared only before sleeping, then looked at again so a task add()ed meanwhile is not missed
+                self._wake.clear()
+                with self._lock:
+                    deadline = self._heap[0][0] if self._heap else None
+                if deadline is None:
+                    self._wake.wait()
+                elif deadline > time.monotonic():
+                    self._wake.wait(deadline - time.monotonic())
+                continue
+
+            with self._lock:
+                heapq.heappop(self._heap)
+            period, callback, active = task
+            if not active:
+                continue
+
+            self.stats['scans'] += 1
+            self.stats['lateness_total'] += lateness
+            self.stats['max_lateness'] = max(self.stats['max_lateness'], lateness)
+            self.lateness = lateness
+            try:
+                callback()
+            except Exception as e:
+                self.stats['errors'] += 1
+                error('scan of {} failed: {}'.format(callback, e))
+
+            next_deadline = deadline + period
+            missed = int((time.monotonic() - next_deadline) // period) + 1
+            if missed > 0:
+                self.stats['overruns'] += missed
+                next_deadline += missed * period
+            with self._lock:
+                heapq.heappush(self._heap, (next_deadline, next(self._sequence), task))
+
+
+class VirtualPLC:
+    """A PLC of a PLCFarm: the unit serving its registers and logic(plc) called every loop milliseconds."""
+
+    def __init__(self, name, unit, logic, loop):
+        self._name = name
+        self.unit = unit
+        self.loop = loop
+        self.scans = 0
+        self._logic = logic
+        self._task = None
+
+    def name(self):
+        return self._name
+
+    def scan(self):
+        self._logic(self)
+        self.scans += 1
+
+    def get(self, tag_id):
+        return self.unit.get(tag_id)
+
+    def set(self, tag_id, value):
+        self.unit.set(tag_id, value)
+
+
+class PLCFarm:
+    """Hosts VirtualPLCs on one ModbusFarmServer and one ScanScheduler.
+
+    PLCs are addressed by port and Modbus unit id; add_plc() hands out the
+    next free unit id of the port when none is given. Scans of PLCs with
+    the same loop are spread over the period so they do not all wake up at
+    once.
+
+        farm = PLCFarm('127.0.0.1', 5502)
+        plc = farm.add_plc('tank-1', lambda plc: plc.set(1, plc.get(0) * 2), loop=100)
+        farm.start()
+    """
+
+    UNIT_REGISTERS = 1024
+    PHASE_SLOTS = 16
+
+    def __init__(self, ip, port, policy=None):
+        self.server = ModbusFarmServer(ip, port, policy=policy)
+        self.scheduler = ScanScheduler()
+        self.plcs = {}
+
+    def add_plc(self, name, logic, loop=SpeedConfig.DEFAULT_PLC_PERIOD_MS, unit_id=None, port=None,
+                layouts=None, size=UNIT_REGISTERS):
+        if name in self.plcs:
+            raise ValueError('PLC {} already exists'.format(name))
+        port = self.server.port if port is None else port
+        if unit_id is None:
+            unit_id = self._free_unit_id(port)
+
+        unit = self.server.add_unit(unit_id, port, size)
+        if layouts:
+            unit.set_layouts(layouts)
+        plc = VirtualPLC(name, unit, logic, loop)
+        phase = loop / 1000 * (len(self.plcs) % self.PHASE_SLOTS) / self.PHASE_SLOTS
+        plc._task = self.scheduler.add(loop / 1000, plc.scan, phase)
+        self.plcs[name] = plc
+        return plc
+
+    def remove_plc(self, name):
+        plc = self.plcs.pop(name)
+        self.scheduler.remove(plc._task)
+        self.server.remove_unit(plc.unit)
+
+    def _free_unit_id(self, port):
+        used = {unit_id for unit_port, unit_id in self.server.units if unit_port == port}
+        for unit_id in range(1, ModbusFarmServer.MAX_UNIT_ID + 1):
+            if unit_id not in used:
+                return unit_id
+        raise ValueError('all unit ids of port {} are in use'.format(port))
+
+    def start(self):
+        self.server.start()
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+        self.server.stop()
+
+    def get_stats(self):
+        return {'plcs': len(self.plcs), 'scheduler': dict(self.scheduler.stats), 'server': dict(self.server.stats)}
@@ -0,0 +1,161 @@
+"""Modbus polling gateway in front of the PLCs.
+
+Every HMI and agent polling a PLC on its own multiplies the load on it. The
+Gateway polls each PLC once per loop with block reads and keeps the
+registers in a cached image, one ModbusUnit per PLC on a ModbusFarmServer.
+Downstream clients read the cache over Modbus/TCP (the unit id is the PLC
+id) or through read()/read_many(), so the PLC load stays flat however many
+clients there are. Writes are passed through to the PLC.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyModbusTCP.client import ModbusClient
+
+from ics_sim.Device import DcsComponent
+from ics_sim.configs import SpeedConfig
+from ics_sim.protocol import ModbusFarmServer, ModbusUnit, READ_HOLDING_REGISTERS, WRITE_SINGLE_REGISTER, \
+    WRITE_MULTIPLE_REGISTERS, GATEWAY_TARGET_FAILED
+
+
+class GatewayUnit(ModbusUnit):
+    """Cached image of one PLC: reads are served from the bank, writes go to the PLC first.
+
+    A write is forwarded as is and answered with the PLC's response; only
+    when the PLC accepted it is the cache updated as well. The blocking
+    upstream client runs on a thread of the unit, so a slow or unreachable
+    PLC delays its own writes but never the farm's loop. Reads of an image
+    older than max_age seconds (or never polled) are answered with a
+    "gateway target failed to respond" exception rather than stale values.
+    """
+
+    WRITE_TIMEOUT = 1.0
+
+    def __init__(self, ip, port, unit_id, farm, plc, max_age=None):
+        ModbusUnit.__init__(self, ip, port, unit_id, farm=farm)
+        self.max_age = max_age
+        self.timestamp = None
+        self.stats.update({'forwarded_writes': 0, 'failed_writes': 0, 'stale_reads': 0})
+        self._upstream = ModbusClient(host=plc['ip'], port=plc['port'], unit_id=plc.get('unit_id', 1),
+                                      timeout=self.WRITE_TIMEOUT)
+        # one thread, the client is not thread safe and the PLC gets its writes in order
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='gateway-unit-{}'.format(unit_id))
+
+    def is_stale(self):
+        return self.timestamp is None or (self.max_age is not None and time.time() - self.timestamp > self.max_age)
+
+    def handle_request(self, pdu):
+        function = pdu[0]
+        if function == READ_HOLDING_REGISTERS and self.is_stale():
+            self.stats['stale_reads'] += 1
+            return self._exception(function, GATEWAY_TARGET_FAILED)
+
+        if function in (WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_REGISTERS):
+            self.stats['forwarded_writes'] += 1
+            return self._forward_write(pdu)
+
+        return ModbusUnit.handle_request(self, pdu)
+
+    async def _forward_write(self, pdu):
+        """Response to a write, once the PLC answered it (at most WRITE_TIMEOUT)."""
+        function = pdu[0]
+        response, code = await asyncio.get_running_loop().run_in_executor(self._executor, self._write_upstream, pdu)
+        if response is None:
+            self.stats['failed_writes'] += 1
+            return self._exception(function, code if code else GATEWAY_TARGET_FAILED)
+        # back on the farm's loop, which owns the bank
+        ModbusUnit.handle_request(self, pdu)
+        return response
+
+    def _write_upstream(self, pdu):
+        response = self._upstream.custom_request(bytes(pdu))
+        return response, self._upstream.last_except
+
+    def close(self):
+        self._executor.submit(self._upstream.close)
+        self._executor.shutdown(wait=False)
+
+
+class Gateway(DcsComponent):
+    """Polls the PLCs and serves their cached registers on ip:port, see the module docstring.
+
+    Tags of a PLC are read in block reads planned once (adjacent tags share
+    a request, gaps up to MAX_READ_GAP registers are read through). By
+    default a PLC's image turns stale after five missed loops.
+
+        gateway = Gateway('Gateway1', TAG.TAG_LIST, Controllers.PLCs, '192.168.0.15', 502)
+        gateway.start()
+    """
+
+    MAX_READ_GAP = 8
+    STALE_LOOPS = 5
+
+    def __init__(self, name, tags, plcs, ip, port, loop=SpeedConfig.DEFAULT_PLC_PERIOD_MS, max_age=None):
+        DcsComponent.__init__(self, name, tags, plcs, loop)
+        self.ip = ip
+        self.port = port
+        self.stats = {'polls': 0, 'requests': 0, 'failures': 0}
+        if max_age is None:
+            max_age = self.STALE_LOOPS * loop / 1000
+
+        self.server = ModbusFarmServer(ip, port)
+        self.units = {}
+        self._ranges = {}
+        for plc_id, plc in plcs.items():
+            unit = GatewayUnit(ip, port, plc_id, self.server, plc, max_age)
+            unit.set_layouts(self._get_tag_layouts(plc_id))
+            self.units[plc_id] = self.server.attach_unit(unit)
+            tag_ids = sorted(data['id'] for data in tags.values() if data['plc'] == plc_id)
+            self._ranges[plc_id] = self.clients[plc_id].plan_ranges(
+                tag_ids, self.clients[plc_id].MAX_READ_REGISTERS, self.MAX_READ_GAP)
+
+    def _before_start(self):
+        DcsComponent._before_start(self)
+        self._poll()
+        self.server.start()
+        self.report('serving the PLCs on {}:{}'.format(self.ip, self.port), logging.INFO)
+
+    def _logic(self):
+        self._poll()
+
+    def _poll(self):
+        self.stats['polls'] += 1
+        for plc_id, ranges in self._ranges.items():
+            client = self.clients[plc_id].client
+            unit = self.units[plc_id]
+            complete = True
+            for start, count, _ in ranges:
+                self.stats['requests'] += 1
+                words = client.read_holding_registers(start, count)
+                if words is None:
+                    self.stats['failures'] += 1
+                    complete = False
+                    break
+                unit.bank.set_holding_registers(start, words)
+            if complete:
+                unit.timestamp = time.time()
+
+    def stop(self):
+        self.server.stop()
+        for unit in self.units.values():
+            unit.close()
+        DcsComponent.stop(self)
+
+    def read(self, tag):
+        """Cached value of tag and the time its PLC was last polled."""
+        plc_id = self.tags[tag]['plc']
+        return self.units[plc_id].get(self._get_tag_id(tag)), self.units[plc_id].timestamp
+
+    def read_many(self, tags):
+        """Cached {tag: value} of tags."""
+        return {tag: self.units[self.tags[tag]['plc']].get(self._get_tag_id(tag)) for tag in tags}
+
+    def get_timestamp(self, plc_id):
+        return self.units[plc_id].timestamp
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['units'] = {plc_id: dict(unit.stats) for plc_id, unit in self.units.items()}
+        return stats
@@ -0,0 +1,248 @@
+"""Runs the simulation components in processes of their own.
+
+Threads of one interpreter share the GIL, so the physics loop and the PLC
+scans slow each other down. The Launcher starts every component of a
+declarative list in its own (spawned) process, like the Docker deployment
+does, optionally pinned to CPU cores. A component is a dict:
+
+    {'name': 'PLC1',                  unique name
+     'module': 'PLC1',                module and Runnable class to create
+     'class': 'PLC1',                 (args and kwargs optional)
+     'after': ['Factory'],            components which must be ready first
+     'ready': ('127.0.0.1', 5502),    optional address accepting connections once ready
+     'cpus': [1],                     optional cores to pin the process to
+     'env': {'NAME': 'value'},        optional environment variables
+     'health_timeout': 10.0}          optional seconds without a scan before a restart
+
+Components start in dependency order, each once it has scanned (and its
+'ready' address answers); the dependents of a component which does not get
+ready are not started. A monitor thread restarts components which exit
+or stop scanning, at most MAX_RESTARTS times per RESTART_WINDOW seconds.
+"""
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from ics_sim.helper import error
+
+
+HEARTBEAT_INTERVAL = 0.5
+
+
+def run_component(component, heartbeat):
+    """Process body: creates and starts the component's Runnable, heartbeat holds the time of its last scan."""
+    os.environ.update(component.get('env', {}))
+    if component.get('cpus'):
+        pin_to_cpus(component['cpus'])
+
+    # the launcher stops the components, Ctrl-C in the terminal reaches it alone
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    module = importlib.import_module(component['module'])
+    runnable = getattr(module, component['class'])(*component.get('args', ()), **component.get('kwargs', {}))
+    runnable.start()
+
+    scans = 0
+    while not stop_event.wait(HEARTBEAT_INTERVAL):
+        if not runnable.is_running():
+            # the scans failed, exit for the launcher to restart the component
+            sys.exit(1)
+        if runnable.get_scan_count() != scans:
+            scans = runnable.get_scan_count()
+            heartbeat.value = time.time()
+    runnable.stop()
+
+
+def pin_to_cpus(cpus):
+    """Pin the calling process (and the threads it starts later) to the available ones of cpus."""
+    if not hasattr(os, 'sched_setaffinity'):
+        error('CPU pinning is not supported on this platform')
+        return
+    available = set(cpus) & os.sched_getaffinity(0)
+    if not available:
+        error('none of the CPUs {} is available, not pinning'.format(sorted(cpus)))
+        return
+    os.sched_setaffinity(0, available)
+
+
+class Launcher:
+    START_TIMEOUT = 30.0
+    HEALTH_INTERVAL = 1.0
+    HEALTH_TIMEOUT = 10.0
+    STOP_TIMEOUT = 5.0
+    MAX_RESTARTS = 5
+    RESTART_WINDOW = 60.0
+
+    def __init__(self, components, restart=True, max_restarts=MAX_RESTARTS):
+        self.components = self.order(components)
+        self.restart = restart
+        self.max_restarts = max_restarts
+        self.stats = {component['name']: {'pid': None, 'starts': 0, 'restarts': 0, 'exit_code': None,
+                                          'ready': False, 'failed': False}
+                      for component in self.components}
+        self._context = multiprocessing.get_context('spawn')
+        self._processes = {}
+        self._heartbeats = {}
+        self._restart_times = {component['name']: [] for component in self.components}
+        self._stop_event = threading.Event()
+        self._monitor = None
+
+    @staticmethod
+    def order(components):
+        """components sorted so every one comes after those in its 'after' list; ValueError on cycles."""
+        by_name = {component['name']: component for component in components}
+        if len(by_name) != len(components):
+            raise ValueError('component names are not unique')
+        ordered = []
+        visiting = set()
+
+        def visit(name, path):
+            if name not in by_name:
+                raise ValueError('{} depends on unknown component {}'.format(path[-1], name))
+            if name in path:
+                raise ValueError('circular dependency: {}'.format(' -> '.join(path + [name])))
+            if name in visiting:
+                return
+            visiting.add(name)
+            for dependency in by_name[name].get('after', []):
+                visit(dependency, path + [name])
+            ordered.append(by_name[name])
+
+        for component in components:
+            visit(component['name'], [])
+        return ordered
+
+    def start(self):
+        """Start the components in order, each once those it depends on are ready, then monitor them.
+
+        A component which does not get ready within START_TIMEOUT is stopped
+        and, like the components depending on it, marked failed and never
+        started; returns whether all the components got ready.
+        """
+        self._stop_event.clear()
+        try:
+            for component in self.components:
+                name = component['name']
+                failed = [dependency for dependency in component.get('after', [])
+                          if self.stats[dependency]['failed']]
+                if failed:
+                    self.stats[name]['failed'] = True
+                    error('{} not started, {} did not get ready'.format(name, ', '.join(failed)))
+                    continue
+                self._start(component)
+                if not self._wait_ready(component):
+                    self.stats[name]['failed'] = True
+                    self.stats[name]['exit_code'] = self._processes[name].exitcode
+                    self._terminate(name)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor.start()
+        return not any(stats['failed'] for stats in self.stats.values())
+
+    def stop(self):
+        """Stop the components in reverse order."""
+        self._stop_event.set()
+        if self._monitor is not None:
+            self._monitor.join()
+        for component in reversed(self.components):
+            self._terminate(component['name'])
+
+    def wait(self):
+        """Block until stop() or Ctrl-C, which stops the components."""
+        try:
+            while not self._stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+
+    def get_stats(self):
+        return {name: dict(stats) for name, stats in self.stats.items()}
+
+    def _start(self, component):
+        name = component['name']
+        heartbeat = self._context.Value('d', 0.0, lock=False)
+        process = self._context.Process(target=run_component, args=(component, heartbeat), name=name, daemon=True)
+        process.start()
+        self._processes[name] = process
+        self._heartbeats[name] = heartbeat
+        self.stats[name].update({'pid': process.pid, 'ready': False})
+        self.stats[name]['starts'] += 1
+
+    def _is_ready(self, component):
+        if self._heartbeats[component['name']].value == 0.0:
+            return False
+        if component.get('ready') is None:
+            return True
+        try:
+            socket.create_connection(tuple(component['ready']), timeout=0.5).close()
+            return True
+        except OSError:
+            return False
+
+    def _wait_ready(self, component):
+        name = component['name']
+        deadline = time.monotonic() + self.START_TIMEOUT
+        while time.monotonic() < deadline and self._processes[name].is_alive():
+            if self._is_ready(component):
+                self.stats[name]['ready'] = True
+                return True
+            time.sleep(0.1)
+        error('{} did not get ready (exit code {})'.format(name, self._processes[name].exitcode))
+        return False
+
+    def _terminate(self, name):
+        process = self._processes.get(name)
+        if process is None or not process.is_alive():
+            return
+        process.terminate()
+        process.join(self.STOP_TIMEOUT)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _monitor_loop(self):
+        while not self._stop_event.wait(self.HEALTH_INTERVAL):
+            for component in self.components:
+                name = component['name']
+                stats = self.stats[name]
+                if stats['failed']:
+                    continue
+                process = self._processes[name]
+                heartbeat = self._heartbeats[name].value
+                if not process.is_alive():
+                    stats['exit_code'] = process.exitcode
+                    reason = 'exited with code {}'.format(process.exitcode)
+                elif heartbeat and time.time() - heartbeat > component.get('health_timeout', self.HEALTH_TIMEOUT):
+                    reason = 'stopped scanning'
+                else:
+                    if not stats['ready'] and self._is_ready(component):
+                        stats['ready'] = True
+                    continue
+
+                if not self.restart or not self._may_restart(name):
+                    stats['failed'] = True
+                    stats['ready'] = False
+                    self._terminate(name)
+                    error('{} {}, giving up'.format(name, reason))
+                    continue
+                error('{} {}, restarting'.format(name, reason))
+                self._terminate(name)
+                stats['restarts'] += 1
+                self._start(component)
+
+    def _may_restart(self, name):
+        now = time.monotonic()
+        times = [start for start in self._restart_times[name] if now - start < self.RESTART_WINDOW]
+        if len(times) >= self.max_restarts:
+            return False
+        times.append(now)
+        self._restart_times[name] = times
+        return True
@@ -0,0 +1,191 @@
+"""Asynchronous, batched logging for the Runnables of a process.
+
+Runnable.report() and the component file loggers used to format, write and
+flush every record (and print it to the console) on the scan thread. With
+the pipeline, see LoggingConfig, file_handler() gives the loggers a
+PipelineHandler which only appends the record, unformatted, to one bounded
+queue per process. A single writer thread drains the queue in batches every
+FLUSH_INTERVAL, formats the records with the handler they were meant for
+and flushes every file once per batch. Console lines of report() go through
+the same queue.
+
+The scan threads never block on the disk or the terminal: when the queue is
+more than HIGH_WATER full only one in SAMPLE_RATE records below WARNING is
+kept, and when it is full the record is dropped; both are counted in
+get_stats(). Records are formatted later on, so log arguments should not be
+mutated after the call.
+"""
+import atexit
+import logging
+import sys
+import threading
+from collections import deque
+from logging.handlers import QueueHandler
+
+from ics_sim.configs import LoggingConfig
+
+
+class BatchFileHandler(logging.FileHandler):
+    """FileHandler flushed by the writer thread once per batch rather than once per record."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.FileHandler.flush(self)
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        logging.StreamHandler.flush(self)
+
+
+class PipelineHandler(QueueHandler):
+    """Queues the records for target, to be handled by the pipeline's writer thread.
+
+    It stands in for target on the logger: its level and formatter are the target's.
+    """
+
+    def __init__(self, pipeline, target):
+        QueueHandler.__init__(self, pipeline.records)
+        self.pipeline = pipeline
+        self.target = target
+        self.level = target.level
+
+    def setLevel(self, level):
+        QueueHandler.setLevel(self, level)
+        self.target.setLevel(level)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def handle(self, record):
+        # no handler lock, appending to the queue is atomic
+        if self.filter(record):
+            self.enqueue(record)
+            return True
+        return False
+
+    def prepare(self, record):
+        # formatting is left to the target handler on the writer thread
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.put(self.target, record)
+
+
+class LogPipeline:
+    """The records queued by the PipelineHandlers and the writer thread handling them.
+
+    The queue is a deque appended to by the logging threads without a lock;
+    the writer wakes up every interval seconds (or on stop()) and handles
+    all the queued records in one batch, so it competes with the scan
+    threads for the interpreter a few times a second instead of per record.
+    """
+
+    def __init__(self, queue_size=LoggingConfig.QUEUE_SIZE, interval=LoggingConfig.FLUSH_INTERVAL,
+                 high_water=LoggingConfig.HIGH_WATER, sample_rate=LoggingConfig.SAMPLE_RATE):
+        self.records = deque()
+        self.queue_size = queue_size
+        self.interval = interval
+        self.high_water = int(high_water * queue_size)
+        self.sample_rate = sample_rate
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'sampled_out': 0, 'dropped': 0, 'errors': 0}
+        self._sample_counter = 0
+        self._console = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, target, record):
+        pending = len(self.records)
+        if pending >= self.high_water and record.levelno < logging.WARNING:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.stats['sampled_out'] += 1
+                return
+        if pending >= self.queue_size:
+            self.stats['dropped'] += 1
+            return
+        self.records.append((target, record))
+        self.stats['queued'] += 1
+
+    def wrap(self, handler):
+        """Handler to add to a logger instead of handler."""
+        return PipelineHandler(self, handler)
+
+    def console(self, line):
+        if self._console is None:
+            self._console = BatchStreamHandler(sys.stdout)
+        self.put(self._console, logging.makeLogRecord({'msg': line, 'levelno': logging.INFO}))
+
+    def stop(self):
+        """Write out what is queued and stop the writer thread."""
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._write_batch()
+        self._write_batch()
+
+    def _write_batch(self):
+        records = self.records
+        if not records:
+            return
+        targets = set()
+        count = len(records)
+        for _ in range(count):
+            target, record = records.popleft()
+            try:
+                target.handle(record)
+            except Exception:
+                self.stats['errors'] += 1
+            targets.add(target)
+        for target in targets:
+            if hasattr(target, 'flush_batch'):
+                target.flush_batch()
+        self.stats['written'] += count
+        self.stats['batches'] += 1
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """The process's LogPipeline, started on first use; None when LoggingConfig.ASYNC is off."""
+    global _pipeline
+    if not LoggingConfig.ASYNC or _pipeline is not None:
+        return _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline()
+            atexit.register(_pipeline.stop)
+        return _pipeline
+
+
+def file_handler(path, mode='a', encoding=None):
+    """A FileHandler for path, writing through the pipeline when it is on."""
+    pipeline = get_pipeline()
+    if pipeline is None:
+        return logging.FileHandler(path, mode=mode, encoding=encoding)
+    return pipeline.wrap(BatchFileHandler(path, mode=mode, encoding=encoding))
+
+
+def console(line):
+    """Print line to the console, from the writer thread when the pipeline is on."""
+    if not LoggingConfig.CONSOLE:
+        return
+    pipeline = get_pipeline()
+    if pipeline is None:
+        print(line, flush=True)
+    else:
+        pipeline.console(line)
+
+
+def get_stats():
+    return {} if _pipeline is None else dict(_pipeline.stats)
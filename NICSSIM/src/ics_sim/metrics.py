@@ -0,0 +1,264 @@
+"""Scan phase latency histograms of the Runnables in a process.
+
+Every Runnable records, per scan, its wake-up jitter (how late the scan
+started against its deadline), the time spent in _pre_logic_update, _logic
+and _post_logic_update, and the time of each connector / Modbus call, into
+ScanMetrics histograms registered in REGISTRY. The histograms are HDR style:
+values in ns fall in log-linear buckets (64 sub-buckets per power of two,
+so any percentile is within 1.6%) and recording is a dict increment, cheap
+enough for every call.
+
+The registry is published by start_exporters(), called by Runnable.start()
+as configured in MetricsConfig:
+
+    http://<ip>:<port>/metrics          Prometheus text format (summaries)
+    http://<ip>:<port>/metrics.json     the same as JSON
+    ./logs/metrics-<component>.json     JSON dump every DUMP_INTERVAL seconds
+"""
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from ics_sim.configs import MetricsConfig
+from ics_sim.helper import error
+
+
+class Histogram:
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        """Record a value in ns (negative values count as 0)."""
+        value = int(value) if value > 0 else 0
+        shift = value.bit_length() - self.SUB_BUCKET_BITS - 1
+        if shift <= 0:
+            index = value
+        else:
+            index = (shift + 1) * self.SUB_BUCKETS + (value >> shift) - self.SUB_BUCKETS
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def _highest_value(self, index):
+        """Largest value falling in bucket index."""
+        if index < 2 * self.SUB_BUCKETS:
+            return index
+        shift = index // self.SUB_BUCKETS - 1
+        return ((index % self.SUB_BUCKETS + self.SUB_BUCKETS + 1) << shift) - 1
+
+    def percentile(self, quantile):
+        """Value in ns below which the quantile (0..1) of the records fall, 0 when empty."""
+        counts = dict(self.counts)
+        rank = quantile * sum(counts.values())
+        seen = 0
+        for index in sorted(counts):
+            seen += counts[index]
+            if seen >= rank:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    def reset(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def summary(self):
+        """count, mean, max and the QUANTILES in ms."""
+        summary = {'count': self.count, 'mean': self.total / max(1, self.count) / 1e6, 'max': self.max / 1e6}
+        for quantile in self.QUANTILES:
+            summary['p{}'.format(str(quantile)[2:].ljust(2, '0'))] = self.percentile(quantile) / 1e6
+        return summary
+
+
+class ScanMetrics:
+    """The histograms of one component, by scan phase."""
+
+    PHASES = ('jitter', 'pre_logic', 'logic', 'post_logic', 'io')
+
+    def __init__(self, component):
+        self.component = component
+        self.histograms = {phase: Histogram() for phase in self.PHASES}
+        self.jitter = self.histograms['jitter']
+        self.pre_logic = self.histograms['pre_logic']
+        self.logic = self.histograms['logic']
+        self.post_logic = self.histograms['post_logic']
+        self.io = self.histograms['io']
+
+    def summary(self):
+        return {phase: histogram.summary() for phase, histogram in self.histograms.items()}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, component):
+        """ScanMetrics of component; a component created again (e.g. restarted) starts from scratch."""
+        metrics = ScanMetrics(component)
+        with self._lock:
+            self._metrics[component] = metrics
+        return metrics
+
+    def unregister(self, component):
+        with self._lock:
+            self._metrics.pop(component, None)
+
+    def components(self):
+        with self._lock:
+            return dict(self._metrics)
+
+    def to_json(self):
+        return json.dumps({'time': time.time(), 'pid': os.getpid(),
+                           'components': {component: metrics.summary()
+                                          for component, metrics in self.components().items()}})
+
+    def to_prometheus(self):
+        lines = ['# HELP ics_sim_scan_phase_seconds Time per scan phase of the ICS simulation components.',
+                 '# TYPE ics_sim_scan_phase_seconds summary']
+        for component, metrics in sorted(self.components().items()):
+            for phase, histogram in metrics.histograms.items():
+                labels = 'component="{}",phase="{}"'.format(component.replace('"', '\\"'), phase)
+                for quantile in histogram.QUANTILES:
+                    lines.append('ics_sim_scan_phase_seconds{{{},quantile="{}"}} {:.9f}'.format(
+                        labels, quantile, histogram.percentile(quantile) / 1e9))
+                lines.append('ics_sim_scan_phase_seconds_sum{{{}}} {:.9f}'.format(labels, histogram.total / 1e9))
+                lines.append('ics_sim_scan_phase_seconds_count{{{}}} {}'.format(labels, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def timed_io(method):
+    """Record the time of each call of a Runnable method in its io histogram."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._metrics.io.record(time.perf_counter_ns() - start)
+    return wrapper
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """Serves the registry on http://ip:port/metrics (Prometheus) and /metrics.json."""
+
+    def __init__(self, ip, port, registry=REGISTRY):
+        self.ip = ip
+        self.port = port
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = registry.to_json(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer((self.ip, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+
+
+class MetricsDumper:
+    """Writes the registry as JSON to path every interval seconds (replacing the file atomically)."""
+
+    def __init__(self, path, interval, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(self.registry.to_json())
+        os.replace(temp_path, self.path)
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(component):
+    """Start the MetricsConfig exporters of this process once, the dump file named after component."""
+    with _exporters_lock:
+        if _exporters.get('started'):
+            return
+        _exporters['started'] = True
+        if MetricsConfig.HTTP_PORT is not None:
+            server = MetricsServer(MetricsConfig.HTTP_IP, MetricsConfig.HTTP_PORT)
+            try:
+                server.start()
+                _exporters['server'] = server
+            except OSError as e:
+                error('metrics endpoint on {}:{} not started: {}'.format(MetricsConfig.HTTP_IP,
+                                                                        MetricsConfig.HTTP_PORT, e))
+        if MetricsConfig.DUMP_INTERVAL:
+            dumper = MetricsDumper(os.path.join(MetricsConfig.DUMP_DIR, 'metrics-{}.json'.format(component)),
+                                   MetricsConfig.DUMP_INTERVAL)
+            dumper.start()
+            _exporters['dumper'] = dumper
@@ -1,6 +1,26 @@
+import asyncio
+import inspect
+import itertools
+import socket
+import struct
+import threading
+import time
+
 from pyModbusTCP.client import ModbusClient
 from pyModbusTCP.server import ModbusServer, DataBank
 
+# Modbus/TCP framing used by the asyncio client and server
+MBAP_HEADER = struct.Struct('>HHHB')
+READ_HOLDING_REGISTERS = 0x03
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_REGISTERS = 0x10
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+SERVER_DEVICE_BUSY = 0x06
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_FAILED = 0x0B
+
 
 class Client:
     def __init__(self, ip, port):
@@ -32,64 +52,249 @@ class Server:
         pass
 
 
-class ModbusBase:
+class ModbusCodec:
+    """Encodes whole arrays of tag values to holding register words and back.
+
+    Each value has a layout: FIXED is a signed (two's complement) fixed-point
+    integer of word_num words with precision decimal digits, UFIXED the
+    unsigned one, FLOAT32 and FLOAT64 are IEEE 754 floats on 2 and 4 words.
+    Words are big endian, most significant word first. The struct formats of
+    every layout sequence are compiled once, so an array is converted with
+    one pack and one unpack call.
+
+    The original ModbusBase encoder was unsigned: with the defaults (2 words,
+    4 digits) it took 0 to 429496.7295. FIXED, the default layout, takes
+    -214748.3648 to 214748.3647 and writes the same words as the original
+    encoder within that range; larger values raise ValueError, and words
+    with the top bit set, written by the original encoder for values above
+    214748.3647, decode as negative. Tags which need the original range
+    (and no negative values) use UFIXED, which is the original wire format.
+    """
+
+    FIXED = 'fixed'
+    UFIXED = 'ufixed'
+    FLOAT32 = 'float32'
+    FLOAT64 = 'float64'
+
+    FIXED_FORMATS = {1: 'h', 2: 'i', 4: 'q'}
+    UFIXED_FORMATS = {1: 'H', 2: 'I', 4: 'Q'}
+    FIXED_LAYOUTS = (FIXED, UFIXED)
+
     def __init__(self, word_num=2, precision=4):
-        self._precision = precision
-        self._word_num = word_num
+        if word_num not in self.FIXED_FORMATS:
+            raise ValueError('fixed-point values need 1, 2 or 4 words, not {}'.format(word_num))
+
         self._precision_factor = pow(10, precision)
-        self._base = pow(2, 16)
-        self._max_int = pow(self._base, word_num)
+        self._formats = {self.FIXED: self.FIXED_FORMATS[word_num], self.UFIXED: self.UFIXED_FORMATS[word_num],
+                         self.FLOAT32: 'f', self.FLOAT64: 'd'}
+        self._words = {self.FIXED: word_num, self.UFIXED: word_num, self.FLOAT32: 2, self.FLOAT64: 4}
+        self._structs = {}
+        self._single = {layout: (struct.Struct('>' + code), struct.Struct('>{}H'.format(self._words[layout])))
+                        for layout, code in self._formats.items()}
+
+    def words(self, layout=FIXED):
+        return self._words[layout]
+
+    def format(self, layout=FIXED):
+        """struct format character of layout; its big endian bytes are the register words."""
+        return self._formats[layout]
+
+    @property
+    def precision_factor(self):
+        return self._precision_factor
+
+    def pack(self, value, layout=FIXED):
+        """Return the register words of value as big endian bytes."""
+        if layout in self.FIXED_LAYOUTS:
+            value = round(value * self._precision_factor)
+        try:
+            return self._single[layout][0].pack(value)
+        except struct.error as e:
+            raise ValueError('input number exceed max limit ({})'.format(e))
+
+    def unpack(self, data, layout=FIXED):
+        value = self._single[layout][0].unpack(data)[0]
+        return value / self._precision_factor if layout in self.FIXED_LAYOUTS else value
+
+    def encode(self, value, layout=FIXED):
+        values_struct, words_struct = self._single[layout]
+        if layout in self.FIXED_LAYOUTS:
+            value = round(value * self._precision_factor)
+        try:
+            return list(words_struct.unpack(values_struct.pack(value)))
+        except struct.error as e:
+            raise ValueError('input number exceed max limit ({})'.format(e))
+
+    def decode(self, word_array, layout=FIXED):
+        values_struct, words_struct = self._single[layout]
+        if len(word_array) != self._words[layout]:
+            raise ValueError('word array length is not correct')
+        value = values_struct.unpack(words_struct.pack(*word_array))[0]
+        return value / self._precision_factor if layout in self.FIXED_LAYOUTS else value
+
+    def _compile(self, layouts, count):
+        key = count if layouts is None else layouts
+        compiled = self._structs.get(key)
+        if compiled is None:
+            if layouts is None:
+                layouts = (self.FIXED,) * count
+            for layout in layouts:
+                if layout not in self._formats:
+                    raise ValueError('unknown register layout {}'.format(layout))
+            values = struct.Struct('>' + ''.join(self._formats[layout] for layout in layouts))
+            words = struct.Struct('>{}H'.format(values.size // 2))
+            fixed = [index for index, layout in enumerate(layouts) if layout in self.FIXED_LAYOUTS]
+            compiled = (values, words, None if len(fixed) == len(layouts) else fixed)
+            self._structs[key] = compiled
+        return compiled
+
+    def encode_many(self, values, layouts=None):
+        """Return the register words of values; layouts defaults to FIXED for every value."""
+        factor = self._precision_factor
+        if layouts is None:
+            values_struct, words_struct, fixed = self._compile(None, len(values))
+        else:
+            values_struct, words_struct, fixed = self._compile(tuple(layouts), len(values))
+
+        if fixed is None:
+            scaled = [round(value * factor) for value in values]
+        else:
+            scaled = list(values)
+            for index in fixed:
+                scaled[index] = round(scaled[index] * factor)
+
+        try:
+            return list(words_struct.unpack(values_struct.pack(*scaled)))
+        except struct.error as e:
+            raise ValueError('input number exceed max limit ({})'.format(e))
 
-    def decode(self, word_array):
+    def decode_many(self, word_array, layouts=None):
+        """Return the values stored in word_array; layouts defaults to FIXED for every value."""
+        factor = self._precision_factor
+        if layouts is None:
+            count = len(word_array) // self._words[self.FIXED]
+            values_struct, words_struct, fixed = self._compile(None, count)
+        else:
+            values_struct, words_struct, fixed = self._compile(tuple(layouts), 0)
 
-        if len(word_array) != self._word_num:
+        if len(word_array) != words_struct.size // 2:
             raise ValueError('word array length is not correct')
 
-        base_holder = 1
-        result = 0
+        values = values_struct.unpack(words_struct.pack(*word_array))
+        if fixed is None:
+            return [value / factor for value in values]
+
+        values = list(values)
+        for index in fixed:
+            values[index] /= factor
+        return values
+
+
+class ModbusBase:
+    def __init__(self, word_num=2, precision=4):
+        self._precision = precision
+        self._word_num = word_num
+        self._precision_factor = pow(10, precision)
+        self._codec = ModbusCodec(word_num, precision)
+        self._layouts = {}
+
+    def set_layouts(self, layouts):
+        """Select the register layout (see ModbusCodec) per tag id, tags not listed stay fixed-point.
 
-        for word in word_array:
-            result *= base_holder
-            result += word
-            base_holder *= self._base
+        Addresses stay tag_id * word_num, so a tag whose layout is wider than
+        word_num words also covers the registers of the following tag ids,
+        which must be left unused.
+        """
+        for tag_id, layout in layouts.items():
+            self._codec.words(layout)
+            self._layouts[tag_id] = layout
 
-        return result / self._precision_factor
+    def get_layout(self, tag_id):
+        return self._layouts.get(tag_id, ModbusCodec.FIXED)
 
-    def encode(self, number):
+    def get_words(self, tag_id):
+        return self._codec.words(self.get_layout(tag_id))
 
-        number = int(number * self._precision_factor)
+    def decode(self, word_array, layout=ModbusCodec.FIXED):
+        return self._codec.decode(word_array, layout)
 
-        if number > self._max_int:
-            raise ValueError('input number exceed max limit')
+    def encode(self, number, layout=ModbusCodec.FIXED):
+        return self._codec.encode(number, layout)
 
-        result = []
-        while number:
-            result.append(number % self._base)
-            number = int(number / self._base)
+    def decode_many(self, word_array, layouts=None):
+        return self._codec.decode_many(word_array, layouts)
 
-        while len(result) < self._word_num:
-            result.append(0)
+    def encode_many(self, values, layouts=None):
+        return self._codec.encode_many(values, layouts)
 
-        result.reverse()
-        return result
+    def decode_range(self, words, start, tag_ids):
+        """Decode the values of tag_ids from the words of a register range read from start."""
+        tag_words = []
+        for tag_id in tag_ids:
+            offset = self.get_registers(tag_id) - start
+            tag_words.extend(words[offset:offset + self.get_words(tag_id)])
+        return self.decode_many(tag_words, [self.get_layout(tag_id) for tag_id in tag_ids])
 
     def get_registers(self, index):
         return index * self._word_num
 
+    def plan_ranges(self, tag_ids, max_registers=125, max_gap=0):
+        """Group tag ids into [(first register, register count, tag ids)] request ranges.
+
+        Tags closer than max_gap registers share a range (the gap is read and
+        discarded), no range is longer than max_registers. Writes must use
+        max_gap=0 so that registers between the tags are not overwritten.
+        """
+        ranges = []
+        for tag_id in sorted(set(tag_ids)):
+            start = self.get_registers(tag_id)
+            end = start + self.get_words(tag_id)
+            if ranges:
+                first, count, ids = ranges[-1]
+                if start - (first + count) <= max_gap and end - first <= max_registers:
+                    ranges[-1] = (first, end - first, ids + [tag_id])
+                    continue
+            ranges.append((start, end - start, [tag_id]))
+        return ranges
+
 
 class ClientModbus(Client, ModbusBase):
-    def __init__(self, ip, port):
+    MAX_READ_REGISTERS = 125
+    MAX_WRITE_REGISTERS = 123
+
+    def __init__(self, ip, port, unit_id=1):
         ModbusBase.__init__(self)
         Client.__init__(self, ip, port)
-        self.client = ModbusClient(host=self.ip, port=self.port)
+        self.client = ModbusClient(host=self.ip, port=self.port, unit_id=unit_id)
 
     def receive(self, tag_id):
         self.open()
-        return self.decode(self.client.read_holding_registers(self.get_registers(tag_id), self._word_num))
+        return self.decode(self.client.read_holding_registers(self.get_registers(tag_id), self.get_words(tag_id)),
+                           self.get_layout(tag_id))
+
+    def receive_many(self, tag_ids):
+        """Read tag_ids with one read_holding_registers per planned register range; returns {tag_id: value}."""
+        self.open()
+        values = {}
+        for start, count, range_ids in self.plan_ranges(tag_ids, self.MAX_READ_REGISTERS, self.MAX_READ_REGISTERS):
+            words = self.client.read_holding_registers(start, count)
+            if words is None:
+                raise IOError('cannot read registers {}-{} from {}:{}'.format(start, start + count - 1, self.ip, self.port))
+            values.update(zip(range_ids, self.decode_range(words, start, range_ids)))
+        return values
 
     def send(self, tag_id, value):
         self.open()
-        self.client.write_multiple_registers(self.get_registers(tag_id), self.encode(value))
+        self.client.write_multiple_registers(self.get_registers(tag_id), self.encode(value, self.get_layout(tag_id)))
+
+    def send_many(self, values):
+        """Write {tag_id: value} with one write_multiple_registers per block of adjacent tags."""
+        self.open()
+        for start, count, range_ids in self.plan_ranges(values, self.MAX_WRITE_REGISTERS):
+            words = self.encode_many([values[tag_id] for tag_id in range_ids],
+                                     [self.get_layout(tag_id) for tag_id in range_ids])
+            if not self.client.write_multiple_registers(start, words):
+                raise IOError('cannot write registers {}-{} on {}:{}'.format(start, start + count - 1, self.ip, self.port))
 
     def open(self):
         if not self.client.is_open:
@@ -100,11 +305,357 @@ class ClientModbus(Client, ModbusBase):
             self.client.close()
 
 
-class ServerModbus(Server, ModbusBase):
-    def __init__(self, ip, port):
+class AsyncClientModbus(ModbusBase):
+    """Asyncio Modbus/TCP client which pipelines requests over one connection.
+
+    Every request gets its own MBAP transaction id, so any number of
+    coroutines can have requests in flight at the same time; a reader task
+    matches the responses to the waiting requests by id. A request which is
+    not answered within timeout seconds is sent again up to retries times, a
+    lost connection is reopened by the next request.
+
+    The tag level API mirrors ClientModbus with coroutines:
+
+        client = ProtocolFactory.create_async_client(protocol, ip, port)
+        values = await asyncio.gather(*(client.receive(tag_id) for tag_id in tag_ids))
+    """
+
+    MAX_READ_REGISTERS = 125
+    MAX_WRITE_REGISTERS = 123
+    WRITE_BUFFER_LIMIT = 65536
+
+    def __init__(self, ip, port, unit_id=1, timeout=1.0, retries=2):
+        ModbusBase.__init__(self)
+        self.ip = ip
+        self.port = port
+        self.unit_id = unit_id
+        self.timeout = timeout
+        self.retries = retries
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._open_lock = None
+        self._pending = {}
+        self._transaction_ids = itertools.cycle(range(1, 0x10000))
+        self.stats = {'requests': 0, 'timeouts': 0, 'retries': 0, 'reconnects': 0}
+
+    @property
+    def is_open(self):
+        return self._writer is not None
+
+    async def open(self):
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, self.port), self.timeout)
+            self._writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._reader_task = asyncio.ensure_future(self._read_responses(self._reader))
+            self.stats['reconnects'] += 1
+
+    async def close(self):
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        self._fail_pending(ConnectionError('connection to {}:{} closed'.format(self.ip, self.port)))
+
+    def _fail_pending(self, exception):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exception)
+
+    async def _read_responses(self, reader):
+        try:
+            while True:
+                transaction_id, _, length, _ = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+                pdu = await reader.readexactly(length - 1)
+                future = self._pending.pop(transaction_id, None)
+                # late answers of requests which already timed out are dropped
+                if future is not None and not future.done():
+                    future.set_result(pdu)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            if self._reader is reader:
+                writer, self._writer = self._writer, None
+                if writer is not None:
+                    writer.close()
+                self._fail_pending(ConnectionError('connection to {}:{} lost: {}'.format(self.ip, self.port, e)))
+
+    def _expire(self, transaction_id, future):
+        if not future.done():
+            self._pending.pop(transaction_id, None)
+            future.set_exception(asyncio.TimeoutError())
+
+    def _next_transaction_id(self):
+        transaction_id = next(self._transaction_ids)
+        while transaction_id in self._pending:
+            transaction_id = next(self._transaction_ids)
+        return transaction_id
+
+    async def request(self, pdu):
+        """Send one request PDU and return the response PDU."""
+        self.stats['requests'] += 1
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+            transaction_id = None
+            try:
+                if self._writer is None:
+                    await self.open()
+                transaction_id = self._next_transaction_id()
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self._pending[transaction_id] = future
+                self._writer.write(MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, self.unit_id) + pdu)
+                if self._writer.transport.get_write_buffer_size() > self.WRITE_BUFFER_LIMIT:
+                    await self._writer.drain()
+                # a timer instead of asyncio.wait_for, which costs a task per request
+                expiry = loop.call_later(self.timeout, self._expire, transaction_id, future)
+                try:
+                    response = await future
+                finally:
+                    expiry.cancel()
+
+            except asyncio.TimeoutError:
+                self.stats['timeouts'] += 1
+                if attempt == self.retries:
+                    raise
+                continue
+
+            except (ConnectionError, OSError):
+                await self.close()
+                if attempt == self.retries:
+                    raise
+                continue
+
+            if response[0] & 0x80:
+                raise IOError('modbus exception {} for function {} from {}:{}'.format(
+                    response[1], response[0] & 0x7F, self.ip, self.port))
+            return response
+
+    async def read_holding_registers(self, address, count):
+        response = await self.request(struct.pack('>BHH', READ_HOLDING_REGISTERS, address, count))
+        return list(struct.unpack('>{}H'.format(response[1] // 2), response[2:2 + response[1]]))
+
+    async def write_multiple_registers(self, address, words):
+        await self.request(struct.pack('>BHHB{}H'.format(len(words)), WRITE_MULTIPLE_REGISTERS,
+                                       address, len(words), 2 * len(words), *words))
+        return True
+
+    async def receive(self, tag_id):
+        words = await self.read_holding_registers(self.get_registers(tag_id), self.get_words(tag_id))
+        return self.decode(words, self.get_layout(tag_id))
+
+    async def receive_many(self, tag_ids):
+        """Like ClientModbus.receive_many, with all range requests in flight at once."""
+        ranges = self.plan_ranges(tag_ids, self.MAX_READ_REGISTERS, self.MAX_READ_REGISTERS)
+        blocks = await asyncio.gather(*(self.read_holding_registers(start, count) for start, count, _ in ranges))
+        values = {}
+        for (start, _, range_ids), words in zip(ranges, blocks):
+            values.update(zip(range_ids, self.decode_range(words, start, range_ids)))
+        return values
+
+    async def send(self, tag_id, value):
+        await self.write_multiple_registers(self.get_registers(tag_id), self.encode(value, self.get_layout(tag_id)))
+
+    async def send_many(self, values):
+        """Like ClientModbus.send_many, with all block writes in flight at once."""
+        await asyncio.gather(*(
+            self.write_multiple_registers(start, self.encode_many([values[tag_id] for tag_id in range_ids],
+                                                                  [self.get_layout(tag_id) for tag_id in range_ids]))
+            for start, _, range_ids in self.plan_ranges(values, self.MAX_WRITE_REGISTERS)))
+
+
+class RegisterBank(DataBank):
+    """Holding registers of a Modbus server in one shared buffer.
+
+    The registers are stored in a bytearray in Modbus byte order (big endian
+    words), exposed as the memoryview memory, so a read request is answered
+    with one slice copy and a RegisterView decodes tag values straight out
+    of the buffer. It replaces pyModbusTCP's DataBank (a list of ints) for
+    holding registers; the other spaces are not used by the simulator and
+    are left empty. The on_holding_registers_change hook is not called.
+    """
+
+    def __init__(self, size=0x10000):
+        DataBank.__init__(self, coils_size=0, d_inputs_size=0, h_regs_size=0, i_regs_size=0)
+        self.size = size
+        self.buffer = bytearray(2 * size)
+        self.memory = memoryview(self.buffer)
+        self.lock = threading.Lock()
+
+    def get_holding_registers(self, address, number=1, srv_info=None):
+        if address < 0 or address + number > self.size:
+            return None
+        with self.lock:
+            return list(struct.unpack_from('>{}H'.format(number), self.buffer, 2 * address))
+
+    def set_holding_registers(self, address, word_list, srv_info=None):
+        word_list = [int(word) & 0xffff for word in word_list]
+        if address < 0 or address + len(word_list) > self.size:
+            return None
+        with self.lock:
+            struct.pack_into('>{}H'.format(len(word_list)), self.buffer, 2 * address, *word_list)
+        return True
+
+    def read_bytes(self, address, number):
+        """Return number registers from address as big endian bytes."""
+        with self.lock:
+            return self.memory[2 * address:2 * (address + number)].tobytes()
+
+    def write_bytes(self, address, data):
+        with self.lock:
+            self.memory[2 * address:2 * address + len(data)] = data
+
+
+class RegisterView:
+    """Typed view of the registers of a fixed list of tags in a RegisterBank.
+
+    The layouts are compiled to struct formats once: read() decodes all the
+    values with one unpack_from on the bank (registers between the tags are
+    skipped as pad bytes) and write() encodes all the values first, then
+    copies each run of adjacent tags into the bank with one slice
+    assignment, so registers between the tags are never touched. Values are
+    in the order of tag_ids.
+    """
+
+    def __init__(self, bank, codec, tag_ids, addresses, layouts):
+        self.tag_ids = list(tag_ids)
+        self._bank = bank
+        self._factor = codec.precision_factor
+
+        order = sorted(range(len(addresses)), key=lambda index: addresses[index])
+        self._order = None if order == list(range(len(order))) else order
+        self._positions = None if self._order is None else sorted(range(len(order)), key=lambda index: order[index])
+        self._fixed = [position for position, index in enumerate(order)
+                       if layouts[index] in ModbusCodec.FIXED_LAYOUTS]
+
+        codes = []
+        self._runs = []
+        end = None
+        for position, index in enumerate(order):
+            address = addresses[index]
+            if end is not None and address < end:
+                raise ValueError('registers of tag {} overlap the previous tag'.format(self.tag_ids[index]))
+            if end is None or address > end:
+                if end is not None:
+                    codes.append('{}x'.format(2 * (address - end)))
+                self._runs.append([2 * address, position, position, ''])
+            code = codec.format(layouts[index])
+            codes.append(code)
+            self._runs[-1][2] = position + 1
+            self._runs[-1][3] += code
+            end = address + codec.words(layouts[index])
+
+        self._offset = self._runs[0][0] if self._runs else 0
+        self._struct = struct.Struct('>' + ''.join(codes))
+        self._runs = [(offset, first, last, struct.Struct('>' + run_codes)) for offset, first, last, run_codes in self._runs]
+
+    def read(self):
+        if not self._runs:
+            return []
+        with self._bank.lock:
+            values = list(self._struct.unpack_from(self._bank.buffer, self._offset))
+        for position in self._fixed:
+            values[position] /= self._factor
+        if self._positions is None:
+            return values
+        return [values[position] for position in self._positions]
+
+    def write(self, values):
+        values = list(values) if self._order is None else [values[index] for index in self._order]
+        for position in self._fixed:
+            values[position] = round(values[position] * self._factor)
+        try:
+            chunks = [(offset, run_struct.pack(*values[first:last])) for offset, first, last, run_struct in self._runs]
+        except struct.error as e:
+            raise ValueError('input number exceed max limit ({})'.format(e))
+
+        memory = self._bank.memory
+        with self._bank.lock:
+            for offset, data in chunks:
+                memory[offset:offset + len(data)] = data
+
+
+class RegisterServer(Server, ModbusBase):
+    """Base of the Modbus servers: tag values live in the RegisterBank bank."""
+
+    def __init__(self, ip, port, size=0x10000):
         ModbusBase.__init__(self)
         Server.__init__(self, ip, port)
-        self.server = ModbusServer(ip, port, no_block=True)
+        self.bank = RegisterBank(size)
+
+    def set(self, tag_id, value):
+        self.bank.write_bytes(self.get_registers(tag_id), self._codec.pack(value, self.get_layout(tag_id)))
+
+    def get(self, tag_id):
+        return self._codec.unpack(self.bank.read_bytes(self.get_registers(tag_id), self.get_words(tag_id)),
+                                  self.get_layout(tag_id))
+
+    def view(self, tag_ids):
+        """RegisterView of tag_ids with the current layouts; create it after set_layouts()."""
+        return RegisterView(self.bank, self._codec, tag_ids,
+                            [self.get_registers(tag_id) for tag_id in tag_ids],
+                            [self.get_layout(tag_id) for tag_id in tag_ids])
+
+
+class PolicyModbusServer(ModbusServer):
+    """pyModbusTCP server which closes the connections a ClientPolicy refuses before starting their thread."""
+
+    def __init__(self, host, port, policy, **kwargs):
+        ModbusServer.__init__(self, host, port, **kwargs)
+        self.policy = policy
+        self._admitted = {}
+        self._admitted_lock = threading.Lock()
+        self._shutdown_request = None
+
+    def _serve(self):
+        # hooked into the socketserver before serve_forever() accepts the first connection
+        self._shutdown_request = self._service.shutdown_request
+        self._service.verify_request = self._verify_request
+        self._service.shutdown_request = self._close_request
+        ModbusServer._serve(self)
+
+    def _verify_request(self, request, client_address):
+        if not self.policy.connect(client_address[0]):
+            return False
+        with self._admitted_lock:
+            self._admitted[request] = client_address[0]
+        return True
+
+    def _close_request(self, request):
+        with self._admitted_lock:
+            ip = self._admitted.pop(request, None)
+        if ip is not None:
+            self.policy.disconnect(ip)
+        self._shutdown_request(request)
+
+
+class ServerModbus(RegisterServer):
+    def __init__(self, ip, port, policy=None):
+        RegisterServer.__init__(self, ip, port)
+        # pyModbusTCP gives every client its own thread: a ClientPolicy caps the connections per client IP
+        # and limits their request rates, its priority classes need the single queue of AsyncServerModbus
+        self.policy = policy
+        if policy is None:
+            self.server = ModbusServer(ip, port, no_block=True, data_bank=self.bank)
+        else:
+            self.server = PolicyModbusServer(ip, port, policy, no_block=True, data_bank=self.bank,
+                                             ext_engine=self._engine)
+
+    def _engine(self, session_data):
+        delay = self.policy.admit(session_data.client.address)
+        if delay is None:
+            session_data.response.pdu.build_except(session_data.request.pdu.func_code, SERVER_DEVICE_BUSY)
+            return
+        if delay:
+            time.sleep(delay)
+        self.server._internal_engine(session_data)
 
     def start(self):
         self.server.start()
@@ -112,27 +663,463 @@ class ServerModbus(Server, ModbusBase):
     def stop(self):
         self.server.stop()
 
-    def set(self, tag_id, value):
-        self.server.data_bank.set_holding_registers(self.get_registers(tag_id),self.encode(value))
-        #DataBank.set_words(self.get_registers(tag_id), self.encode(value))
 
-    def get(self, tag_id):
-        return self.decode(self.server.data_bank.get_holding_registers(self.get_registers(tag_id), self._word_num))
-        #return self.decode(DataBank.get_words(self.get_registers(tag_id), self._word_num))
+class TokenBucket:
+    """Refills rate tokens per second up to burst; tokens may be borrowed to queue requests."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+
+    def reserve(self, max_delay):
+        """Take a token; returns the seconds to wait for it, None if that is longer than max_delay."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        delay = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+        if delay > max_delay:
+            return None
+        self._tokens -= 1
+        return delay
+
+
+class ClientPolicy:
+    """Admission control per client IP for the Modbus servers.
+
+    Clients are sorted into classes by IP; every class sets a priority (0 is
+    served first), a request rate and burst per client IP (no rate: not
+    limited) and a maximum number of connections per client IP. IPs not
+    listed fall into the default class. A request over its client's rate is
+    deferred until the bucket has a token again, or dropped with a "server
+    device busy" exception when that takes longer than max_delay seconds.
+
+        policy = ClientPolicy({'operators': {'ips': ['192.168.0.21'], 'priority': 0}},
+                              default={'priority': 1, 'rate': 50, 'burst': 10, 'max_connections': 2})
+
+    get_stats() counts served, deferred and dropped requests and accepted
+    and rejected connections per class and per client IP.
+    """
+
+    DEFAULT_CLASS = 'default'
+    DEFAULT_PRIORITY = 1
+
+    def __init__(self, classes=None, default=None, max_delay=0.05):
+        self.max_delay = max_delay
+        self._classes = {self.DEFAULT_CLASS: dict(default or {})}
+        self._classes[self.DEFAULT_CLASS].setdefault('priority', self.DEFAULT_PRIORITY)
+        self._class_of = {}
+        for name, config in (classes or {}).items():
+            self._classes[name] = dict(config)
+            self._classes[name].setdefault('priority', 0)
+            for ip in config.get('ips', ()):
+                self._class_of[ip] = name
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._connections = {}
+        self._stats = {}
+
+    def class_of(self, ip):
+        return self._class_of.get(ip, self.DEFAULT_CLASS)
+
+    def priority(self, ip):
+        return self._classes[self.class_of(ip)]['priority']
+
+    def _count(self, ip, counter):
+        stats = self._stats.get(ip)
+        if stats is None:
+            stats = self._stats[ip] = {'served': 0, 'deferred': 0, 'dropped': 0,
+                                       'connections': 0, 'rejected_connections': 0}
+        stats[counter] += 1
+
+    def connect(self, ip):
+        """Register a new connection of ip; False when it exceeds the connection cap."""
+        limit = self._classes[self.class_of(ip)].get('max_connections')
+        with self._lock:
+            if limit is not None and self._connections.get(ip, 0) >= limit:
+                self._count(ip, 'rejected_connections')
+                return False
+            self._connections[ip] = self._connections.get(ip, 0) + 1
+            self._count(ip, 'connections')
+            return True
+
+    def disconnect(self, ip):
+        with self._lock:
+            self._connections[ip] -= 1
+
+    def admit(self, ip):
+        """Seconds to defer a request of ip before serving it, None to drop it."""
+        config = self._classes[self.class_of(ip)]
+        if config.get('rate') is None:
+            with self._lock:
+                self._count(ip, 'served')
+            return 0.0
+
+        with self._lock:
+            bucket = self._buckets.get(ip)
+            if bucket is None:
+                bucket = self._buckets[ip] = TokenBucket(config['rate'], config.get('burst', config['rate']))
+            delay = bucket.reserve(self.max_delay)
+            if delay is None:
+                self._count(ip, 'dropped')
+            else:
+                self._count(ip, 'deferred' if delay else 'served')
+        return delay
+
+    def get_stats(self):
+        with self._lock:
+            clients = {ip: dict(stats, active_connections=self._connections.get(ip, 0))
+                       for ip, stats in self._stats.items()}
+        classes = {}
+        for ip, stats in clients.items():
+            totals = classes.setdefault(self.class_of(ip), {})
+            for counter, value in stats.items():
+                totals[counter] = totals.get(counter, 0) + value
+        return {'classes': classes, 'clients': clients}
+
+
+class ModbusUnit(RegisterServer):
+    """A Modbus device answering request PDUs from its own RegisterBank.
+
+    AsyncServerModbus serves one unit on its port, a ModbusFarmServer routes
+    the requests of many units (told apart by port and unit id) through one
+    event loop. A unit of a farm starts and stops the farm with it: the farm
+    runs while at least one of its units is started.
+    """
+
+    MAX_READ_REGISTERS = 125
+    MAX_WRITE_REGISTERS = 123
+
+    def __init__(self, ip, port, unit_id=1, size=0x10000, farm=None):
+        RegisterServer.__init__(self, ip, port, size)
+        self.unit_id = unit_id
+        self.farm = farm
+        self.stats = {'requests': 0, 'exceptions': 0}
+
+    def start(self):
+        if self.farm is not None:
+            self.farm.acquire()
+
+    def stop(self):
+        if self.farm is not None:
+            self.farm.release()
+
+    def handle_request(self, pdu):
+        """Answer one request PDU from the register bank; returns the response PDU."""
+        self.stats['requests'] += 1
+        function = pdu[0]
+        try:
+            if function == READ_HOLDING_REGISTERS:
+                address, count = struct.unpack_from('>HH', pdu, 1)
+                if not 1 <= count <= self.MAX_READ_REGISTERS:
+                    return self._exception(function, ILLEGAL_DATA_VALUE)
+                if address + count > self.bank.size:
+                    return self._exception(function, ILLEGAL_DATA_ADDRESS)
+                return struct.pack('>BB', function, 2 * count) + self.bank.read_bytes(address, count)
+
+            if function == WRITE_SINGLE_REGISTER:
+                if len(pdu) != 5:
+                    return self._exception(function, ILLEGAL_DATA_VALUE)
+                address = struct.unpack_from('>H', pdu, 1)[0]
+                if address >= self.bank.size:
+                    return self._exception(function, ILLEGAL_DATA_ADDRESS)
+                self.bank.write_bytes(address, pdu[3:5])
+                return pdu[:5]
+
+            if function == WRITE_MULTIPLE_REGISTERS:
+                address, count, size = struct.unpack_from('>HHB', pdu, 1)
+                if not 1 <= count <= self.MAX_WRITE_REGISTERS or size != 2 * count or len(pdu) != 6 + size:
+                    return self._exception(function, ILLEGAL_DATA_VALUE)
+                if address + count > self.bank.size:
+                    return self._exception(function, ILLEGAL_DATA_ADDRESS)
+                self.bank.write_bytes(address, pdu[6:])
+                return pdu[:5]
+
+        except struct.error:
+            return self._exception(function, ILLEGAL_DATA_VALUE)
+        return self._exception(function, ILLEGAL_FUNCTION)
 
+    def _exception(self, function, code):
+        self.stats['exceptions'] += 1
+        return bytes((function | 0x80, code))
+
+
+class AsyncServerModbus(ModbusUnit):
+    """Modbus/TCP server running every connection on one asyncio event loop.
+
+    Unlike pyModbusTCP's ModbusServer, which starts a thread per client,
+    the loop runs in a single background thread whatever the number of
+    clients, so a flood of connections cannot starve the PLC scan thread.
+    At most max_connections clients are served at once, further connections
+    are closed right away. Requests of a connection are answered in order,
+    pipelined requests are read without waiting for the previous response.
+
+    Requests are answered straight from the RegisterBank bank, a read is one
+    slice copy of the buffer. Supported functions are read holding registers,
+    write single register and write multiple registers. A unit whose answer
+    is not ready yet (e.g. a gateway forwarding a write) returns an awaitable
+    from handle_request; the loop keeps serving the other connections and the
+    connection gets the response once it completes.
+
+    With a ClientPolicy, connections are also capped per client IP, requests
+    are deferred or dropped by the client's token bucket and admitted
+    requests wait in one queue which serves the higher priority classes
+    first, so flood traffic cannot delay HMI and PLC requests behind it.
+    """
+
+    MAX_QUEUED_REQUESTS = 1024
+
+    def __init__(self, ip, port, max_connections=64, policy=None):
+        ModbusUnit.__init__(self, ip, port)
+        self.max_connections = max_connections
+        self.policy = policy
+        self.stats.update({'connections': 0, 'rejected_connections': 0, 'queue_full': 0})
+        self._queue = None
+        self._sequence = itertools.count()
+        self._loop = None
+        self._thread = None
+        self._servers = {}
+        self._writers = set()
+        self._started = threading.Event()
+        self._start_error = None
+
+    def start(self):
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+
+    def stop(self):
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def _ports(self):
+        return [self.port]
+
+    async def _listen(self, port):
+        if port not in self._servers:
+            self._servers[port] = await asyncio.start_server(self._serve, self.ip, port)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            for port in self._ports():
+                self._loop.run_until_complete(self._listen(port))
+        except OSError as e:
+            for server in self._servers.values():
+                server.close()
+            self._servers = {}
+            self._start_error = e
+            self._started.set()
+            self._loop.close()
+            return
+
+        if self.policy is not None:
+            self._queue = asyncio.PriorityQueue(self.MAX_QUEUED_REQUESTS)
+            self._loop.create_task(self._dispatch())
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            for server in self._servers.values():
+                server.close()
+            for writer in list(self._writers):
+                writer.close()
+            for server in self._servers.values():
+                self._loop.run_until_complete(server.wait_closed())
+            self._servers = {}
+            for task in asyncio.all_tasks(self._loop):
+                task.cancel()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+    async def _serve(self, reader, writer):
+        ip = writer.get_extra_info('peername')[0]
+        if len(self._writers) >= self.max_connections or (self.policy is not None and not self.policy.connect(ip)):
+            self.stats['rejected_connections'] += 1
+            writer.close()
+            return
+
+        self.stats['connections'] += 1
+        self._writers.add(writer)
+        writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        port = writer.get_extra_info('sockname')[1]
+        try:
+            while True:
+                header = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+                if header[1] != 0 or not 2 <= header[2] <= 256:
+                    break
+                request = await reader.readexactly(header[2] - 1)
+                if self.policy is None:
+                    response = self._handle(port, header[3], request)
+                    if inspect.isawaitable(response):
+                        # later requests of this connection wait, to be answered in order
+                        response = await response
+                    self._respond(writer, header, response)
+                else:
+                    await self._admit(ip, port, writer, header, request)
+                if writer.transport.get_write_buffer_size() > 65536:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            if self.policy is not None:
+                self.policy.disconnect(ip)
+            writer.close()
+
+    @staticmethod
+    def _respond(writer, header, pdu):
+        if not writer.is_closing():
+            writer.write(MBAP_HEADER.pack(header[0], 0, len(pdu) + 1, header[3]) + pdu)
+
+    def _handle(self, port, unit_id, request):
+        return self.handle_request(request)
+
+    async def _admit(self, ip, port, writer, header, request):
+        delay = self.policy.admit(ip)
+        if delay is None:
+            self._respond(writer, header, self._exception(request[0], SERVER_DEVICE_BUSY))
+            return
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            self._queue.put_nowait((self.policy.priority(ip), next(self._sequence), port, writer, header, request))
+        except asyncio.QueueFull:
+            self.stats['queue_full'] += 1
+            self._respond(writer, header, self._exception(request[0], SERVER_DEVICE_BUSY))
+
+    async def _dispatch(self):
+        while True:
+            _, _, port, writer, header, request = await self._queue.get()
+            response = self._handle(port, header[3], request)
+            if inspect.isawaitable(response):
+                # the queue keeps going, the client matches the late response by transaction id
+                self._loop.create_task(self._respond_later(writer, header, response))
+            else:
+                self._respond(writer, header, response)
+
+    async def _respond_later(self, writer, header, response):
+        self._respond(writer, header, await response)
+
+
+class ModbusFarmServer(AsyncServerModbus):
+    """One event loop serving many virtual Modbus devices.
+
+    add_unit() creates a ModbusUnit with its own, small register bank; the
+    units are told apart by port and unit id, so hundreds of PLCs can share
+    one process and one thread (a port carries up to 247 unit ids). The farm
+    listens on every port its units use, requests for a unit it does not
+    host are answered with a "gateway path unavailable" exception. Farms
+    returned by shared() are started and stopped by their units, see
+    ModbusUnit.
+    """
+
+    MAX_UNIT_ID = 247
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, ip, port, max_connections=1024, policy=None):
+        AsyncServerModbus.__init__(self, ip, port, max_connections, policy)
+        self.units = {}
+        self._users = 0
+        self._users_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, ip, port, policy=None):
+        """The farm of this process listening on ip (port is its default port); policy applies on creation."""
+        with cls._shared_lock:
+            farm = cls._shared.get(ip)
+            if farm is None:
+                farm = cls._shared[ip] = cls(ip, port, policy=policy)
+            return farm
+
+    def add_unit(self, unit_id=1, port=None, size=0x10000):
+        port = self.port if port is None else port
+        if not 0 <= unit_id <= self.MAX_UNIT_ID:
+            raise ValueError('unit id {} is out of range'.format(unit_id))
+        if (port, unit_id) in self.units:
+            raise ValueError('unit {} on port {} already exists'.format(unit_id, port))
+
+        return self.attach_unit(ModbusUnit(self.ip, port, unit_id, size, self))
+
+    def attach_unit(self, unit):
+        """Serve a unit built by the caller, e.g. of a ModbusUnit subclass, on its port and unit id."""
+        self.units[(unit.port, unit.unit_id)] = unit
+        if self._loop is not None and self._thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._listen(unit.port), self._loop).result()
+        return unit
+
+    def remove_unit(self, unit):
+        self.units.pop((unit.port, unit.unit_id), None)
+
+    def acquire(self):
+        with self._users_lock:
+            self._users += 1
+            if self._users == 1:
+                self.start()
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            if self._users == 0:
+                self.stop()
+
+    def _ports(self):
+        return sorted({self.port} | {port for port, _ in self.units})
+
+    def _handle(self, port, unit_id, request):
+        unit = self.units.get((port, unit_id))
+        if unit is None:
+            return self._exception(request[0], GATEWAY_PATH_UNAVAILABLE)
+        self.stats['requests'] += 1
+        return unit.handle_request(request)
+
+    def get_stats(self):
+        """Server counters plus the request counters of every unit, keyed 'port/unit_id'."""
+        stats = dict(self.stats)
+        stats['units'] = {'{}/{}'.format(port, unit_id): dict(unit.stats)
+                          for (port, unit_id), unit in list(self.units.items())}
+        return stats
 
 
 class ProtocolFactory:
+    SERVER_THREADED = 'threaded'
+    SERVER_ASYNCIO = 'asyncio'
+    SERVER_FARM = 'farm'
+
     @staticmethod
-    def create_client(protocol, ip, port):
+    def create_client(protocol, ip, port, unit_id=1):
         if protocol == 'ModbusWriteRequest-TCP':
-            return ClientModbus(ip, port)
+            return ClientModbus(ip, port, unit_id)
         else:
             raise TypeError()
 
     @staticmethod
-    def create_server(protocol, ip, port):
+    def create_async_client(protocol, ip, port, unit_id=1):
         if protocol == 'ModbusWriteRequest-TCP':
-            return ServerModbus(ip, port)
+            return AsyncClientModbus(ip, port, unit_id)
         else:
             raise TypeError()
+
+    @staticmethod
+    def create_server(protocol, ip, port, backend=SERVER_THREADED, policy=None, unit_id=1):
+        """Server of one PLC; with SERVER_FARM it is unit_id of the process' ModbusFarmServer on ip."""
+        if protocol != 'ModbusWriteRequest-TCP':
+            raise TypeError()
+
+        if backend == ProtocolFactory.SERVER_THREADED:
+            return ServerModbus(ip, port, policy=policy)
+        elif backend == ProtocolFactory.SERVER_ASYNCIO:
+            return AsyncServerModbus(ip, port, policy=policy)
+        elif backend == ProtocolFactory.SERVER_FARM:
+            return ModbusFarmServer.shared(ip, port, policy).add_unit(unit_id, port)
+        else:
+            raise TypeError('unknown server backend {}'.format(backend))
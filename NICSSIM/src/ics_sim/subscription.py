@@ -0,0 +1,351 @@
+"""Report-by-exception subscriptions to the registers of a Modbus server.
+
+Instead of polling every tag each cycle, a client subscribes to a set of
+tag ids with a deadband per tag and is sent the initial image followed by
+only the values which moved by more than their deadband since they were
+last sent. The SubscriptionServer runs next to a PLC's Modbus server and
+checks its RegisterBank every interval through one RegisterView per
+client; messages are newline delimited JSON over TCP:
+
+    -> {"op": "subscribe", "tags": {"<tag id>": <deadband>, ...}}
+    <- {"seq": 0, "values": {"<tag id>": <value>, ...}}      initial image
+    <- {"seq": 1, "values": {"<tag id>": <value>}}           changes
+    <- {"seq": 2, "values": {}}                              heartbeat
+
+The server never blocks on a subscriber: messages are queued per socket
+and written as the socket accepts them, a subscriber falling more than
+MAX_PENDING bytes behind is dropped (it resubscribes to a fresh image).
+
+Plain Modbus servers get the same interface from PollingSubscription, see
+create_subscription().
+"""
+import json
+import selectors
+import socket
+import threading
+import time
+
+from ics_sim.helper import error
+from ics_sim.protocol import ProtocolFactory
+
+
+class SubscriptionServer:
+    INTERVAL = 0.1
+    HEARTBEAT = 2.0
+    MAX_PENDING = 1 << 20
+
+    def __init__(self, server, ip, port, interval=INTERVAL):
+        self.server = server
+        self.ip = ip
+        self.port = port
+        self.interval = interval
+        self.stats = {'subscribers': 0, 'messages': 0, 'values': 0, 'bytes': 0, 'slow_drops': 0}
+        self._subscribers = {}
+        self._buffers = {}
+        self._pending = {}
+        self._selector = None
+        self._listener = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.ip, self.port))
+        self._listener.listen()
+        self._listener.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        for sock in list(self._buffers):
+            self._drop(sock)
+        self._selector.close()
+        self._listener.close()
+
+    def _run(self):
+        next_check = time.monotonic()
+        while not self._stop_event.is_set():
+            for key, events in self._selector.select(timeout=max(0.0, next_check - time.monotonic())):
+                if key.fileobj is self._listener:
+                    self._accept()
+                    continue
+                if events & selectors.EVENT_READ:
+                    self._receive(key.fileobj)
+                if events & selectors.EVENT_WRITE and key.fileobj in self._pending:
+                    self._flush(key.fileobj)
+            if time.monotonic() >= next_check:
+                next_check += self.interval
+                self._publish_changes()
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._buffers[sock] = b''
+        self._pending[sock] = bytearray()
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _drop(self, sock):
+        self._selector.unregister(sock)
+        self._buffers.pop(sock, None)
+        self._pending.pop(sock, None)
+        if self._subscribers.pop(sock, None) is not None:
+            self.stats['subscribers'] -= 1
+        sock.close()
+
+    def _receive(self, sock):
+        try:
+            data = sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(sock)
+            return
+
+        lines = (self._buffers[sock] + data).split(b'\n')
+        self._buffers[sock] = lines.pop()
+        for line in lines:
+            try:
+                message = json.loads(line)
+                if message['op'] == 'subscribe':
+                    self._subscribe(sock, {int(tag_id): deadband for tag_id, deadband in message['tags'].items()})
+            except (ValueError, KeyError, TypeError) as e:
+                error(f'subscription server dropped invalid message {line!r}: {e}')
+
+    def _subscribe(self, sock, deadbands):
+        tag_ids = sorted(deadbands)
+        view = self.server.view(tag_ids)
+        values = view.read()
+        if sock not in self._subscribers:
+            self.stats['subscribers'] += 1
+        self._subscribers[sock] = {'view': view, 'deadbands': [deadbands[tag_id] for tag_id in tag_ids],
+                                   'sent': values, 'seq': 0, 'last_send': time.monotonic()}
+        self._send(sock, self._subscribers[sock], dict(zip(tag_ids, values)))
+
+    def _publish_changes(self):
+        now = time.monotonic()
+        for sock, subscriber in list(self._subscribers.items()):
+            tag_ids = subscriber['view'].tag_ids
+            sent = subscriber['sent']
+            changes = {}
+            for index, (value, deadband) in enumerate(zip(subscriber['view'].read(), subscriber['deadbands'])):
+                if abs(value - sent[index]) > deadband or (not deadband and value != sent[index]):
+                    sent[index] = value
+                    changes[tag_ids[index]] = value
+            if changes or now - subscriber['last_send'] >= self.HEARTBEAT:
+                subscriber['seq'] += 1
+                self._send(sock, subscriber, changes)
+
+    def _send(self, sock, subscriber, values):
+        data = json.dumps({'seq': subscriber['seq'], 'values': values}).encode() + b'\n'
+        pending = self._pending[sock]
+        if len(pending) + len(data) > self.MAX_PENDING:
+            # the subscriber stopped reading; it gets a fresh image when it subscribes again
+            self.stats['slow_drops'] += 1
+            self._drop(sock)
+            return
+        was_empty = not pending
+        pending += data
+        subscriber['last_send'] = time.monotonic()
+        self.stats['messages'] += 1
+        self.stats['values'] += len(values)
+        self.stats['bytes'] += len(data)
+        if was_empty:
+            self._flush(sock)
+
+    def _flush(self, sock):
+        """Write what sock accepts without blocking, waiting for EVENT_WRITE while data is left."""
+        pending = self._pending[sock]
+        try:
+            sent = sock.send(pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(sock)
+            return
+        del pending[:sent]
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if pending else selectors.EVENT_READ
+        if self._selector.get_key(sock).events != events:
+            self._selector.modify(sock, events)
+
+
+class SubscriptionClient:
+    """Client of a SubscriptionServer; update() applies the pushed changes to values.
+
+    When the connection drops, update() reconnects and resubscribes, which
+    sends a fresh image; IOError is raised if the server cannot be reached.
+    """
+
+    def __init__(self, ip, port, deadbands, timeout=1.0):
+        self.ip = ip
+        self.port = port
+        self.deadbands = dict(deadbands)
+        self.timeout = timeout
+        self.values = {}
+        self.timestamp = None
+        self._sock = None
+        self._buffer = b''
+        self._subscribe()
+
+    def _subscribe(self):
+        self.close()
+        try:
+            self._sock = socket.create_connection((self.ip, self.port), self.timeout)
+            self._sock.sendall(json.dumps({'op': 'subscribe', 'tags': self.deadbands}).encode() + b'\n')
+            deadline = time.monotonic() + self.timeout
+            while b'\n' not in self._buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout('no initial image')
+                self._read(remaining)
+        except OSError as e:
+            self.close()
+            raise IOError('cannot subscribe to {}:{} ({})'.format(self.ip, self.port, e))
+        self._apply()
+
+    def _read(self, timeout):
+        self._sock.settimeout(timeout)
+        try:
+            data = self._sock.recv(65536)
+        except (socket.timeout, BlockingIOError):
+            return False
+        if not data:
+            raise ConnectionResetError('subscription server closed the connection')
+        self._buffer += data
+        return True
+
+    def _apply(self):
+        changes = {}
+        lines = self._buffer.split(b'\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            message = json.loads(line)
+            changes.update({int(tag_id): value for tag_id, value in message['values'].items()})
+            self.timestamp = time.time()
+        self.values.update(changes)
+        return changes
+
+    def update(self, timeout=0.0):
+        """Apply the changes received so far (waiting up to timeout for one); returns {tag_id: value} changed."""
+        try:
+            if self._sock is None:
+                self._subscribe()
+                return dict(self.values)
+            while self._read(timeout):
+                timeout = 0.0
+            return self._apply()
+        except OSError:
+            self._subscribe()
+            return dict(self.values)
+
+    def receive_many(self, tag_ids):
+        self.update()
+        return {tag_id: self.values[tag_id] for tag_id in tag_ids}
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        self._buffer = b''
+
+
+class PollingSubscription:
+    """The SubscriptionClient interface over plain Modbus: update() polls and reports the changes beyond deadbands.
+
+    Given the address of a SubscriptionServer which did not answer (e.g. the
+    PLC was not up yet), it tries to subscribe again every RETRY_INTERVAL
+    seconds and, once it can, takes the updates from the subscription; it
+    goes back to polling if the subscription is lost again.
+    """
+
+    RETRY_INTERVAL = 10.0
+
+    def __init__(self, client, deadbands, subscription_address=None):
+        self.client = client
+        self.deadbands = dict(deadbands)
+        self.values = {}
+        self.timestamp = None
+        self.subscription_address = subscription_address
+        self._subscription = None
+        self._next_retry = time.monotonic() + self.RETRY_INTERVAL
+
+    def _retry_subscription(self):
+        self._next_retry = time.monotonic() + self.RETRY_INTERVAL
+        try:
+            self._subscription = SubscriptionClient(*self.subscription_address, self.deadbands)
+        except IOError:
+            return
+
+    def _update_from_subscription(self, timeout):
+        try:
+            self._subscription.update(timeout)
+        except IOError as e:
+            error('{}, polling instead'.format(e))
+            self._subscription.close()
+            self._subscription = None
+            return None
+        changes = {tag_id: value for tag_id, value in self._subscription.values.items()
+                   if self.values.get(tag_id) != value}
+        self.values.update(changes)
+        self.timestamp = self._subscription.timestamp
+        return changes
+
+    def update(self, timeout=0.0):
+        if self.subscription_address is not None:
+            if self._subscription is None and time.monotonic() >= self._next_retry:
+                self._retry_subscription()
+            if self._subscription is not None:
+                changes = self._update_from_subscription(timeout)
+                if changes is not None:
+                    return changes
+
+        changes = {}
+        for tag_id, value in self.client.receive_many(list(self.deadbands)).items():
+            last = self.values.get(tag_id)
+            if last is None or abs(value - last) > self.deadbands[tag_id] or (not self.deadbands[tag_id] and value != last):
+                changes[tag_id] = value
+        self.values.update(changes)
+        self.timestamp = time.time()
+        return changes
+
+    def receive_many(self, tag_ids):
+        self.update()
+        return {tag_id: self.values[tag_id] for tag_id in tag_ids}
+
+    def close(self):
+        if self._subscription is not None:
+            self._subscription.close()
+        self.client.close()
+
+
+def create_subscription(plc, deadbands, layouts=None):
+    """Subscribe to {tag_id: deadband} of the PLC config plc.
+
+    Uses the PLC's SubscriptionServer when its config has a
+    'subscription_port' which answers, PollingSubscription otherwise, which
+    keeps trying the subscription port if there is one.
+    """
+    subscription_address = None
+    if plc.get('subscription_port') is not None:
+        subscription_address = (plc['ip'], plc['subscription_port'])
+        try:
+            return SubscriptionClient(*subscription_address, deadbands)
+        except IOError as e:
+            error('{}, polling until it answers'.format(e))
+
+    client = ProtocolFactory.create_client(plc['protocol'], plc['ip'], plc['port'], plc.get('unit_id', 1))
+    if layouts:
+        client.set_layouts(layouts)
+    return PollingSubscription(client, deadbands, subscription_address)
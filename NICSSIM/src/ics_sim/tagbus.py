@@ -0,0 +1,334 @@
+"""Change notification bus for the tag store.
+
+Writers publish the names of the tags they changed, components block in
+wait_for_change() until one of the tags they care about changes instead of
+polling the store on a fixed period. The bus is a small hub thread serving a
+local Unix domain socket: it numbers every published change, keeps the last
+changes in a bounded log and pushes them to the subscribers whose tag filter
+matches. Messages are newline delimited JSON. The hub never blocks on a
+subscriber: messages are queued per socket and written as the socket
+accepts them; a subscriber falling more than MAX_PENDING bytes behind is
+dropped, it catches up from the log when it subscribes again.
+
+The first component which finds no hub listening on the socket starts one in
+its own process (guarded by a lock file); when that process goes away the
+next client to reconnect takes over.
+"""
+import fcntl
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from ics_sim.helper import error
+
+
+class TagBusServer:
+    LOG_SIZE = 4096
+    MAX_PENDING = 1 << 20
+
+    def __init__(self, path):
+        self.path = path
+        self._epoch = '{}-{}'.format(os.getpid(), time.time_ns())
+        self._sequence = 0
+        self._log = deque(maxlen=self.LOG_SIZE)
+        self._subscribers = {}
+        self._buffers = {}
+        self._pending = {}
+        self.stats = {'slow_drops': 0}
+        self._selector = selectors.DefaultSelector()
+        self._listener = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        self._listener.listen()
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        for sock in list(self._buffers):
+            self._drop(sock)
+        self._selector.close()
+        self._listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            for key, events in self._selector.select(timeout=0.2):
+                if key.fileobj is self._listener:
+                    self._accept()
+                    continue
+                # a publish handled earlier in this round may have dropped the socket
+                if events & selectors.EVENT_READ and key.fileobj in self._pending:
+                    self._receive(key.fileobj)
+                if events & selectors.EVENT_WRITE and key.fileobj in self._pending:
+                    self._flush(key.fileobj)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        self._buffers[sock] = b''
+        self._pending[sock] = bytearray()
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _drop(self, sock):
+        self._selector.unregister(sock)
+        self._buffers.pop(sock, None)
+        self._pending.pop(sock, None)
+        self._subscribers.pop(sock, None)
+        sock.close()
+
+    def _receive(self, sock):
+        try:
+            data = sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(sock)
+            return
+
+        lines = (self._buffers[sock] + data).split(b'\n')
+        self._buffers[sock] = lines.pop()
+        for line in lines:
+            if sock not in self._pending:
+                # dropped while handling an earlier message
+                return
+            try:
+                self._handle(sock, json.loads(line))
+            except (ValueError, KeyError) as e:
+                error(f'tag bus dropped invalid message {line!r}: {e}')
+
+    def _handle(self, sock, message):
+        op = message['op']
+        if op == 'publish':
+            self._sequence += 1
+            change = {'seq': self._sequence, 'tags': message['tags']}
+            self._log.append(change)
+            changed = set(change['tags'])
+            for subscriber, tags in list(self._subscribers.items()):
+                if tags is None or not tags.isdisjoint(changed):
+                    self._send(subscriber, change)
+
+        elif op == 'subscribe':
+            tags = None if message['tags'] is None else set(message['tags'])
+            self._subscribers[sock] = tags
+            self._send(sock, {'epoch': self._epoch, 'seq': self._sequence})
+            if message.get('epoch') == self._epoch:
+                for change in self._changes_since(message['since']):
+                    if tags is None or not tags.isdisjoint(change['tags']):
+                        self._send(sock, change)
+
+        elif op == 'since':
+            self._send(sock, {'epoch': self._epoch, 'seq': self._sequence,
+                              'changes': self._changes_since(message['since'])})
+
+    def _changes_since(self, sequence):
+        return [change for change in self._log if change['seq'] > sequence]
+
+    def _send(self, sock, message):
+        pending = self._pending.get(sock)
+        if pending is None:
+            return
+        data = json.dumps(message).encode() + b'\n'
+        if len(pending) + len(data) > self.MAX_PENDING:
+            # the subscriber stopped reading; it catches up from the log when it subscribes again
+            self.stats['slow_drops'] += 1
+            self._drop(sock)
+            return
+        was_empty = not pending
+        pending += data
+        if was_empty:
+            self._flush(sock)
+
+    def _flush(self, sock):
+        """Write what sock accepts without blocking, waiting for EVENT_WRITE while data is left."""
+        pending = self._pending[sock]
+        try:
+            sent = sock.send(pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(sock)
+            return
+        del pending[:sent]
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if pending else selectors.EVENT_READ
+        if self._selector.get_key(sock).events != events:
+            self._selector.modify(sock, events)
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def ensure_tag_bus(path):
+    """Start a hub for path in this process unless one is already listening."""
+    with _servers_lock, open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            return
+        except (FileNotFoundError, ConnectionRefusedError):
+            if os.path.exists(path):
+                # socket file left behind by a hub which is gone
+                os.unlink(path)
+        finally:
+            probe.close()
+
+        server = TagBusServer(path)
+        server.start()
+        _servers[path] = server
+
+
+class TagBusClient:
+    def __init__(self, path):
+        self.path = path
+        self._epoch = None
+        self._sequence = 0
+        self._publisher = None
+        self._publisher_lock = threading.Lock()
+        self._subscriber = None
+        self._subscriber_lock = threading.Lock()
+        self._subscription = None
+        self._buffer = b''
+
+    def sequence(self):
+        """Sequence number of the last change seen by wait_for_change()."""
+        return self._sequence
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            ensure_tag_bus(self.path)
+            sock.connect(self.path)
+        return sock
+
+    def publish(self, tags):
+        message = json.dumps({'op': 'publish', 'tags': list(tags)}).encode() + b'\n'
+        with self._publisher_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    self._publisher.sendall(message)
+                    return
+                except OSError as e:
+                    self._close_publisher()
+                    if attempt:
+                        error(f'cannot publish tag changes on {self.path}: {e}')
+
+    def changes_since(self, sequence):
+        """Return (current sequence, changes after sequence) from the hub's change log."""
+        with self._publisher_lock:
+            if self._publisher is None:
+                self._publisher = self._connect()
+            self._publisher.sendall(json.dumps({'op': 'since', 'since': sequence}).encode() + b'\n')
+            reader = self._publisher.makefile('rb')
+            reply = json.loads(reader.readline())
+            reader.close()
+        return reply['seq'], reply['changes']
+
+    def wait_for_change(self, tags=None, timeout=None):
+        """Block until one of tags (any tag if None) changes or timeout seconds pass.
+
+        Returns the list of changed tags, empty on timeout. Changes published
+        while the caller was busy are returned immediately on the next call.
+        """
+        subscription = None if tags is None else frozenset(tags)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._subscriber_lock:
+            if self._subscriber is None or subscription != self._subscription:
+                self._subscribe(subscription)
+
+            changed = self._read_changes(subscription)
+            while not changed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                if not self._receive(remaining):
+                    continue
+                changed = self._read_changes(subscription)
+
+            # fold in whatever else already arrived
+            self._receive(0)
+            changed.update(self._read_changes(subscription))
+            return list(changed)
+
+    def _subscribe(self, subscription):
+        self._close_subscriber()
+        self._subscription = subscription
+        self._subscriber = self._connect()
+        self._subscriber.sendall(json.dumps({
+            'op': 'subscribe',
+            'tags': None if subscription is None else list(subscription),
+            'epoch': self._epoch,
+            'since': self._sequence}).encode() + b'\n')
+
+    def _receive(self, timeout):
+        """Read from the subscription socket; False when it had to be reopened."""
+        try:
+            self._subscriber.settimeout(timeout)
+            data = self._subscriber.recv(65536)
+        except (socket.timeout, BlockingIOError):
+            return True
+        except OSError:
+            data = b''
+
+        if not data:
+            # the hub went away; resubscribe (possibly to a new hub) and catch up
+            self._subscribe(self._subscription)
+            return False
+
+        self._buffer += data
+        return True
+
+    def _read_changes(self, subscription):
+        changed = set()
+        lines = self._buffer.split(b'\n')
+        self._buffer = lines.pop()
+        for line in lines:
+            message = json.loads(line)
+            if 'epoch' in message:
+                if message['epoch'] != self._epoch:
+                    self._epoch = message['epoch']
+                    self._sequence = message['seq']
+            elif message['seq'] > self._sequence:
+                self._sequence = message['seq']
+                changed.update(message['tags'] if subscription is None else subscription.intersection(message['tags']))
+        return changed
+
+    def _close_publisher(self):
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+
+    def _close_subscriber(self):
+        if self._subscriber is not None:
+            self._subscriber.close()
+            self._subscriber = None
+        self._buffer = b''
+
+    def close(self):
+        with self._publisher_lock:
+            self._close_publisher()
+        with self._subscriber_lock:
+            self._close_subscriber()
@@ -1,42 +1,54 @@
-import random
-
-from pyModbusTCP.server import ModbusServer
-
-from Configs import TAG
-from HMI1 import HMI1
-from FactorySimulation import FactorySimulation
-from PLC1 import PLC1
-from PLC2 import PLC2
-
-import memcache
-from Configs import Connection, TAG
-
-from ics_sim.protocol import ProtocolFactory
-from ics_sim.connectors import FileConnector, ConnectorFactory
-
-factory = FactorySimulation()
-factory.start()
-
-
-plc1 = PLC1()
-# plc1.set_record_variables(True)
-plc1.start()
-
-
-plc2 = PLC2()
-# plc2.set_record_variables(True)
-plc2.start()
-
-hmi1 = HMI1()
-hmi1.start()
-
-"""
-
-connector = ConnectorFactory.build(Connection.File_CONNECTION)
-"""
-
-
-
-
-
-
+import argparse
+import os
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Start the simulation: the physical process, the PLCs and the HMI')
+    parser.add_argument('--mode', default='local', choices=['local', 'docker', 'gns3'],
+                        help='execution mode, local uses localhost ports')
+    parser.add_argument('--threads', action='store_true',
+                        help='run all the components on one scheduler thread of this process')
+    parser.add_argument('--no-pin', action='store_true', help='do not pin the component processes to CPU cores')
+    parser.add_argument('--no-restart', action='store_true', help='do not restart components which crash or hang')
+    return parser.parse_args()
+
+
+def start_threads():
+    from HMI1 import HMI1
+    from FactorySimulation import FactorySimulation
+    from PLC1 import PLC1
+    from PLC2 import PLC2
+    from ics_sim.Device import RunnableRuntime
+
+    # all the components scan on one scheduler thread, ordered by deadline
+    runtime = RunnableRuntime()
+    runtime.add(FactorySimulation())
+    runtime.add(PLC1())
+    # plc1.set_record_variables(True)
+    runtime.add(PLC2())
+    runtime.add(HMI1())
+    runtime.start()
+    runtime.wait()
+
+
+def start_processes(pin, restart):
+    from Configs import Launch
+    from ics_sim.launcher import Launcher
+
+    components = Launch.COMPONENTS
+    if not pin:
+        components = [dict(component, cpus=None) for component in components]
+    launcher = Launcher(components, restart=restart)
+    launcher.start()
+    launcher.wait()
+
+
+if __name__ == '__main__':
+    args = get_args()
+    # before Configs is imported, here and in the component processes
+    os.environ['ICS_SIM_EXECUTION_MODE'] = args.mode
+
+    if args.threads:
+        start_threads()
+    else:
+        start_processes(not args.no_pin, not args.no_restart)
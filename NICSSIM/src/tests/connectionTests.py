@@ -1,8 +1,28 @@
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
 import unittest
 from Configs import Connection
+from benchmarks.memcached_standin import MemcachedStandin
 
 
-from ics_sim.connectors import SQLiteConnector, MemcacheConnector, ConnectorFactory
+from ics_sim.connectors import SQLiteConnector, MemcacheConnector, ConnectorFactory, PersistentSQLiteConnector, \
+    SnapshotConnector, WriteCoalescingConnector, NotifyingConnector, HistoryConnector
+from ics_sim.protocol import ServerModbus
+from ics_sim.tagbus import TagBusClient, TagBusServer
+
+
+SHM_CONNECTION = {'type': 'shm', 'path': 'icssim_test_table', 'name': 'fp_table',
+                  'tags': {'value1': {'id': 0}, 'value2': {'id': 3}}}
+
+
+def write_shared_memory(key, value):
+    connector = ConnectorFactory.build(SHM_CONNECTION)
+    connector.set(key, value)
+    connector.close()
 
 
 class ConnectionTests(unittest.TestCase):
@@ -29,6 +49,278 @@ class ConnectionTests(unittest.TestCase):
         except Exception:
             self.fail("cannot init values in the connection!")
 
+    def test_persistent_sqlite_connection(self):
+        connection = ConnectorFactory.build(Connection.SQLITE_WAL_CONNECTION)
+        self.assertIsInstance(connection, PersistentSQLiteConnector)
+
+        connection.initialize([('value1', 1), ('value2', 2)])
+        self.assertEqual(connection.get('value1'), 1, 'get function in PersistentSQLiteConnector is not working correctly')
+
+        connection.set('value1', 10)
+        self.assertEqual(connection.get('value1'), 10, 'set function in PersistentSQLiteConnector is not working correctly')
+
+        other = SQLiteConnector(Connection.SQLITE_CONNECTION)
+        self.assertEqual(other.get('value1'), 10, 'PersistentSQLiteConnector does not commit its writes')
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(connection.get('value2')))
+        thread.start()
+        thread.join()
+        self.assertEqual(results, [2], 'PersistentSQLiteConnector is not usable from another thread')
+
+        # a restarted writer re-initializes the store under the open connections of the readers
+        initializer = ConnectorFactory.build(Connection.SQLITE_WAL_CONNECTION)
+        initializer.initialize([('value1', 7), ('value3', 3)])
+        initializer.set('value1', 42)
+        self.assertEqual(connection.get('value1'), 42, 'open connection does not see a re-initialized store')
+        self.assertEqual(connection.get_many(['value1', 'value2', 'value3']), {'value1': 42, 'value3': 3},
+                         'initialize does not clear the old tags')
+
+        initializer.close()
+        connection.close()
+
+    def test_batched_connection(self):
+        for connection in (Connection.SQLITE_CONNECTION, Connection.SQLITE_WAL_CONNECTION, Connection.File_CONNECTION):
+            connector = ConnectorFactory.build(connection)
+            connector.initialize([('value1', 1), ('value2', 2), ('value3', 3)])
+
+            self.assertEqual(connector.get_many(['value1', 'value3']), {'value1': 1, 'value3': 3},
+                             'get_many function in {} is not working correctly'.format(connection['type']))
+
+            connector.set_many({'value1': 10, 'value2': 20})
+            self.assertEqual(connector.get_many(['value1', 'value2', 'value3']), {'value1': 10, 'value2': 20, 'value3': 3},
+                             'set_many function in {} is not working correctly'.format(connection['type']))
+            self.assertEqual(connector.get('value2'), 20)
+
+    def test_shared_memory_connection(self):
+        connector = ConnectorFactory.build(SHM_CONNECTION)
+        connector.initialize([('value1', 1), ('value2', 2)])
+        try:
+            self.assertEqual(connector.get_many(['value1', 'value2']), {'value1': 1, 'value2': 2},
+                             'initialize function in SharedMemoryConnector is not working correctly')
+
+            process = multiprocessing.Process(target=write_shared_memory, args=('value2', 20.5))
+            process.start()
+            process.join()
+            self.assertEqual(connector.get('value2'), 20.5, 'SharedMemoryConnector is not shared between processes')
+
+            connector.set_many({'value1': 10, 'value2': 11})
+            self.assertEqual(connector.get_many(['value2', 'value1']), {'value1': 10, 'value2': 11},
+                             'set_many function in SharedMemoryConnector is not working correctly')
+
+            # a restarted initializer rewrites the block under the components attached to it
+            initializer = ConnectorFactory.build(SHM_CONNECTION)
+            initializer.initialize([('value1', 1), ('value2', 2)])
+            initializer.set('value1', 7)
+            self.assertEqual(connector.get('value1'), 7, 'SharedMemoryConnector readers miss a new initialize')
+            connector.set('value2', 8)
+            self.assertEqual(initializer.get_many(['value1', 'value2']), {'value1': 7, 'value2': 8})
+            initializer.close()
+        finally:
+            connector.close()
+            connector.unlink()
+
+    def test_mmap_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connection = dict(SHM_CONNECTION, type='mmap', path=os.path.join(directory, 'tags.bin'))
+            connector = ConnectorFactory.build(connection)
+            connector.initialize([('value1', 1), ('value2', 2)])
+            connector.set('value1', 10)
+
+            attached = ConnectorFactory.build(connection)
+            self.assertEqual(attached.get('value1'), 10)
+            connector.initialize([('value1', 1), ('value2', 2)])
+            connector.set('value1', 7)
+            self.assertEqual(attached.get('value1'), 7, 'MmapConnector readers miss a new initialize')
+            attached.close()
+            connector.set('value1', 10)
+            connector.close()
+
+            reader = ConnectorFactory.build(connection)
+            self.assertEqual(reader.get_many(['value1', 'value2']), {'value1': 10, 'value2': 2},
+                             'MmapConnector does not persist its values')
+            reader.close()
+
+            mismatched = ConnectorFactory.build(dict(connection, tags={'value1': {'id': 1}, 'value2': {'id': 3}}))
+            with self.assertRaises(ValueError):
+                mismatched.get('value1')
+
+    def test_pipelined_memcache_connection(self):
+        standin = MemcachedStandin(('127.0.0.1', 0)).start()
+        connection = {'type': 'memcache-pipelined', 'path': '{}:{}'.format(*standin.server_address), 'name': 'fp_table'}
+        try:
+            connector = ConnectorFactory.build(connection)
+            connector.initialize([('value1', 1), ('value2', 2.5)], clear_old=True)
+            self.assertEqual(connector.get_many(['value1', 'value2']), {'value1': 1, 'value2': 2.5},
+                             'get_many function in PipelinedMemcacheConnector is not working correctly')
+
+            connector.set_many({'value1': 10, 'value2': 20.25})
+            self.assertEqual(connector.get('value2'), 20.25,
+                             'set_many function in PipelinedMemcacheConnector is not working correctly')
+
+            other = ConnectorFactory.build(connection)
+            other.initialize([('value1', 5)], clear_old=True)
+            self.assertEqual(connector.get_many(['value1', 'value2']), {'value1': 5},
+                             'PipelinedMemcacheConnector does not follow a namespace bump')
+
+            other.close()
+            connector.close()
+        finally:
+            standin.stop()
+
+    def test_snapshot_connection(self):
+        backend = ConnectorFactory.build(Connection.SQLITE_WAL_CONNECTION)
+        backend.initialize([('value1', 1), ('value2', 2), ('value3', 3)])
+        connector = SnapshotConnector(backend, ['value1', 'value2'])
+        invalidated = []
+        connector.add_invalidation_hook(invalidated.append)
+
+        connector.begin_scan()
+        backend.set('value1', 100)
+        self.assertEqual(connector.get('value1'), 1, 'SnapshotConnector does not serve reads from the snapshot')
+        self.assertEqual(connector.get_many(['value2', 'value3']), {'value2': 2, 'value3': 3})
+
+        connector.set_many({'value2': 20, 'value3': 30})
+        self.assertEqual(connector.get('value2'), 20, 'SnapshotConnector does not read its own writes')
+        self.assertEqual(backend.get('value2'), 2, 'SnapshotConnector writes before the end of the scan')
+
+        connector.invalidate(['value1'])
+        self.assertEqual(connector.get('value1'), 100, 'invalidate function in SnapshotConnector is not working')
+        self.assertEqual(invalidated, [['value1']])
+
+        connector.end_scan()
+        self.assertEqual(backend.get_many(['value2', 'value3']), {'value2': 20, 'value3': 30},
+                         'SnapshotConnector does not flush its writes at the end of the scan')
+        self.assertEqual(connector.get_stats(), {'snapshots': 1, 'hits': 3, 'misses': 2, 'flushes': 1,
+                                                 'flushed_tags': 2, 'invalidations': 1})
+
+        backend.close()
+
+    def test_write_coalescing_connection(self):
+        backend = ConnectorFactory.build(Connection.SQLITE_WAL_CONNECTION)
+        connector = WriteCoalescingConnector(backend, {'value2': 0.5})
+        connector.initialize([('value1', 1), ('value2', 2), ('value3', 3)])
+
+        connector.set_many({'value1': 1, 'value2': 2.4, 'value3': 4})
+        self.assertEqual(connector.get('value3'), 4, 'WriteCoalescingConnector does not read its own writes')
+        self.assertEqual(backend.get('value3'), 3, 'WriteCoalescingConnector writes before flush')
+
+        connector.end_scan()
+        self.assertEqual(backend.get_many(['value1', 'value2', 'value3']), {'value1': 1, 'value2': 2, 'value3': 4},
+                         'WriteCoalescingConnector does not respect the deadbands')
+
+        connector.set('value2', 2.6)
+        connector.flush()
+        self.assertEqual(backend.get('value2'), 2.6, 'WriteCoalescingConnector suppresses a change beyond the deadband')
+        self.assertEqual(connector.get_stats(), {'writes': 4, 'suppressed': 2, 'flushes': 2, 'flushed_tags': 2})
+
+        backend.close()
+
+    def test_notifying_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bus_path = os.path.join(directory, 'tag_bus.sock')
+            connector = NotifyingConnector(ConnectorFactory.build(Connection.SQLITE_WAL_CONNECTION), bus_path)
+            listener = TagBusClient(bus_path)
+            self.assertEqual(listener.wait_for_change(['value1'], 0.05), [], 'wait_for_change does not time out')
+
+            connector.initialize([('value1', 1), ('value2', 2)])
+            connector.set_many({'value2': 3})
+            self.assertEqual(listener.wait_for_change(['value1'], 1), ['value1'],
+                             'wait_for_change does not report changes published while not waiting')
+            self.assertEqual(listener.wait_for_change(['value1'], 0.05), [], 'wait_for_change reports foreign tags')
+
+            threading.Timer(0.05, connector.set, ('value1', 5)).start()
+            self.assertEqual(listener.wait_for_change(['value1'], 2), ['value1'],
+                             'wait_for_change does not wake up on a change')
+            self.assertEqual(connector.get('value1'), 5)
+
+            sequence, changes = listener.changes_since(0)
+            self.assertEqual(sequence, 3, 'change log is not sequence numbered')
+            self.assertEqual([change['tags'] for change in changes], [['value1', 'value2'], ['value2'], ['value1']])
+
+            listener.close()
+            connector.close()
+
+    def test_slow_tag_bus_subscriber(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bus_path = os.path.join(directory, 'tag_bus.sock')
+            server = TagBusServer(bus_path)
+            server.MAX_PENDING = 64 * 1024
+            server.start()
+            self.addCleanup(server.stop)
+
+            # subscribes to every change and never reads
+            slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            slow.connect(bus_path)
+            slow.sendall(b'{"op": "subscribe", "tags": null, "epoch": null, "since": 0}\n')
+            self.addCleanup(slow.close)
+            listener = TagBusClient(bus_path)
+            self.addCleanup(listener.close)
+            listener.wait_for_change(['value1'], 0.05)
+
+            tags = ['tag{}'.format(i) for i in range(200)]
+            longest = 0
+            for count in range(300):
+                listener.publish(tags + ['value1'])
+                start = time.monotonic()
+                self.assertEqual(listener.wait_for_change(['value1'], 1), ['value1'],
+                                 'a slow subscriber stops the change notifications')
+                longest = max(longest, time.monotonic() - start)
+
+            self.assertEqual(server.stats['slow_drops'], 1, 'slow subscriber is not dropped')
+            self.assertLess(longest, 0.25, 'a slow subscriber delays the change notifications')
+
+    def test_history_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            history_path = os.path.join(directory, 'history.sqlite')
+            connector = HistoryConnector(ConnectorFactory.build(Connection.SQLITE_WAL_CONNECTION), history_path,
+                                         max_rows=4)
+            connector.initialize([('value1', 1), ('value2', 2)])
+            connector.set('value1', 2)
+            middle = time.time()
+            time.sleep(0.01)
+            connector.set_many({'value1': 3, 'value2': 4})
+            connector.end_scan()
+
+            self.assertEqual([value for _, value in connector.history('value1')], [1, 2, 3],
+                             'HistoryConnector does not record every write')
+            self.assertEqual([value for _, value in connector.history('value1', middle)], [3],
+                             'history range query does not respect t0')
+            self.assertEqual([value for _, value in connector.history('value2', None, middle)], [2],
+                             'history range query does not respect t1')
+
+            connector.prune()
+            self.assertEqual([value for _, value in connector.history('value1')], [2, 3],
+                             'HistoryConnector does not bound the number of rows')
+            connector.close()
+
+    def test_hardware_connection(self):
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        server = ServerModbus('127.0.0.1', port)
+        server.start()
+
+        tags = {'value1': {'id': 0}, 'value2': {'id': 1}, 'value3': {'id': 5}}
+        connector = ConnectorFactory.build({'type': 'hardware', 'path': '127.0.0.1:{}'.format(port),
+                                            'name': 'device', 'tags': tags})
+        try:
+            connector.initialize([('value1', 1), ('value2', 2.5), ('value3', 3)])
+            self.assertEqual(server.get(1), 2.5, 'HardwareConnector does not write the mapped register')
+            self.assertEqual(connector.get_stats()['requests'], 2, 'HardwareConnector does not write register blocks')
+
+            server.set(5, 7)
+            self.assertEqual(connector.get_many(['value1', 'value2', 'value3']),
+                             {'value1': 1, 'value2': 2.5, 'value3': 7})
+            self.assertEqual(connector.get('value3'), 7, 'get function in HardwareConnector is not working correctly')
+            stats = connector.get_stats()
+            self.assertEqual((stats['requests'], stats['failures'], stats['reconnects']), (4, 0, 1),
+                             'HardwareConnector does not reuse its session')
+        finally:
+            connector.close()
+            server.stop()
+
     def test_memcache_connection(self):
         try:
             connection = MemcacheConnector(Connection.MEMCACHE_LOCAL_CONNECTION)
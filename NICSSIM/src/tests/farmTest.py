@@ -0,0 +1,57 @@
+import time
+import unittest
+
+from ics_sim.farm import PLCFarm, ScanScheduler
+from ics_sim.protocol import ClientModbus
+
+
+class FarmTests(unittest.TestCase):
+
+    def test_scan_scheduler(self):
+        scheduler = ScanScheduler()
+        calls = {'fast': 0, 'slow': 0, 'removed': 0}
+        scheduler.add(0.01, lambda: calls.__setitem__('fast', calls['fast'] + 1))
+        scheduler.add(0.05, lambda: calls.__setitem__('slow', calls['slow'] + 1), phase=0.02)
+        removed = scheduler.add(0.01, lambda: calls.__setitem__('removed', calls['removed'] + 1))
+        scheduler.remove(removed)
+
+        scheduler.start()
+        time.sleep(0.3)
+        scheduler.stop()
+
+        self.assertTrue(20 <= calls['fast'] <= 31, 'fast task ran {} times'.format(calls['fast']))
+        self.assertTrue(4 <= calls['slow'] <= 7, 'slow task ran {} times'.format(calls['slow']))
+        self.assertEqual(calls['removed'], 0, 'removed task still runs')
+        self.assertEqual(scheduler.stats['overruns'], 0)
+
+        scheduler = ScanScheduler()
+        scheduler.add(0.01, lambda: time.sleep(0.035))
+        scheduler.start()
+        time.sleep(0.2)
+        scheduler.stop()
+        self.assertTrue(4 <= scheduler.stats['scans'] <= 6, 'missed periods of a slow scan are run')
+        self.assertGreater(scheduler.stats['overruns'], 8, 'overruns of the slow scan are not counted')
+
+    def test_plc_farm(self):
+        farm = PLCFarm('127.0.0.1', 5001)
+        for index in range(250):
+            farm.add_plc('plc-{}'.format(index), lambda plc: plc.set(1, plc.get(0) * 2), loop=20,
+                         port=5001 + index // 247)
+        self.assertEqual(len(farm.server.units), 250)
+        self.assertRaises(ValueError, farm.add_plc, 'plc-0', lambda plc: None)
+
+        farm.start()
+        clients = [ClientModbus('127.0.0.1', 5001, 1), ClientModbus('127.0.0.1', 5002, 3)]
+        try:
+            for client in clients:
+                client.send(0, 21)
+            time.sleep(0.1)
+            self.assertEqual([client.receive(1) for client in clients], [42, 42], 'virtual PLCs do not scan')
+            self.assertEqual(farm.plcs['plc-0'].get(0), 21)
+            self.assertEqual(farm.plcs['plc-1'].get(0), 0)
+        finally:
+            for client in clients:
+                client.close()
+            farm.stop()
+
+        self.assertEqual(farm.get_stats()['scheduler']['errors'], 0)
@@ -0,0 +1,100 @@
+import socket
+import threading
+import time
+import unittest
+
+from ics_sim.gateway import Gateway
+from ics_sim.protocol import AsyncServerModbus, ClientModbus, ModbusCodec
+
+
+class GatewayTests(unittest.TestCase):
+    TAGS = {
+        'level':   {'id': 0, 'plc': 1, 'type': 'input',  'fault': 0.0, 'default': 0},
+        'valve':   {'id': 1, 'plc': 1, 'type': 'output', 'fault': 0.0, 'default': 0},
+        'flow':    {'id': 4, 'plc': 1, 'type': 'input',  'fault': 0.0, 'default': 0, 'layout': ModbusCodec.FLOAT32},
+        'far_tag': {'id': 90, 'plc': 1, 'type': 'output', 'fault': 0.0, 'default': 0},
+    }
+    PLCS = {1: {'name': 'PLC1', 'ip': '127.0.0.1', 'port': 5001, 'protocol': 'ModbusWriteRequest-TCP'}}
+
+    def test_gateway(self):
+        plc = AsyncServerModbus('127.0.0.1', 5001)
+        plc.set_layouts({4: ModbusCodec.FLOAT32})
+        plc.start()
+        gateway = Gateway('GatewayTest', self.TAGS, self.PLCS, '127.0.0.1', 5002, loop=100)
+        client = ClientModbus('127.0.0.1', 5002, 1)
+        client.set_layouts({4: ModbusCodec.FLOAT32})
+
+        try:
+            self.assertEqual(gateway._ranges[1], [(0, 10, [0, 1, 4]), (180, 2, [90])])
+            self.assertTrue(gateway.units[1].is_stale())
+            plc.set(0, 12.5)
+            plc.set(4, 0.25)
+            plc.set(90, 7)
+            gateway._poll()
+            gateway.server.start()
+
+            self.assertEqual(client.receive_many([0, 4, 90]), {0: 12.5, 4: 0.25, 90: 7})
+            self.assertEqual(gateway.read('level')[0], 12.5)
+            self.assertEqual(gateway.read_many(['flow', 'far_tag']), {'flow': 0.25, 'far_tag': 7})
+
+            plc.set(0, 13)
+            self.assertEqual(client.receive(0), 12.5, 'gateway reads the PLC for every client request')
+            client.send(1, 3)
+            self.assertEqual(plc.get(1), 3, 'gateway does not pass writes through')
+            self.assertEqual(client.receive(1), 3, 'gateway cache misses a passed through write')
+            self.assertEqual(plc.stats['requests'], 3)
+
+            gateway.units[1].timestamp -= 10
+            self.assertIsNone(client.client.read_holding_registers(0, 2), 'gateway serves a stale image')
+            self.assertEqual(client.client.last_except, 0x0B)
+        finally:
+            client.close()
+            gateway.server.stop()
+            plc.stop()
+
+        plc.stop()
+        self.assertIsNone(ClientModbus('127.0.0.1', 5001).client.read_holding_registers(0, 2))
+        gateway._poll()
+        self.assertEqual(gateway.get_stats()['failures'], 1)
+
+    def test_write_to_silent_plc(self):
+        # accepts connections (in its backlog) but never answers
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 5003))
+        silent.listen()
+        plc = AsyncServerModbus('127.0.0.1', 5004)
+        plc.start()
+        plcs = {1: dict(self.PLCS[1], port=5004), 2: dict(self.PLCS[1], name='PLC2', port=5003)}
+        tags = {'level': dict(self.TAGS['level']), 'stuck': dict(self.TAGS['valve'], plc=2)}
+        gateway = Gateway('GatewayTest', tags, plcs, '127.0.0.1', 5005, loop=100)
+        reader = ClientModbus('127.0.0.1', 5005, 1)
+        result = {}
+
+        def write():
+            writer = ClientModbus('127.0.0.1', 5005, 2)
+            result['response'] = writer.client.write_single_register(0, 1)
+            result['code'] = writer.client.last_except
+            writer.close()
+
+        try:
+            for unit in gateway.units.values():
+                unit.timestamp = time.time()
+            gateway.server.start()
+            thread = threading.Thread(target=write)
+            thread.start()
+            time.sleep(0.1)
+            start = time.monotonic()
+            for _ in range(5):
+                self.assertEqual(reader.receive(0), 0)
+            self.assertLess(time.monotonic() - start, 0.5, 'a write to a silent PLC blocks the gateway')
+            thread.join()
+            self.assertFalse(result['response'])
+            self.assertEqual(result['code'], 0x0B)
+            self.assertEqual(gateway.units[2].stats['failed_writes'], 1)
+        finally:
+            reader.close()
+            gateway.server.stop()
+            for unit in gateway.units.values():
+                unit.close()
+            plc.stop()
+            silent.close()
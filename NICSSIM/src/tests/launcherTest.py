@@ -0,0 +1,100 @@
+import os
+import time
+import unittest
+
+from ics_sim.Device import Runnable
+from ics_sim.launcher import Launcher
+
+QUIET = {'ICS_SIM_METRICS_PORT': '0', 'ICS_SIM_METRICS_DUMP_INTERVAL': '0', 'ICS_SIM_LOG_CONSOLE': '0'}
+
+
+class LauncherRunnable(Runnable):
+    """Scans every 20 ms; exits the process or hangs at the given scans."""
+
+    def __init__(self, name, exit_at=None, hang_at=None):
+        Runnable.__init__(self, name, 20)
+        self.exit_at = exit_at
+        self.hang_at = hang_at
+        self.scans = 0
+
+    def _logic(self):
+        self.scans += 1
+        if self.scans == self.exit_at:
+            os._exit(3)
+        if self.scans == self.hang_at:
+            time.sleep(3600)
+
+
+def component(name, after=(), **kwargs):
+    return {'name': name, 'module': __name__, 'class': 'LauncherRunnable', 'args': (name,), 'after': list(after),
+            'env': QUIET, **kwargs}
+
+
+class LauncherTests(unittest.TestCase):
+
+    def start(self, components, **kwargs):
+        launcher = Launcher(components, **kwargs)
+        launcher.HEALTH_INTERVAL = 0.1
+        launcher.STOP_TIMEOUT = 1.0
+        self.addCleanup(launcher.stop)
+        launcher.start()
+        return launcher
+
+    def wait_for(self, condition, timeout=20):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return condition()
+
+    def test_order(self):
+        components = [component('HMI', after=['PLC1', 'PLC2']), component('PLC2', after=['Factory']),
+                      component('PLC1', after=['Factory']), component('Factory')]
+        self.assertEqual([c['name'] for c in Launcher.order(components)], ['Factory', 'PLC1', 'PLC2', 'HMI'])
+
+        with self.assertRaises(ValueError):
+            Launcher.order([component('PLC1', after=['Factory'])])
+        with self.assertRaises(ValueError):
+            Launcher.order([component('PLC1', after=['PLC2']), component('PLC2', after=['PLC1'])])
+        with self.assertRaises(ValueError):
+            Launcher.order([component('PLC1'), component('PLC1')])
+
+    def test_start_and_pin(self):
+        cpu = min(os.sched_getaffinity(0))
+        launcher = self.start([component('Second', after=['First'], cpus=[cpu]), component('First')])
+        stats = launcher.get_stats()
+        self.assertTrue(stats['First']['ready'] and stats['Second']['ready'])
+        self.assertNotEqual(stats['First']['pid'], os.getpid())
+        self.assertNotEqual(stats['First']['pid'], stats['Second']['pid'])
+        self.assertEqual(os.sched_getaffinity(stats['Second']['pid']), {cpu})
+
+        launcher.stop()
+        self.assertFalse(any(process.is_alive() for process in launcher._processes.values()))
+
+    def test_dependency_not_ready(self):
+        launcher = Launcher([component('Dependent', after=['Unready']), component('Independent'),
+                             component('Unready', kwargs={'exit_at': 1})])
+        launcher.STOP_TIMEOUT = 1.0
+        self.addCleanup(launcher.stop)
+        self.assertFalse(launcher.start())
+        stats = launcher.get_stats()
+        self.assertTrue(stats['Unready']['failed'])
+        self.assertEqual(stats['Unready']['exit_code'], 3)
+        self.assertTrue(stats['Dependent']['failed'])
+        self.assertEqual(stats['Dependent']['starts'], 0, 'dependent of a component which is not ready is started')
+        self.assertTrue(stats['Independent']['ready'])
+
+    def test_restart(self):
+        launcher = self.start([component('Crashing', kwargs={'exit_at': 40})], max_restarts=2)
+        self.assertTrue(self.wait_for(lambda: launcher.get_stats()['Crashing']['failed']))
+        stats = launcher.get_stats()['Crashing']
+        self.assertEqual(stats['starts'], 3)
+        self.assertEqual(stats['restarts'], 2)
+        self.assertEqual(stats['exit_code'], 3)
+
+        launcher = self.start([component('Hanging', kwargs={'hang_at': 40}, health_timeout=1.0)], max_restarts=1)
+        self.assertTrue(self.wait_for(lambda: launcher.get_stats()['Hanging']['failed']))
+        self.assertEqual(launcher.get_stats()['Hanging']['starts'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from ics_sim.logpipeline import LogPipeline, BatchFileHandler
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class LogPipelineTests(unittest.TestCase):
+
+    def test_batched_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'pipeline.log')
+        pipeline = LogPipeline()
+        handler = BatchFileHandler(path, mode='w')
+        handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        logger = logging.getLogger('logPipelineTest')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(pipeline.wrap(handler))
+        try:
+            for index in range(1000):
+                logger.info('line %d of %s', index, 'the test')
+            pipeline.stop()
+        finally:
+            logger.handlers = []
+            handler.close()
+
+        with open(path) as file:
+            lines = file.read().splitlines()
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(lines[999], 'INFO line 999 of the test')
+        self.assertEqual(pipeline.stats['written'], 1000)
+        self.assertLess(pipeline.stats['batches'], 1000, 'records are not written in batches')
+
+    def test_pressure(self):
+        # the writer only wakes up on stop
+        pipeline = LogPipeline(queue_size=10, interval=60, high_water=0.5, sample_rate=2)
+        target = ListHandler()
+        handler = pipeline.wrap(target)
+
+        def log(message, level=logging.INFO):
+            handler.handle(logging.makeLogRecord({'msg': message, 'levelno': level}))
+
+        for index in range(20):
+            log('info {}'.format(index))
+        log('warning', logging.WARNING)
+
+        # above 5 queued every other info record is sampled out, the rest is dropped once the queue is full
+        stats = pipeline.stats
+        self.assertEqual(stats['queued'], 10)
+        self.assertEqual(stats['sampled_out'], 8)
+        self.assertEqual(stats['dropped'], 3)
+        self.assertEqual(target.messages, [])
+
+        pipeline.stop()
+        self.assertEqual(target.messages, ['info 0', 'info 1', 'info 2', 'info 3', 'info 4',
+                                           'info 6', 'info 8', 'info 10', 'info 12', 'info 14'])
+        self.assertEqual(stats['written'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
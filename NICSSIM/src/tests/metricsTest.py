@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import urllib.request
+
+from ics_sim.configs import MetricsConfig
+from ics_sim.Device import Runnable
+from ics_sim.metrics import Histogram, MetricsRegistry, MetricsServer, MetricsDumper, REGISTRY
+
+
+def setUpModule():
+    # no metrics endpoint on port 9108 or dump file in ./logs for the Runnables started here
+    global _exporter_config
+    _exporter_config = MetricsConfig.HTTP_PORT, MetricsConfig.DUMP_INTERVAL
+    MetricsConfig.HTTP_PORT, MetricsConfig.DUMP_INTERVAL = None, 0
+
+
+def tearDownModule():
+    MetricsConfig.HTTP_PORT, MetricsConfig.DUMP_INTERVAL = _exporter_config
+
+
+class SleepyRunnable(Runnable):
+    def __init__(self):
+        Runnable.__init__(self, 'MetricsRunnable', 20)
+
+    def _logic(self):
+        time.sleep(0.005)
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(0.5), 0)
+        for value in range(1, 100001):
+            histogram.record(value * 1000)
+
+        self.assertEqual(histogram.count, 100000)
+        self.assertEqual(histogram.max, 100000000)
+        for quantile in (0.5, 0.99, 0.999):
+            expected = quantile * 100000000
+            self.assertLess(abs(histogram.percentile(quantile) - expected) / expected, 0.016)
+        self.assertEqual(histogram.percentile(1.0), 100000000)
+
+        small = Histogram()
+        for value in (0, 3, 3, 127, -5):
+            small.record(value)
+        self.assertEqual(small.percentile(0.5), 3, 'small values are not exact')
+        self.assertEqual(small.summary()['count'], 5)
+        self.assertEqual(set(small.summary()), {'count', 'mean', 'max', 'p50', 'p90', 'p99', 'p999'})
+
+    def test_exporters(self):
+        registry = MetricsRegistry()
+        metrics = registry.register('PLC1')
+        for value in (1000000, 2000000, 3000000):
+            metrics.logic.record(value)
+
+        text = registry.to_prometheus()
+        self.assertIn('ics_sim_scan_phase_seconds{component="PLC1",phase="logic",quantile="0.5"} 0.002', text)
+        self.assertIn('ics_sim_scan_phase_seconds_count{component="PLC1",phase="logic"} 3', text)
+        self.assertIn('ics_sim_scan_phase_seconds_sum{component="PLC1",phase="logic"} 0.006000000', text)
+
+        server = MetricsServer('127.0.0.1', 0, registry)
+        server.start()
+        try:
+            url = 'http://127.0.0.1:{}'.format(server.port)
+            self.assertEqual(urllib.request.urlopen(url + '/metrics').read().decode(), registry.to_prometheus())
+            served = json.loads(urllib.request.urlopen(url + '/metrics.json').read())
+            self.assertEqual(served['components']['PLC1']['logic']['count'], 3)
+        finally:
+            server.stop()
+
+        path = os.path.join(tempfile.mkdtemp(), 'metrics-PLC1.json')
+        dumper = MetricsDumper(path, 0.05, registry)
+        dumper.start()
+        time.sleep(0.12)
+        dumper.stop()
+        with open(path) as file:
+            self.assertEqual(json.load(file)['components']['PLC1']['logic']['max'], 3.0)
+
+    def test_runnable_metrics(self):
+        runnable = SleepyRunnable()
+        self.assertIs(REGISTRY.components()['MetricsRunnable'], runnable._metrics)
+        runnable.start()
+        time.sleep(0.25)
+        runnable.stop()
+        time.sleep(0.05)
+
+        summary = runnable._metrics.summary()
+        self.assertGreaterEqual(summary['logic']['count'], 10)
+        self.assertGreaterEqual(summary['logic']['p50'], 5)
+        self.assertLess(summary['logic']['p50'], 15)
+        self.assertEqual(summary['jitter']['count'], summary['logic']['count'])
+        self.assertLess(summary['pre_logic']['p99'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,13 @@
+import asyncio
+import random
+import struct
 import time
 import unittest
 from ics_sim.helper import debug
 from pyModbusTCP.server import ModbusServer, DataBank
 
-from ics_sim.protocol import ClientModbus, ServerModbus, ModbusBase
+from ics_sim.protocol import ClientModbus, ServerModbus, ModbusBase, ModbusCodec, AsyncClientModbus, \
+    AsyncServerModbus, ProtocolFactory, ClientPolicy, RegisterBank, ModbusFarmServer
 
 
 class ProtocolTests(unittest.TestCase):
@@ -18,6 +22,50 @@ class ProtocolTests(unittest.TestCase):
         self.modbusBase_fuc(modbus_base, 7654)
         self.modbusBase_fuc(modbus_base, 70000)
 
+    def test_ModbusBase_negative(self):
+        modbus_base = ModbusBase()
+
+        self.modbusBase_fuc(modbus_base, -1)
+        self.modbusBase_fuc(modbus_base, -0.5)
+        self.modbusBase_fuc(modbus_base, -7654.3211)
+        self.assertEqual(modbus_base.encode(70000), [10681, 9984], 'positive fixed-point wire format changed')
+        self.assertRaises(ValueError, modbus_base.encode, 300000)
+        self.assertRaises(ValueError, modbus_base.decode, [1, 2, 3])
+
+        # the original unsigned range and wire format
+        self.assertEqual(modbus_base.encode(70000, ModbusCodec.UFIXED), [10681, 9984])
+        self.assertEqual(modbus_base.encode(429496.7295, ModbusCodec.UFIXED), [65535, 65535])
+        self.assertEqual(modbus_base.decode([65535, 65535], ModbusCodec.UFIXED), 429496.7295)
+        self.assertEqual(modbus_base.decode([65535, 65535]), -0.0001)
+        self.assertRaises(ValueError, modbus_base.encode, -1, ModbusCodec.UFIXED)
+
+    def test_ModbusCodec_round_trip(self):
+        codec = ModbusCodec()
+        rng = random.Random(1234)
+        layouts = [ModbusCodec.FIXED, ModbusCodec.UFIXED, ModbusCodec.FLOAT32, ModbusCodec.FLOAT64]
+
+        for _ in range(200):
+            count = rng.randint(1, 40)
+            tag_layouts = [rng.choice(layouts) for _ in range(count)]
+            values = [round(rng.uniform(0 if layout == ModbusCodec.UFIXED else -200000, 200000), 4)
+                      for layout in tag_layouts]
+
+            words = codec.encode_many(values, tag_layouts)
+            self.assertEqual(len(words), sum(codec.words(layout) for layout in tag_layouts))
+            decoded = codec.decode_many(words, tag_layouts)
+
+            for value, layout, result in zip(values, tag_layouts, decoded):
+                if layout == ModbusCodec.FLOAT32:
+                    expected = struct.unpack('>f', struct.pack('>f', value))[0]
+                else:
+                    expected = value
+                self.assertAlmostEqual(expected, result, 9, 'round trip fails for {} as {}'.format(value, layout))
+
+        values = [rng.uniform(-1000, 1000) for _ in range(50)]
+        self.assertEqual(codec.decode_many(codec.encode_many(values)),
+                         [ModbusBase().decode(ModbusBase().encode(value)) for value in values],
+                         'array and single value codecs disagree')
+
     def modbusBase_fuc(self, modbus_base, number):
         words = modbus_base.encode(number)
         new_number = modbus_base.decode(words)
@@ -51,6 +99,53 @@ class ProtocolTests(unittest.TestCase):
 
         server.stop()
 
+    def test_ServerModbus_layouts(self):
+        server = ServerModbus('127.0.0.1', 5001)
+        server.set_layouts({0: ModbusCodec.FLOAT64, 2: ModbusCodec.FLOAT32})
+        server.start()
+
+        try:
+            server.set(0, -10.654321)
+            self.assertEqual(server.get(0), -10.654321, 'test_ServerModbus_layouts fails on float64')
+            server.set(2, 0.5)
+            self.assertEqual(server.get(2), 0.5, 'test_ServerModbus_layouts fails on float32')
+            self.server_modbus_func(3, -10.654321, server)
+            self.assertEqual(server.plan_ranges([0, 2, 3]), [(0, 8, [0, 2, 3])],
+                             'plan_ranges ignores the register layouts')
+        finally:
+            server.stop()
+
+    def test_register_bank(self):
+        bank = RegisterBank()
+        self.assertTrue(bank.set_holding_registers(5, [10, 0x12345]))
+        self.assertEqual(bank.get_holding_registers(5, 2), [10, 0x2345], 'RegisterBank is not DataBank compatible')
+        self.assertEqual(bank.read_bytes(5, 2), b'\x00\x0a\x23\x45', 'RegisterBank is not in Modbus byte order')
+        self.assertIsNone(bank.get_holding_registers(0xffff, 2))
+        self.assertIsNone(bank.set_holding_registers(0xffff, [1, 2]))
+
+        server = ServerModbus('127.0.0.1', 5001)
+        server.set_layouts({4: ModbusCodec.FLOAT32})
+        server.set(1, 77)
+        view = server.view([4, 0, 2])
+        view.write([0.25, -1.5, 3.1234])
+        self.assertEqual([server.get(4), server.get(0), server.get(2)], [0.25, -1.5, 3.1234])
+        self.assertEqual(server.get(1), 77, 'RegisterView overwrites registers between its tags')
+        self.assertEqual(view.read(), [0.25, -1.5, 3.1234])
+        self.assertEqual(server.view([]).read(), [])
+
+        self.assertRaises(ValueError, view.write, [0, 300000, 0])
+        self.assertEqual(server.get(4), 0.25, 'RegisterView writes part of a failed write')
+
+        server.start()
+        client = ClientModbus('127.0.0.1', 5001)
+        try:
+            self.assertEqual(client.receive(0), -1.5, 'ModbusServer does not serve the RegisterBank')
+            client.send(3, 8.5)
+            self.assertEqual(server.get(3), 8.5)
+        finally:
+            client.close()
+            server.stop()
+
     def server_modbus_func(self, tag_id, value, server):
         server.set(tag_id, value)
         received = server.get(tag_id)
@@ -72,6 +167,215 @@ class ProtocolTests(unittest.TestCase):
         server.stop()
         client.close()
 
+    def test_client_receive_many(self):
+        client = ClientModbus('127.0.0.1', 5001)
+        server = ServerModbus('127.0.0.1', 5001)
+        server.start()
+
+        try:
+            tag_ids = [0, 3, 4, 90, 150]
+            for tag_id in tag_ids:
+                server.set(tag_id, tag_id + 0.25)
+
+            self.assertEqual(client.plan_ranges(tag_ids, 125, 125), [(0, 10, [0, 3, 4]), (180, 122, [90, 150])])
+            self.assertEqual(client.receive_many(tag_ids), {tag_id: tag_id + 0.25 for tag_id in tag_ids},
+                             'receive_many does not match the server values')
+        finally:
+            server.stop()
+            client.close()
+
+    def test_client_send_many(self):
+        client = ClientModbus('127.0.0.1', 5001)
+        server = ServerModbus('127.0.0.1', 5001)
+        server.start()
+
+        try:
+            server.set(70, 9)
+            values = {tag_id: tag_id / 4 for tag_id in range(70)}
+            values[71] = 1.5
+
+            self.assertEqual([(start, count) for start, count, _ in client.plan_ranges(values, 123)],
+                             [(0, 122), (122, 18), (142, 2)], 'write blocks are not planned correctly')
+            client.send_many(values)
+            for tag_id, value in values.items():
+                self.assertEqual(server.get(tag_id), value, 'send_many fails on tag_id={}'.format(tag_id))
+            self.assertEqual(server.get(70), 9, 'send_many overwrites registers between the blocks')
+        finally:
+            server.stop()
+            client.close()
+
+    def test_async_client_modbus(self):
+        server = ServerModbus('127.0.0.1', 5001)
+        server.start()
+
+        async def exercise():
+            client = ProtocolFactory.create_async_client('ModbusWriteRequest-TCP', '127.0.0.1', 5001)
+            await client.send_many({tag_id: tag_id * 1.5 for tag_id in range(10)})
+            received = await asyncio.gather(*(client.receive(tag_id % 10) for tag_id in range(200)))
+            many = await client.receive_many([2, 7])
+            await client.send(3, -4.25)
+            single = await client.receive(3)
+            await client.close()
+            return received, many, single, client.stats
+
+        try:
+            received, many, single, stats = asyncio.run(exercise())
+        finally:
+            server.stop()
+
+        self.assertEqual(received, [(tag_id % 10) * 1.5 for tag_id in range(200)],
+                         'pipelined responses are not matched to their requests')
+        self.assertEqual(many, {2: 3.0, 7: 10.5})
+        self.assertEqual(single, -4.25)
+        self.assertEqual((stats['reconnects'], stats['timeouts']), (1, 0))
+
+    def test_async_client_timeout(self):
+        async def exercise():
+            # accepts the connection but never answers
+            silent = await asyncio.start_server(lambda reader, writer: None, '127.0.0.1', 0)
+            port = silent.sockets[0].getsockname()[1]
+            client = AsyncClientModbus('127.0.0.1', port, timeout=0.05, retries=2)
+            try:
+                await client.receive(0)
+            except asyncio.TimeoutError:
+                return client.stats
+            finally:
+                await client.close()
+                silent.close()
+
+        stats = asyncio.run(exercise())
+        self.assertIsNotNone(stats, 'AsyncClientModbus does not time out')
+        self.assertEqual((stats['timeouts'], stats['retries']), (3, 2))
+
+    def test_async_server_modbus(self):
+        server = ProtocolFactory.create_server('ModbusWriteRequest-TCP', '127.0.0.1', 5001, ProtocolFactory.SERVER_ASYNCIO)
+        server.start()
+        client = ClientModbus('127.0.0.1', 5001)
+
+        try:
+            self.client_server_modbus_func(server, client, 0, 10)
+            self.client_server_modbus_func(server, client, 3, 7563.42)
+
+            client.send_many({tag_id: tag_id / 2 for tag_id in range(80)})
+            self.assertEqual(server.get(79), 39.5, 'AsyncServerModbus does not store written registers')
+            self.assertEqual(client.receive_many([1, 60, 79]), {1: 0.5, 60: 30, 79: 39.5})
+            self.assertIsNone(client.client.read_input_registers(0, 2), 'AsyncServerModbus answers unsupported functions')
+            self.assertEqual(server.handle_request(struct.pack('>BHH', 3, 0, 126)), bytes((0x83, 3)),
+                             'AsyncServerModbus exceeds the read limit')
+            self.assertEqual(server.handle_request(struct.pack('>BHH', 3, 0xFFFF, 2)), bytes((0x83, 2)),
+                             'AsyncServerModbus reads past the register bank')
+        finally:
+            client.close()
+            server.stop()
+
+        self.assertEqual(server.stats['exceptions'], 3)
+
+    def test_async_server_connection_limit(self):
+        server = AsyncServerModbus('127.0.0.1', 5001, max_connections=2)
+        server.start()
+        clients = [ClientModbus('127.0.0.1', 5001) for _ in range(3)]
+
+        try:
+            server.set(1, 4.5)
+            self.assertEqual(clients[0].receive(1), 4.5)
+            self.assertEqual(clients[1].receive(1), 4.5)
+            self.assertIsNone(clients[2].client.read_holding_registers(2, 2), 'AsyncServerModbus exceeds max_connections')
+        finally:
+            for client in clients:
+                client.close()
+            server.stop()
+
+        self.assertEqual(server.stats['rejected_connections'], 1)
+
+    def test_farm_server(self):
+        farm = ModbusFarmServer('127.0.0.1', 5001)
+        units = [farm.add_unit(1), farm.add_unit(2, size=64), farm.add_unit(1, 5002)]
+        self.assertRaises(ValueError, farm.add_unit, 2)
+        farm.start()
+        clients = [ClientModbus('127.0.0.1', 5001, 1), ClientModbus('127.0.0.1', 5001, 2),
+                   ClientModbus('127.0.0.1', 5002, 1), ClientModbus('127.0.0.1', 5001, 3)]
+
+        try:
+            for index, (unit, client) in enumerate(zip(units, clients)):
+                unit.set(4, index + 0.5)
+                self.assertEqual(client.receive(4), index + 0.5, 'ModbusFarmServer mixes up the unit banks')
+            clients[1].send(5, 8)
+            self.assertEqual((units[0].get(5), units[1].get(5)), (0, 8))
+            self.assertIsNone(clients[1].client.read_holding_registers(64, 2), 'ModbusFarmServer reads past a unit bank')
+            self.assertIsNone(clients[3].client.read_holding_registers(0, 2), 'ModbusFarmServer answers unknown units')
+            self.assertEqual(clients[3].client.last_except, 0x0A)
+
+            late = farm.add_unit(1, 5003)
+            late.set(0, 3)
+            self.assertEqual(ClientModbus('127.0.0.1', 5003).receive(0), 3, 'ModbusFarmServer does not listen on new ports')
+        finally:
+            for client in clients:
+                client.close()
+            farm.stop()
+
+        self.assertEqual(units[1].stats, {'requests': 3, 'exceptions': 1})
+
+    def test_client_policy(self):
+        policy = ClientPolicy({'hmi': {'ips': ['10.0.0.5'], 'max_connections': 1}},
+                              default={'rate': 10, 'burst': 2}, max_delay=0.05)
+
+        self.assertEqual([policy.admit('10.0.0.9') for _ in range(3)], [0.0, 0.0, None],
+                         'token bucket does not drop requests over the rate')
+        self.assertEqual([policy.admit('10.0.0.5') for _ in range(3)], [0.0, 0.0, 0.0],
+                         'unlimited class is rate limited')
+        self.assertTrue(policy.connect('10.0.0.5'))
+        self.assertFalse(policy.connect('10.0.0.5'), 'connection cap is not applied')
+        policy.disconnect('10.0.0.5')
+        self.assertTrue(policy.connect('10.0.0.5'))
+        self.assertEqual((policy.priority('10.0.0.5'), policy.priority('10.0.0.9')), (0, 1))
+
+        slow = ClientPolicy(default={'rate': 20, 'burst': 1}, max_delay=1)
+        self.assertEqual(slow.admit('10.0.0.9'), 0.0)
+        self.assertGreater(slow.admit('10.0.0.9'), 0.0, 'request over the rate is not deferred')
+
+        stats = policy.get_stats()
+        self.assertEqual(stats['clients']['10.0.0.9']['dropped'], 1)
+        self.assertEqual(stats['classes']['hmi']['rejected_connections'], 1)
+        self.assertEqual(slow.get_stats()['clients']['10.0.0.9']['deferred'], 1)
+
+    def test_server_policy(self):
+        for backend in (ProtocolFactory.SERVER_THREADED, ProtocolFactory.SERVER_ASYNCIO):
+            policy = ClientPolicy(default={'rate': 1, 'burst': 3, 'max_connections': 1}, max_delay=0)
+            server = ProtocolFactory.create_server('ModbusWriteRequest-TCP', '127.0.0.1', 5001, backend, policy)
+            server.start()
+            client = ClientModbus('127.0.0.1', 5001)
+
+            try:
+                server.set(1, 2.5)
+                self.assertEqual([client.client.read_holding_registers(2, 2) is not None for _ in range(5)],
+                                 [True, True, True, False, False], '{} server does not apply the rate'.format(backend))
+                self.assertEqual(client.client.last_except, 6, 'dropped requests are not answered as busy')
+            finally:
+                client.close()
+                server.stop()
+
+            stats = policy.get_stats()['clients']['127.0.0.1']
+            self.assertEqual((stats['served'], stats['dropped']), (3, 2))
+
+        for backend in (ProtocolFactory.SERVER_THREADED, ProtocolFactory.SERVER_ASYNCIO):
+            policy = ClientPolicy(default={'max_connections': 1})
+            server = ProtocolFactory.create_server('ModbusWriteRequest-TCP', '127.0.0.1', 5001, backend, policy)
+            server.start()
+            clients = [ClientModbus('127.0.0.1', 5001) for _ in range(2)]
+            try:
+                self.assertIsNotNone(clients[0].client.read_holding_registers(0, 2))
+                self.assertIsNone(clients[1].client.read_holding_registers(0, 2),
+                                  '{} server does not apply the per IP connection cap'.format(backend))
+                clients[0].close()
+                time.sleep(0.1)
+                self.assertIsNotNone(clients[1].client.read_holding_registers(0, 2),
+                                     '{} server does not release the connections which are closed'.format(backend))
+            finally:
+                for client in clients:
+                    client.close()
+                server.stop()
+            self.assertEqual(policy.get_stats()['clients']['127.0.0.1']['rejected_connections'], 1)
+
     def client_server_modbus_func(self, server, client, tag_id, value):
         server.set(tag_id, value)
         received = client.receive(tag_id)
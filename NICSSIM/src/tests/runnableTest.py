@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+
+from ics_sim.configs import MetricsConfig
+from ics_sim.Device import Runnable, RunnableRuntime
+
+
+def setUpModule():
+    # no metrics endpoint on port 9108 or dump file in ./logs for the Runnables started here
+    global _exporter_config
+    _exporter_config = MetricsConfig.HTTP_PORT, MetricsConfig.DUMP_INTERVAL
+    MetricsConfig.HTTP_PORT, MetricsConfig.DUMP_INTERVAL = None, 0
+
+
+def tearDownModule():
+    MetricsConfig.HTTP_PORT, MetricsConfig.DUMP_INTERVAL = _exporter_config
+
+
+class SlowRunnable(Runnable):
+    """Scans every 20 ms; the scans listed in slow_scans take 70 ms."""
+
+    def __init__(self, name, policy, slow_scans=()):
+        Runnable.__init__(self, name, 20)
+        self.set_overrun_policy(policy)
+        self.slow_scans = slow_scans
+        self.loop_times = []
+
+    def _logic(self):
+        self.loop_times.append(self._current_loop_time)
+        if len(self.loop_times) in self.slow_scans:
+            time.sleep(0.07)
+
+
+class CountingRunnable(Runnable):
+    def __init__(self, name, fail_at=None):
+        Runnable.__init__(self, name, 20)
+        self.fail_at = fail_at
+        self.starts = 0
+        self.scans = 0
+        self.threads = set()
+
+    def _before_start(self):
+        self.starts += 1
+
+    def _logic(self):
+        self.scans += 1
+        self.threads.add(threading.get_ident())
+        if self.scans == self.fail_at:
+            raise ValueError('scan failed')
+
+
+class RunnableTests(unittest.TestCase):
+
+    def run_for(self, runnable, seconds):
+        runnable.start()
+        time.sleep(seconds)
+        runnable.stop()
+        time.sleep(0.05)
+        return runnable.get_scan_stats()
+
+    def test_monotonic_scheduler(self):
+        runnable = SlowRunnable('RunnableSkip', Runnable.OVERRUN_SKIP)
+        stats = self.run_for(runnable, 0.5)
+        self.assertEqual(stats['overruns'], 0)
+        self.assertGreaterEqual(stats['scans'], 22)
+        self.assertLessEqual(stats['scans'], 26)
+        self.assertTrue(all(b - a == 20 for a, b in zip(runnable.loop_times, runnable.loop_times[1:])),
+                        'loop times are not 20 ms apart')
+
+        runnable = SlowRunnable('RunnableSkipSlow', Runnable.OVERRUN_SKIP, slow_scans=(3,))
+        stats = self.run_for(runnable, 0.3)
+        self.assertEqual(stats['overruns'], 1)
+        self.assertEqual(stats['skipped'], 2)
+        self.assertTrue(all((b - a) % 20 == 0 for a, b in zip(runnable.loop_times, runnable.loop_times[1:])),
+                        'skip leaves the 20 ms grid')
+
+        runnable = SlowRunnable('RunnableCatchUp', Runnable.OVERRUN_CATCH_UP, slow_scans=(3,))
+        stats = self.run_for(runnable, 0.3)
+        self.assertGreaterEqual(stats['overruns'], 3)
+        self.assertEqual(stats['skipped'], 0)
+        self.assertTrue(all(b - a == 20 for a, b in zip(runnable.loop_times, runnable.loop_times[1:])),
+                        'catch-up does not run the missed scans')
+
+        runnable = SlowRunnable('RunnableStretch', Runnable.OVERRUN_STRETCH, slow_scans=(3,))
+        stats = self.run_for(runnable, 0.3)
+        self.assertEqual(stats['overruns'], 1)
+        self.assertEqual(stats['skipped'], 0)
+        self.assertLess(stats['max_jitter'], 5)
+
+        with self.assertRaises(ValueError):
+            runnable.set_overrun_policy('later')
+
+    def test_runtime(self):
+        runtime = RunnableRuntime(threads=2)
+        runnables = [runtime.add(CountingRunnable('RuntimeRunnable{}'.format(index))) for index in range(100)]
+        failing = runtime.add(CountingRunnable('RuntimeFailing', fail_at=3))
+        late = runtime.add(CountingRunnable('RuntimeLate'), delay=0.3)
+        threads = threading.active_count()
+        runtime.start()
+        self.assertLessEqual(threading.active_count(), threads + 2)
+        self.assertFalse(runtime.wait(0.5))
+        runtime.stop()
+        self.assertTrue(runtime.wait(0))
+
+        for runnable in runnables:
+            self.assertEqual(runnable.starts, 1)
+            self.assertGreaterEqual(runnable.scans, 20)
+            self.assertLessEqual(runnable.scans, 27)
+        self.assertEqual(len(set().union(*(runnable.threads for runnable in runnables))), 2)
+        self.assertEqual(failing.scans, 3, 'a failing Runnable goes on scanning')
+        self.assertGreater(late.scans, 5)
+        self.assertLess(late.scans, 13)
+        self.assertEqual(late.get_scan_stats()['scans'], late.scans)
+        self.assertEqual(runtime.get_stats()['errors'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
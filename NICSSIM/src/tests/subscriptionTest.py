@@ -0,0 +1,126 @@
+import json
+import socket
+import time
+import unittest
+
+from ics_sim.protocol import ServerModbus, ModbusCodec
+from ics_sim.subscription import SubscriptionServer, SubscriptionClient, PollingSubscription, create_subscription
+
+
+class SubscriptionTests(unittest.TestCase):
+    PLC = {'name': 'PLC1', 'ip': '127.0.0.1', 'port': 5011, 'protocol': 'ModbusWriteRequest-TCP',
+           'subscription_port': 5012}
+
+    def setUp(self):
+        self.server = ServerModbus('127.0.0.1', 5011)
+        self.server.set_layouts({4: ModbusCodec.FLOAT32})
+        self.server.start()
+        self.server.set(0, 10)
+        self.server.set(4, 0.5)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def wait_for(self, subscription, tag_id, value, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while subscription.values.get(tag_id) != value and time.monotonic() < deadline:
+            subscription.update(0.05)
+        return subscription.values.get(tag_id)
+
+    def test_subscription_server(self):
+        publisher = SubscriptionServer(self.server, '127.0.0.1', 5012, interval=0.02)
+        publisher.start()
+        try:
+            subscription = create_subscription(self.PLC, {0: 1.0, 4: 0}, {4: ModbusCodec.FLOAT32})
+            self.assertIsInstance(subscription, SubscriptionClient)
+            self.assertEqual(subscription.values, {0: 10, 4: 0.5}, 'initial image is not sent')
+
+            self.server.set(0, 10.5)
+            self.server.set(4, 0.75)
+            self.assertEqual(self.wait_for(subscription, 4, 0.75), 0.75)
+            self.assertEqual(subscription.values[0], 10, 'change within the deadband is sent')
+
+            self.server.set(0, 12)
+            self.assertEqual(self.wait_for(subscription, 0, 12), 12)
+            self.assertEqual(subscription.receive_many([0, 4]), {0: 12, 4: 0.75})
+            self.assertEqual(publisher.stats['subscribers'], 1)
+
+            subscription._sock.close()
+            subscription._sock = None
+            self.server.set(0, 20)
+            self.assertEqual(subscription.receive_many([0]), {0: 20}, 'client does not resubscribe')
+            subscription.close()
+        finally:
+            publisher.stop()
+
+    def test_slow_subscriber(self):
+        publisher = SubscriptionServer(self.server, '127.0.0.1', 5012, interval=0.01)
+        publisher.MAX_PENDING = 1 << 16
+        publisher.start()
+        # subscribes to many tags and never reads the updates
+        slow = socket.socket()
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        slow.connect(('127.0.0.1', 5012))
+        slow.sendall(json.dumps({'op': 'subscribe', 'tags': {str(i): 0 for i in range(2000)}}).encode() + b'\n')
+        subscription = SubscriptionClient('127.0.0.1', 5012, {0: 0})
+        try:
+            deadline = time.monotonic() + 20
+            longest_gap = 0.0
+            count = 0
+            while publisher.stats['slow_drops'] == 0 and time.monotonic() < deadline:
+                count += 1
+                self.server.bank.set_holding_registers(0, [count] * 4000)
+                self.server.set(0, count)
+                start = time.monotonic()
+                while subscription.values[0] != count and time.monotonic() - start < 1:
+                    subscription.update(0.01)
+                longest_gap = max(longest_gap, time.monotonic() - start)
+            self.assertEqual(publisher.stats['slow_drops'], 1, 'the subscriber which stopped reading is kept')
+            self.assertLess(longest_gap, 0.25, 'a subscriber which stopped reading delays the others')
+            self.assertEqual(publisher.stats['subscribers'], 1)
+        finally:
+            subscription.close()
+            slow.close()
+            publisher.stop()
+
+    def test_subscription_retry(self):
+        subscription = create_subscription(self.PLC, {0: 1.0, 4: 0}, {4: ModbusCodec.FLOAT32})
+        self.assertIsInstance(subscription, PollingSubscription, 'no polling while the PLC does not publish')
+        publisher = SubscriptionServer(self.server, '127.0.0.1', 5012, interval=0.02)
+        try:
+            self.assertEqual(subscription.update(), {0: 10, 4: 0.5})
+            publisher.start()
+            subscription._next_retry = 0
+            self.server.set(4, 0.75)
+            self.assertEqual(subscription.update(), {4: 0.75})
+            self.assertIsNotNone(subscription._subscription, 'polling does not retry the subscription')
+            self.assertEqual(publisher.stats['subscribers'], 1)
+            self.server.set(0, 12)
+            self.assertEqual(self.wait_for(subscription, 0, 12), 12)
+
+            publisher.stop()
+            self.server.set(0, 14)
+            self.assertEqual(self.wait_for(subscription, 0, 14), 14, 'lost subscription does not fall back to polling')
+            self.assertIsNone(subscription._subscription)
+        finally:
+            subscription.close()
+            if publisher._thread.is_alive():
+                publisher.stop()
+
+    def test_polling_fallback(self):
+        subscription = create_subscription(dict(self.PLC, subscription_port=None), {0: 1.0, 4: 0},
+                                           {4: ModbusCodec.FLOAT32})
+        self.assertIsInstance(subscription, PollingSubscription)
+        try:
+            self.assertEqual(subscription.update(), {0: 10, 4: 0.5})
+            self.server.set(0, 10.5)
+            self.assertEqual(subscription.update(), {})
+            self.server.set(0, 11.5)
+            self.assertEqual(subscription.update(), {0: 11.5})
+            self.assertEqual(subscription.receive_many([0, 4]), {0: 11.5, 4: 0.5})
+        finally:
+            subscription.close()
+
+
+if __name__ == '__main__':
+    unittest.main()